@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+Benchmark for the Gaussian KDE used by ExperimentalPDF(fit=True).
+
+Usage: python kde.py [max_samples]
+
+For sample sizes from 1e3 up to max_samples (default 1e7), times
+scipy.stats.gaussian_kde and the binned FFT KDE for each bandwidth rule
+and prints the maximum error of the binned KDE relative to the peak of
+the exact one.  The exact KDE is skipped above 1e6 samples because it
+is O(samples * numpart).
+"""
+from __future__ import absolute_import, division, print_function
+
+import sys
+import time
+import numpy as np
+from scipy.stats import gaussian_kde
+from puq import options
+from puq.pdf import _binned_kde
+
+
+def main(max_samples=1e7):
+    print("%10s %10s %12s %12s %12s" % ('samples', 'bw', 'exact (s)', 'binned (s)', 'rel error'))
+    n = 1000
+    while n <= max_samples:
+        data = np.concatenate([np.random.normal(0, 1, n // 2), np.random.exponential(2, n // 2)])
+        mean, dev = np.mean(data), np.std(data)
+        x = np.linspace(mean - 5 * dev, mean + 5 * dev, options['pdf']['numpart'])
+        for bw in ['scott', 'silverman', 0.05]:
+            start = time.time()
+            b = _binned_kde(data, x, bw)
+            tb = time.time() - start
+            if n <= 1e6:
+                start = time.time()
+                e = gaussian_kde(data, bw_method=bw).evaluate(x)
+                te = time.time() - start
+                err = np.max(np.abs(e - b)) / np.max(e)
+                print("%10d %10s %12.4f %12.4f %12.2e" % (n, bw, te, tb, err))
+            else:
+                print("%10d %10s %12s %12.4f %12s" % (n, bw, '-', tb, '-'))
+        n *= 10
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(float(sys.argv[1]))
+    else:
+        main()
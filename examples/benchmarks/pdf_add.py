@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""
+Benchmark for adding PDFs with direct and FFT-based convolution.
+
+Usage: python pdf_add.py [max_numpart]
+
+For each value of options['pdf']['numpart'] from 100 up to max_numpart
+(default 1e6), times a + b for two PDFs using both convolution methods
+and prints the maximum difference between the results. The direct
+method is skipped above 1e5 points because it is O(n*m).
+"""
+from __future__ import absolute_import, division, print_function
+
+import sys
+import time
+import numpy as np
+from puq import options, NormalPDF, TrianglePDF
+
+
+def time_add(a, b, method):
+    options['pdf']['conv'] = method
+    start = time.time()
+    c = a + b
+    return c, time.time() - start
+
+
+def main(max_numpart=1e6):
+    print("%10s %12s %12s %12s" % ('numpart', 'direct (s)', 'fft (s)', 'max diff'))
+    numpart = 100
+    while numpart <= max_numpart:
+        options['pdf']['numpart'] = numpart
+        a = NormalPDF(10, 1)
+        b = TrianglePDF(-2, 1, 5)
+        c2, t2 = time_add(a, b, 'fft')
+        if numpart <= 1e5:
+            c1, t1 = time_add(a, b, 'direct')
+            diff = np.max(np.abs(c1.y - c2.y))
+            print("%10d %12.4f %12.4f %12.2e" % (numpart, t1, t2, diff))
+        else:
+            print("%10d %12s %12.4f %12s" % (numpart, '-', t2, '-'))
+        numpart *= 10
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(float(sys.argv[1]))
+    else:
+        main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Benchmark for arithmetic on uniform and adaptive PDF grids.
+
+Usage: python pdf_grid.py [max_numpart]
+
+For sums and products of PDFs with peaks, corners or long tails,
+times the operation on uniform grids of options['pdf']['numpart']
+points, from 100 up to max_numpart (default 1e5), and on an adaptive
+grid with options['pdf']['tol'] = 1e-4.  The error is the largest
+difference from a uniform grid of 10 * max_numpart points, relative
+to the peak of the density, where both results are nonzero.
+"""
+from __future__ import absolute_import, division, print_function
+
+import sys
+import time
+import numpy as np
+from puq import options, NormalPDF, UniformPDF, WeibullPDF
+
+CASES = [
+    ('normal + weibull', lambda: (NormalPDF(0, 1), WeibullPDF(.7, 1)), lambda a, b: a + b),
+    ('uniform + narrow normal', lambda: (UniformPDF(0, 1), NormalPDF(0, .01)), lambda a, b: a + b),
+    ('normal * uniform', lambda: (NormalPDF(0, 1), UniformPDF(1, 2)), lambda a, b: a * b),
+    ('weibull * normal', lambda: (WeibullPDF(.7, 1), NormalPDF(10, 1)), lambda a, b: a * b),
+    ('normal / uniform', lambda: (NormalPDF(0, 1), UniformPDF(1, 2)), lambda a, b: a / b),
+]
+
+
+def run(case, grid, numpart, repeat=5):
+    options['pdf']['grid'] = grid
+    options['pdf']['numpart'] = numpart
+    a, b = case[1]()
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        c = case[2](a, b)
+        t = time.time() - start
+        best = t if best is None else min(best, t)
+    return c, best
+
+
+def error(c, ref):
+    x = np.linspace(max(c.x[0], ref.x[0]), min(c.x[-1], ref.x[-1]), 100001)
+    return np.max(np.abs(c.pdf(x) - ref.pdf(x))) / np.max(ref.y)
+
+
+def main(max_numpart=1e5):
+    saved = options['pdf']['grid'], options['pdf']['numpart']
+    try:
+        for case in CASES:
+            print(case[0])
+            print("%10s %10s %8s %12s %12s" % ('grid', 'numpart', 'points', 'time (s)', 'error'))
+            ref, t = run(case, 'uniform', int(10 * max_numpart), 1)
+            numpart = 100
+            while numpart <= max_numpart:
+                for n in [numpart, 3 * numpart]:
+                    if n <= max_numpart:
+                        c, t = run(case, 'uniform', n)
+                        print("%10s %10d %8d %12.4f %12.2e" % ('uniform', n, len(c.x), t, error(c, ref)))
+                numpart *= 10
+            c, t = run(case, 'adaptive', 100)
+            print("%10s %10s %8d %12.4f %12.2e" % ('adaptive', '-', len(c.x), t, error(c, ref)))
+            print()
+    finally:
+        options['pdf']['grid'], options['pdf']['numpart'] = saved
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(float(sys.argv[1]))
+    else:
+        main()
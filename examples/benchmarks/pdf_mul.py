@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+Benchmark for multiplying and dividing PDFs with the direct
+kernel and with log-space (FFT) convolution.
+
+Usage: python pdf_mul.py [max_numpart]
+
+For each value of options['pdf']['numpart'] from 100 up to max_numpart
+(default 1e5), times a * b and a / c using both methods and prints the
+difference in the means of the results. The direct method is skipped
+above 1e4 points because it is O(n*m).
+"""
+from __future__ import absolute_import, division, print_function
+
+import sys
+import time
+from puq import options, NormalPDF, TrianglePDF
+
+
+def time_op(func, method):
+    options['pdf']['conv'] = method
+    start = time.time()
+    c = func()
+    return c, time.time() - start
+
+
+def main(max_numpart=1e5):
+    print("%10s %8s %12s %12s %12s" % ('numpart', 'op', 'direct (s)', 'fft (s)', 'mean diff'))
+    numpart = 100
+    while numpart <= max_numpart:
+        options['pdf']['numpart'] = numpart
+        a = TrianglePDF(-10, -6, 10)
+        b = NormalPDF(4, 3)
+        c = NormalPDF(10, 2)
+        for op, func in [('*', lambda: a * b), ('/', lambda: a / c)]:
+            c2, t2 = time_op(func, 'fft')
+            if numpart <= 1e4:
+                c1, t1 = time_op(func, 'direct')
+                print("%10d %8s %12.4f %12.4f %12.2e" % (numpart, op, t1, t2, abs(c1.mean - c2.mean)))
+            else:
+                print("%10d %8s %12s %12.4f %12s" % (numpart, op, '-', t2, '-'))
+        numpart *= 10
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(float(sys.argv[1]))
+    else:
+        main()
@@ -3,7 +3,8 @@ from .util import Callback, dump_hdf5, process_data
 from .jpickle import pickle, unpickle, NetObj, LoadObj, write_json
 from .hosts import InteractiveHost
 from .submithost import SubmitHost
-from .montecarlo import MonteCarlo
+from .montecarlo import MonteCarlo, Converged
+from .importance import ImportanceSampling
 from .lhs import LHS
 from .parameter import Parameter, NormalParameter, WeibullParameter, RayleighParameter, ExponParameter, CustomParameter, UniformParameter, DParameter
 from .smolyak import Smolyak
@@ -13,8 +14,15 @@ from .simplesweep import SimpleSweep
 from .psweep import PSweep
 from .testprogram import TestProgram
 from .pdf import PDF, ExperimentalPDF, NormalPDF, WeibullPDF, UniformPDF, HPDF, TrianglePDF, posterior, RayleighPDF, ExponPDF, NetPDF
+from .lazypdf import LazyPDF, lazy
+from .pdfbatch import PDFBatch
+from .pdfbuilder import PDFBuilder
+from .sketch import QuantileSketch
+from .propagate import propagate
+from .design import sample_design, maximin_lhs
 from .pbshost import PBSHost
-from .response import Function, ResponseFunc, SampledFunc
+from .response import Function, ResponseFunc, PCEFunc, SampledFunc
+from .localrbf import LocalRbf
 from .plot import plot
 from .read import read
 from .analyzer import analyzer
@@ -0,0 +1,228 @@
+"""
+Sample designs for many parameters at once.
+
+This file is part of PUQ
+Copyright (c) 2013-2016 PUQ Authors
+See LICENSE file for terms.
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+import h5py
+import numpy as np
+from logging import debug
+from puq.options import options
+from puq.pdf import _CLOSED_FORM
+
+# Number of rows mapped through the ppfs at a time. Small
+# enough for the temporary arrays to stay in cache.
+_BLOCK = 2**14
+
+METHODS = ['lhs', 'ds', 'random']
+
+# Exponent of the Morris-Mitchell criterion. Large values make
+# it equivalent to maximizing the smallest distance.
+_P = 50
+
+
+def sample_design(pdfs, num, method='lhs', rng=None, out=None, strata=None):
+    """
+    Returns a sample design with *num* rows and one column per PDF.
+
+    Column j is the same as pdfs[j].lhs(num, rng[j]) (or ds or
+    random), but the whole design is built in one preallocated
+    array and the ppfs are applied a block of rows at a time,
+    with all the closed form PDFs of the same kind done together.
+
+    Args:
+      pdfs: List of :class:`PDF`\s.
+      num: Number of samples.
+      method: 'lhs', 'ds' or 'random'.
+      rng: A numpy RandomState, or a list with one for each PDF.
+        Default is the global numpy random state.
+      out: Optional array of shape (num, len(pdfs)) to fill, for
+        example a numpy memmap for designs too big for memory.
+      strata: For 'lhs' and 'ds', an integer array of shape
+        (num, len(pdfs)) with the stratum of each sample, such as
+        one from :func:`maximin_lhs`.  Default is random.
+    Returns:
+      The design. By default it is in Fortran order, so columns
+      are contiguous.
+    """
+    if method not in METHODS:
+        raise ValueError("Unknown sampling method '%s'. Use one of %s." % (method, METHODS))
+    num = int(num)
+    if out is None:
+        out = np.empty((num, len(pdfs)), order='F')
+    elif out.shape != (num, len(pdfs)):
+        raise ValueError("out must have shape %s" % ((num, len(pdfs)),))
+    if rng is None or not isinstance(rng, (list, tuple)):
+        rng = [rng or np.random] * len(pdfs)
+    if strata is not None and np.shape(strata) != (num, len(pdfs)):
+        raise ValueError("strata must have shape %s" % ((num, len(pdfs)),))
+
+    # Probabilities, drawn in the same order as PDF.lhs, ds and random.
+    # Shuffling before the ppf gives the same order as permuting after.
+    for j, r in enumerate(rng):
+        if method == 'random':
+            out[:, j] = r.uniform(0, 1, num)
+            continue
+        if strata is not None:
+            u = strata[:, j] + (r.uniform(0, 1, num) if method == 'lhs' else 0.5)
+        elif method == 'lhs':
+            u = r.uniform(0, 1, num)
+            u += np.arange(0, num)
+            r.shuffle(u)
+        else:
+            u = np.arange(0.5, num)
+            r.shuffle(u)
+        u /= num
+        out[:, j] = u
+    return ppf_columns(pdfs, out)
+
+
+def ppf_columns(pdfs, u):
+    """
+    Replaces each column j of u with pdfs[j].ppf(u[:, j]), in place.
+    Returns u.
+    """
+    groups = {}
+    for j, p in enumerate(pdfs):
+        groups.setdefault(p.dist[0] if p.dist is not None else None, []).append(j)
+    closed = []
+    for name, cols in groups.items():
+        if name is not None:
+            cols = np.array(cols)
+            args = np.array([pdfs[j].dist[1] for j in cols]).T
+            lo = np.array([pdfs[j].x[0] for j in cols])
+            hi = np.array([pdfs[j].x[-1] for j in cols])
+            cdf, ppf = _CLOSED_FORM[name]
+            closed.append((cols, ppf, args, lo, hi, cdf(lo, *args), cdf(hi, *args)))
+
+    for start in range(0, len(u), _BLOCK):
+        rows = slice(start, start + _BLOCK)
+        # Same arithmetic as PDF.ppf, for all columns of a kind at once
+        for cols, ppf, args, lo, hi, fa, fb in closed:
+            p = np.clip(u[rows, cols], 0.0, 1.0)
+            res = ppf(fa + p * (fb - fa), *args)
+            np.clip(res, lo, hi, out=res)
+            np.copyto(res, lo, where=p == 0)
+            np.copyto(res, hi, where=p == 1)
+            u[rows, cols] = res
+        for j in groups.get(None, []):
+            u[rows, j] = np.interp(u[rows, j], pdfs[j].cdfy, pdfs[j].x)
+    return u
+
+
+def maximin_lhs(num, dim, seed=None, iterations=100):
+    """
+    Returns a space-filling Latin hypercube design.
+
+    The design minimizes the Morris-Mitchell criterion, a smooth
+    version of maximizing the smallest distance between points,
+    using the Enhanced Stochastic Evolutionary algorithm of Jin,
+    Chen and Sudjianto (2005).  Each step tries several exchanges
+    within a column and updates the criterion in O(num) for each.
+
+    Designs with a seed are cached in the HDF5 file
+    options['lhs_cache'], so repeated sweeps do not optimize again.
+
+    Args:
+      num: Number of samples.
+      dim: Number of dimensions.
+      seed: Seed for the optimization.
+      iterations: Number of outer iterations of the algorithm.
+    Returns:
+      Integer array of shape (num, dim).  Each column is a
+      permutation of the strata 0 to num-1.
+    """
+    key = '%d/%d/%s/%d' % (num, dim, seed, iterations)
+    fname = options['lhs_cache']
+    if seed is not None and fname and os.path.exists(fname):
+        try:
+            with h5py.File(fname, 'r') as h:
+                if key in h:
+                    return h[key][()]
+        except (IOError, OSError) as e:
+            debug("Cannot read %s: %s" % (fname, e))
+
+    rng = np.random if seed is None else np.random.RandomState(seed)
+    x = _ese(num, dim, rng, iterations)
+
+    if seed is not None and fname:
+        try:
+            if not os.path.isdir(os.path.dirname(fname)):
+                os.makedirs(os.path.dirname(fname))
+            with h5py.File(fname, 'a') as h:
+                if key not in h:
+                    h[key] = x
+        except (IOError, OSError) as e:
+            debug("Cannot write %s: %s" % (fname, e))
+    return x
+
+
+def _ese(num, dim, rng, iterations):
+    x = np.array([rng.permutation(num) for _k in range(dim)]).T
+    if num < 3:
+        return x
+
+    # squared distances between points, their -P/2 powers, and the
+    # criterion to the power P (the sum of the powers).
+    x = x.astype(float)
+    d2 = np.zeros((num, num))
+    for k in range(dim):
+        d2 += (x[:, k:k + 1] - x[:, k])**2
+    np.fill_diagonal(d2, np.inf)
+    pw = d2**(-_P / 2.0)
+    phi = np.sum(pw) / 2
+    best, best_phi = x.copy(), phi
+
+    tries = max(1, min(num * (num - 1) // 10, 50))
+    inner = max(1, min(2 * num * dim // tries, 100))
+    thresh = 0.005 * phi
+    idx = np.arange(tries)
+    for _it in range(iterations):
+        old_best = best_phi
+        accepted = improved = 0
+        for _i in range(inner):
+            # try exchanging pairs of points a, b in column k
+            k = rng.randint(dim)
+            a = rng.randint(num, size=tries)
+            b = rng.randint(num - 1, size=tries)
+            b += b >= a
+            xk, xa, xb = x[:, k], x[a, k:k + 1], x[b, k:k + 1]
+            change = (xb - xk)**2 - (xa - xk)**2
+            da = d2[a] + change
+            db = d2[b] - change
+            da[idx, b] = d2[a, b]
+            db[idx, a] = d2[a, b]
+            delta = np.sum(da**(-_P / 2.0) - pw[a], 1) + np.sum(db**(-_P / 2.0) - pw[b], 1)
+            j = np.argmin(delta)
+            if delta[j] > thresh * rng.rand():
+                continue
+
+            # accept the exchange
+            a, b = a[j], b[j]
+            x[a, k], x[b, k] = x[b, k], x[a, k]
+            d2[a], d2[b] = da[j], db[j]
+            d2[:, a], d2[:, b] = da[j], db[j]
+            pw[a], pw[b] = d2[a]**(-_P / 2.0), d2[b]**(-_P / 2.0)
+            pw[:, a], pw[:, b] = pw[a], pw[b]
+            phi += delta[j]
+            accepted += 1
+            if phi < best_phi:
+                best, best_phi = x.copy(), phi
+                improved += 1
+
+        # adjust the threshold
+        acpt = accepted / inner
+        if best_phi < old_best:
+            if acpt > 0.1 and improved < accepted:
+                thresh *= 0.8
+            elif acpt <= 0.1:
+                thresh /= 0.8
+        elif acpt < 0.1:
+            thresh /= 0.7
+        elif acpt > 0.8:
+            thresh *= 0.9
+    return best.astype(int)
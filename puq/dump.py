@@ -8,11 +8,19 @@ from __future__ import absolute_import, division, print_function
 import numpy as np
 import csv
 import os.path
+from puq.sketch import QuantileSketch, print_quantiles
+from puq.options import options
 
+# Number of values read at once when computing quantiles
+_CHUNK = 2**20
 
-def dump(h5, fname):
+
+def dump(h5, fname, quantiles=None):
     """
     Dumps all parameters and output value[s] to a single csv file.
+    If *quantiles* is a list of quantiles, they are also computed
+    for each output, with confidence bounds, and written to a file
+    ending in '_quantiles.csv'.
     There is a two line header on the file.
     Example:
 
@@ -40,3 +48,33 @@ def dump(h5, fname):
     w.writerow([p for p in pnames] + outvars)
     w.writerow([40*'-'])
     w.writerows(data)
+
+    if quantiles:
+        dump_quantiles(h5, fname, quantiles)
+
+
+def dump_quantiles(h5, fname, quantiles, confidence=None):
+    """
+    Writes quantiles of each output, and their confidence bounds,
+    to a csv file ending in '_quantiles.csv'.  The outputs are read in
+    chunks into a :class:`QuantileSketch`, so they are never sorted
+    or held in memory all at once.
+    """
+    if confidence is None:
+        confidence = options['pdf']['confidence']
+    fname = os.path.splitext(fname)[0] + '_quantiles.csv'
+    print('Dumping quantiles to %s' % fname)
+    with open(fname, 'w') as f:
+        w = csv.writer(f)
+        w.writerow(['output', 'quantile', 'value', 'lower', 'upper'])
+        for var in h5['/output/data'].keys():
+            d = h5['/output/data/%s' % var]
+            if len(d.shape) != 1:
+                continue
+            s = QuantileSketch(options['pdf']['sketch'])
+            for i in range(0, d.shape[0], _CHUNK):
+                s.add(d[i:i + _CHUNK])
+            table = s.table(quantiles, confidence)
+            print(var)
+            print_quantiles(table)
+            w.writerows([[var] + list(row) for row in table])
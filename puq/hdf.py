@@ -192,4 +192,9 @@ def get_response(hf, var):
       var: Output variable name.
     """
     psweep = hf.attrs['UQtype']
-    return unpickle(hf['/%s/%s/response' % (psweep, var)].value)
+    if type(psweep) != str:
+        psweep = psweep.decode('UTF-8')
+    val = hf['/%s/%s/response' % (psweep, var)][()]
+    if type(val) != str:
+        val = val.decode('UTF-8')
+    return unpickle(val)
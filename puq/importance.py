@@ -0,0 +1,185 @@
+"""
+Importance Sampling for tail probabilities
+
+This file is part of PUQ
+Copyright (c) 2013-2016 PUQ Authors
+See LICENSE file for terms.
+"""
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+from logging import debug
+from scipy.special import ndtr, ndtri
+from puq.util import process_data
+from puq.psweep import PSweep
+from puq.pdf import PDF, UniformPDF
+from puq.design import sample_design
+
+# Limit on the probabilities mapped to standard normal space
+_PMIN = 1e-12
+
+
+class ImportanceSampling(PSweep):
+    """
+    Class implementing importance sampling of the probability that an
+    output is above (or below) a threshold.
+
+    Samples are drawn from biasing PDFs, centered on the design point:
+    the most likely combination of inputs that reaches the threshold.
+    Each parameter's PDF is shifted in standard normal space so that
+    its median moves to the design point.  Results are weighted by the
+    likelihood ratio of the real and biasing PDFs.
+
+    Args:
+      params: Input list of :class:`Parameter`\s.
+      num: Number of samples to use.
+      threshold: The output threshold.
+      response: A cheap :class:`ResponseFunc` or :class:`SampledFunc`
+        for the output, from an earlier sweep. The design point is
+        the most likely of many samples of it that reach the threshold.
+      design_point: A dictionary of parameter names and values to use
+        as the design point instead of searching the response.
+      above(boolean): Estimate P(output > threshold). If False,
+        P(output < threshold).
+      iteration_cb(function): A function to call after completion.
+      seed(int): Seed for the random samples. Default is a random seed.
+
+    The analysis reports the probability 'prob' with 95% confidence
+    bounds 'prob_lo' and 'prob_hi', and 'ess', the number of plain
+    samples from the biasing PDFs that would give an estimate as good.
+    """
+    def __init__(self, params, num, threshold, response=None, design_point=None, above=True,
+                 iteration_cb=None, seed=None):
+        PSweep.__init__(self, iteration_cb, seed)
+        self.params = params
+        num = int(num)
+        self.num = num
+        self.threshold = threshold
+        self.above = above
+        self._start_at = 0
+
+        if design_point is None:
+            if response is None:
+                raise ValueError("ImportanceSampling needs a response or a design_point.")
+            design_point = _design_point(response, params, threshold, above, self.rng(len(params)))
+        names = [p.name for p in params]
+        for name in design_point:
+            if name not in names:
+                raise ValueError("Design point has '%s', which is not a parameter." % name)
+        self.design_point = dict(design_point)
+        print("Design point: %s" % self.design_point)
+
+        self.bias = [_shifted(p.pdf, self.design_point.get(p.name)) for p in params]
+        for p in self.params:
+            p.values = np.empty(0)
+        self._add(num)
+
+    def _add(self, num):
+        x = sample_design(self.bias, num, 'random', [self.rng(i) for i in range(len(self.params))])
+        for i, p in enumerate(self.params):
+            p.values = np.concatenate((p.values, x[:, i]))
+
+    # Returns a list of name,value tuples
+    # For example, [('t', 1.0), ('freq', 133862.0)]
+    def get_args(self):
+        for i in range(self._start_at, self.num):
+            yield [(p.name, p.values[i]) for p in self.params]
+
+    def weights(self, num=None):
+        """
+        Returns the likelihood ratios of the first *num* samples
+        (default all of them).
+        """
+        w = np.ones(len(self.params[0].values[:num]))
+        for p, b in zip(self.params, self.bias):
+            v = p.values[:num]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                w *= np.where(b.pdf(v) > 0, p.pdf.pdf(v) / b.pdf(v), 0.0)
+        return w
+
+    def _do_pdf(self, hf, data):
+        data = np.asarray(data, dtype=float)
+        w = self.weights(len(data))
+        if self.above:
+            wi = w * (data > self.threshold)
+        else:
+            wi = w * (data < self.threshold)
+        n = len(data)
+        prob = np.mean(wi)
+        err = np.std(wi, ddof=1) / np.sqrt(n) if n > 1 else np.inf
+        lo, hi = max(prob - 1.96 * err, 0.0), prob + 1.96 * err
+        # effective sample size of the estimate of prob
+        ess = np.sum(wi)**2 / np.sum(wi**2) if np.any(wi) else 0.0
+        op = '>' if self.above else '<'
+        print("P(output %s %s) = %s  [%s, %s]" % (op, self.threshold, prob, lo, hi))
+        print("Effective sample size = %s of %s" % (ess, n))
+        return [('prob', prob), ('prob_lo', lo), ('prob_hi', hi), ('ess', ess)]
+
+    def analyze(self, hf):
+        debug('')
+        process_data(hf, 'importancesampling', self._do_pdf)
+
+    def extend(self, num):
+        if num <= 0:
+            raise ValueError("Importance Sampling extend requires a valid num argument.")
+        self.batch += 1
+        self._add(num)
+        self._start_at = self.num
+        self.num += num
+
+
+def _design_point(func, params, threshold, above, rng, num=10000):
+    """
+    Returns the most likely of num samples of func that
+    reach the threshold, as a dictionary of parameter values.
+    """
+    byname = dict((p.name, p) for p in params)
+    names = [v[0] for v in func.vars]
+    for name in names:
+        if name not in byname:
+            raise ValueError("Response uses parameter '%s', which is not in this sweep." % name)
+    lo, hi = func.minmax()
+    if (above and hi < threshold) or (not above and lo > threshold):
+        print("Warning: the response never reaches the threshold %s." % threshold)
+
+    # sample the whole range, so the tails are covered
+    pdfs = [byname[name].pdf for name in names]
+    x = sample_design([UniformPDF(*pdf.range) for pdf in pdfs], num, 'lhs', rng)
+    g = np.broadcast_to(func.evala(x), (num,))
+    if not above:
+        g = -g
+        threshold = -threshold
+    with np.errstate(divide='ignore'):
+        logf = np.sum([np.log(pdf.pdf(x[:, i])) for i, pdf in enumerate(pdfs)], 0)
+    if np.any(g > threshold):
+        best = np.argmax(np.where(g > threshold, logf, -np.inf))
+    else:
+        best = np.argmax(g)
+    return dict(zip(names, x[best]))
+
+
+def _shifted(pdf, point):
+    """
+    Returns pdf shifted in standard normal space so that its
+    median moves to point.
+    """
+    if point is None or len(pdf.x) == 1:
+        return pdf
+    # a copy, because jpickle does not restore shared arrays
+    x = np.array(pdf.x, dtype=float)
+    u = ndtri(np.clip(pdf.cdf(x), _PMIN, 1 - _PMIN))
+    shift = ndtri(np.clip(pdf.cdf(point), _PMIN, 1 - _PMIN))
+
+    # Build the PDF from its CDF, Phi(u - shift). The density
+    # pdf.y * exp(shift*u - shift**2/2) is badly resolved by the
+    # grid near the ends of a truncated range, and the PDF
+    # constructor would trim the tails.
+    cdfy = ndtr(u - shift)
+    cdfy = (cdfy - cdfy[0]) / (cdfy[-1] - cdfy[0])
+    p = PDF.__new__(PDF)
+    p.x = x
+    p.cdfy = cdfy
+    p.y = np.gradient(cdfy, x)
+    p.mean = np.trapz(x * p.y, x)
+    p.dev = np.sqrt(np.trapz((x - p.mean)**2 * p.y, x))
+    return p
@@ -17,6 +17,7 @@ import jsonpickle
 import numpy as np
 import sympy
 from scipy.interpolate import Rbf
+from puq.localrbf import LocalRbf
 from sympy.core.numbers import Float
 
 
@@ -99,6 +100,7 @@ class RbfHandler(jsonpickle.handlers.BaseHandler):
     def restore(self, obj):
         return obj
 jsonpickle.handlers.registry.register(Rbf, RbfHandler)
+jsonpickle.handlers.registry.register(LocalRbf, RbfHandler)
 
 
 def pickle(obj):
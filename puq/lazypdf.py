@@ -0,0 +1,213 @@
+"""
+Lazy arithmetic on PDFs.
+
+Operators on :class:`LazyPDF` objects build an expression graph
+instead of computing intermediate PDFs.  Calling
+:meth:`LazyPDF.evaluate` computes the result, doing each distinct
+convolution only once.  Scalar shifts and scales are folded into a
+single affine transform per node, so chains like `2 * (a + 1) - 3`
+create one PDF instead of three.
+
+This file is part of PUQ
+Copyright (c) 2013-2016 PUQ Authors
+See LICENSE file for terms.
+"""
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+from puq.pdf import PDF
+
+
+def _is_scalar(b):
+    return np.isscalar(b) and not isinstance(b, str)
+
+
+def lazy(*pdfs):
+    """
+    Wrap PDFs for lazy evaluation.
+
+    Args:
+      pdfs: One or more :class:`PDF` objects.
+    Returns:
+      A :class:`LazyPDF` for each argument. If there is only one
+      argument, returns a single :class:`LazyPDF`.
+
+    :Example:
+
+    >>> a, b, c = lazy(NormalPDF(10, 1), UniformPDF(1, 2), NormalPDF(5, 1))
+    >>> e = (a * b + c) / a
+    >>> p = e.evaluate()
+    """
+    res = [LazyPDF(_Node('pdf', p)) for p in pdfs]
+    if len(res) == 1:
+        return res[0]
+    return res
+
+
+class _Node(object):
+    """
+    An operation in the expression graph.  'pdf' nodes hold a PDF.
+    Other nodes hold a tuple of LazyPDF arguments.
+    """
+    def __init__(self, op, args):
+        self.op = op
+        self.args = args
+        if op == 'pdf':
+            self.key = ('pdf', id(args))
+        else:
+            self.key = (op,) + tuple([a.key for a in args])
+
+    def evaluate(self, memo):
+        if self.op == 'pdf':
+            return self.args
+        vals = [a.evaluate(memo) for a in self.args]
+        if self.op == '+':
+            return vals[0] + vals[1]
+        if self.op == '*':
+            return vals[0] * vals[1]
+        if self.op == '/':
+            return vals[0] / vals[1]
+        if self.op == 'rdiv':
+            return 1.0 / vals[0]
+        raise ValueError("Unknown operation '%s'" % self.op)
+
+    def __str__(self):
+        if self.op == 'pdf':
+            return 'PDF@%x' % id(self.args)
+        if self.op == 'rdiv':
+            return '1/%s' % self.args[0]
+        return '(%s %s %s)' % (self.args[0], self.op, self.args[1])
+
+
+class LazyPDF(object):
+    """
+    A node in a lazy expression graph of PDFs, representing
+    *scale* * node + *shift*.
+
+    Use :func:`lazy` to create one from a PDF.  Arithmetic with
+    numbers, PDFs or other LazyPDFs returns a new LazyPDF.
+    """
+    def __init__(self, node, scale=1.0, shift=0.0):
+        self.node = node
+        self.scale = float(scale)
+        self.shift = float(shift)
+        self.key = (node.key, self.scale, self.shift)
+
+    def evaluate(self, memo=None):
+        """
+        Compute the PDF for this expression.
+
+        Args:
+          memo: Optional dictionary used to cache results of
+            subexpressions.  Pass the same dictionary to several
+            calls to share results between them.
+        Returns:
+          A :class:`PDF`.
+        """
+        if memo is None:
+            memo = {}
+        if self.key not in memo:
+            if self.node.key not in memo:
+                memo[self.node.key] = self.node.evaluate(memo)
+            p = memo[self.node.key]
+            if self.scale != 1.0 or self.shift != 0.0:
+                p = PDF(self.scale * np.array(p.x) + self.shift, np.array(p.y))
+            memo[self.key] = p
+        return memo[self.key]
+
+    def _affine(self, scale, shift):
+        return LazyPDF(self.node, self.scale * scale, self.shift * scale + shift)
+
+    def _product(self, op, b):
+        # pull scale factors out of unshifted arguments
+        scale = 1.0
+        args = []
+        for i, c in enumerate([self, b]):
+            if c.shift == 0.0:
+                if op == '/' and i == 1:
+                    scale /= c.scale
+                else:
+                    scale *= c.scale
+                c = LazyPDF(c.node)
+            args.append(c)
+        return LazyPDF(_Node(op, tuple(args)), scale)
+
+    def __neg__(self):
+        return self._affine(-1.0, 0.0)
+
+    def __add__(self, b):
+        if _is_scalar(b):
+            return self._affine(1.0, b)
+        b = _wrap(b)
+        if b is NotImplemented:
+            return b
+        args = (LazyPDF(self.node, self.scale), LazyPDF(b.node, b.scale))
+        return LazyPDF(_Node('+', args), 1.0, self.shift + b.shift)
+
+    def __radd__(self, b):
+        return self.__add__(b)
+
+    def __sub__(self, b):
+        if _is_scalar(b):
+            return self._affine(1.0, -b)
+        b = _wrap(b)
+        if b is NotImplemented:
+            return b
+        return self.__add__(-b)
+
+    def __rsub__(self, b):
+        return (-self).__add__(b)
+
+    def __mul__(self, b):
+        if _is_scalar(b):
+            if b == 0:
+                raise ValueError("Multiplying by 0 does not produce a PDF.")
+            return self._affine(b, 0.0)
+        b = _wrap(b)
+        if b is NotImplemented:
+            return b
+        return self._product('*', b)
+
+    def __rmul__(self, b):
+        return self.__mul__(b)
+
+    def __div__(self, b):
+        if _is_scalar(b):
+            if b == 0:
+                raise ValueError("Cannot divide a PDF by 0.")
+            return self._affine(1.0 / b, 0.0)
+        b = _wrap(b)
+        if b is NotImplemented:
+            return b
+        return self._product('/', b)
+
+    def __rdiv__(self, b):
+        if not _is_scalar(b):
+            return _wrap(b).__div__(self)
+        if b == 0:
+            raise ValueError("Dividing 0 by a PDF does not return a PDF")
+        if self.shift == 0.0:
+            return LazyPDF(_Node('rdiv', (LazyPDF(self.node),)), b / self.scale)
+        return LazyPDF(_Node('rdiv', (self,)), b)
+
+    def __truediv__(self, b):
+        return self.__div__(b)
+
+    def __rtruediv__(self, b):
+        return self.__rdiv__(b)
+
+    def __str__(self):
+        s = str(self.node)
+        if self.scale != 1.0:
+            s = '%s*%s' % (self.scale, s)
+        if self.shift != 0.0:
+            s = '%s + %s' % (s, self.shift)
+        return 'LazyPDF %s' % s
+
+
+def _wrap(b):
+    if isinstance(b, LazyPDF):
+        return b
+    if isinstance(b, PDF):
+        return LazyPDF(_Node('pdf', b))
+    return NotImplemented
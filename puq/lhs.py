@@ -7,7 +7,6 @@ See LICENSE file for terms.
 """
 from __future__ import absolute_import, division, print_function
 
-import sys
 import numpy as np
 from puq.util import process_data
 from puq.psweep import PSweep
@@ -15,6 +14,7 @@ from logging import debug
 from .response import SampledFunc
 from puq.jpickle import pickle
 from puq.pdf import UniformPDF
+from puq.design import sample_design, maximin_lhs
 
 
 class LHS(PSweep):
@@ -29,30 +29,37 @@ class LHS(PSweep):
       response(boolean): Generate a response surface using the sample
         points.
       iteration_cb(function): A function to call after completion.
+      seed(int): Seed for the random samples. Default is a random seed.
+      optimize(boolean): Use a space-filling (maximin) Latin hypercube
+        from :func:`maximin_lhs` instead of a random one. Optimized
+        designs are cached, so this is only slow the first time a
+        design with the same num and number of parameters is used.
+        The seed randomly permutes and reflects the columns.
     """
-    def __init__(self, params, num, ds=False, response=True, iteration_cb=None):
-        PSweep.__init__(self, iteration_cb)
+    # default for objects pickled before this option existed
+    optimize = False
+
+    def __init__(self, params, num, ds=False, response=True, iteration_cb=None, seed=None, optimize=False):
+        PSweep.__init__(self, iteration_cb, seed)
         self.params = params
         num = int(num)
         self.num = num
         self.ds = ds
         self.response = response
+        self.optimize = optimize
         self._start_at = 0
 
         if self.response:
             # To generate a complete response surface, use Uniform distributions
             # with the same range as the original distributions.
-            for p in self.params:
-                if ds:
-                    p.values = UniformPDF(*p.pdf.range).ds(num)
-                else:
-                    p.values = UniformPDF(*p.pdf.range).lhs(num)
+            pdfs = [UniformPDF(*p.pdf.range) for p in self.params]
         else:
-            for p in self.params:
-                if ds:
-                    p.values = p.pdf.ds(num)
-                else:
-                    p.values = p.pdf.lhs(num)
+            pdfs = [p.pdf for p in self.params]
+        rngs = [self.rng(i) for i in range(len(pdfs))]
+        strata = _maximin_strata(num, len(pdfs), self.rng(len(pdfs))) if optimize else None
+        x = sample_design(pdfs, num, 'ds' if ds else 'lhs', rngs, strata=strata)
+        for i, p in enumerate(self.params):
+            p.values = x[:, i]
 
     # Returns a list of name,value tuples
     # For example, [('t', 1.0), ('freq', 133862.0)]
@@ -87,25 +94,72 @@ class LHS(PSweep):
         debug('')
         process_data(hf, 'lhs', self._do_pdf)
 
-    # extend the sample size by a factor of 3
-    # This works for DS because it always chooses the center of the probability bins.
-    # This means we can extend by using 3 times the bins.
+    # Extending adds points in the strata of the finer grid that are
+    # still empty. For DS, the default of tripling the samples fills
+    # exactly the strata on both sides of each old point.
     # |     *     |     *     |
     # | * | * | * | * | * | * |
 
     def extend(self, num=None):
-        if not hasattr(self, 'ds') or not self.ds:
-            print("You must use Descriptive Sampling to extend.")
-            sys.exit(1)
-
-        print("Extending Descriptive Sampling run to %s samples." % (self.num * 3))
-        for p in self.params:
-            if self.response:
-                v = np.sort(UniformPDF(*p.pdf.range).ds(self.num * 3))
-            else:
-                v = np.sort(p.pdf.ds(self.num * 3))
-            # remove the ones we already did
-            v = np.concatenate((v[0::3], v[2::3]))
-            p.values = np.concatenate((p.values, np.random.permutation(v)))
+        """
+        Adds *num* samples, by default twice the current number.
+
+        The union of the old and new samples is a Latin hypercube
+        with self.num + *num* strata if no two old samples share
+        one of the finer strata, which is always true when *num* is
+        a multiple of self.num.  Otherwise each new sample is still
+        in an empty stratum.  As far as possible, the new samples
+        are also a Latin hypercube by themselves.
+        """
+        if num is None:
+            num = 2 * self.num
+        num = int(num)
+        if num <= 0:
+            raise ValueError("LHS extend requires a positive num argument.")
+
+        total = self.num + num
+        print("Extending Latin hypercube run to %s samples." % total)
+        ds = getattr(self, 'ds', False)
+        self.batch += 1
+        for i, p in enumerate(self.params):
+            pdf = UniformPDF(*p.pdf.range) if self.response else p.pdf
+            rng = self.rng(i)
+            cells = _new_strata(pdf.cdf(p.values[:self.num]), total, num, rng)
+            u = (cells + (0.5 if ds else rng.uniform(0, 1, num))) / total
+            p.values = np.concatenate((p.values, pdf.ppf(rng.permutation(u))))
         self._start_at = self.num
-        self.num *= 3
+        self.num = total
+
+
+def _new_strata(u, total, num, rng):
+    """
+    Picks num of the total strata of [0,1] for new samples,
+    given the probabilities u of the old samples.  Only empty
+    strata are used, and if possible one in each of num equal
+    slices of [0,1].
+    """
+    full = np.zeros(total, dtype=bool)
+    full[np.clip(np.floor(u * total).astype(int), 0, total - 1)] = True
+    empty = np.nonzero(~full)[0]
+
+    # a random empty stratum in each slice, then random others
+    slices = np.floor((empty + 0.5) * num / total).astype(int)
+    order = rng.permutation(len(empty))
+    first = np.zeros(len(empty), dtype=bool)
+    _, pos = np.unique(slices[order], return_index=True)
+    first[order[pos]] = True
+    rest = empty[~first]
+    rest = rest[rng.permutation(len(rest))[:num - np.sum(first)]]
+    return np.sort(np.concatenate((empty[first], rest)))
+
+
+def _maximin_strata(num, dim, rng):
+    """
+    A cached maximin Latin hypercube, with its columns randomly
+    permuted and reflected. This keeps the distances between points,
+    so every sweep can share one optimized design for num and dim.
+    """
+    x = maximin_lhs(num, dim, seed=0)[:, rng.permutation(dim)]
+    flip = rng.randint(0, 2, dim).astype(bool)
+    x[:, flip] = num - 1 - x[:, flip]
+    return x
@@ -0,0 +1,121 @@
+"""
+Local radial basis function interpolation for large sets of points.
+
+This file is part of PUQ
+Copyright (c) 2013-2016 PUQ Authors
+See LICENSE file for terms.
+"""
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Number of query points interpolated at a time. Each needs
+# a neighbors x neighbors system, so this bounds the memory.
+_BLOCK = 1024
+
+
+def _multiquadric(r, eps):
+    return np.sqrt((r / eps)**2 + 1)
+
+
+def _inverse(r, eps):
+    return 1.0 / np.sqrt((r / eps)**2 + 1)
+
+
+def _gaussian(r, eps):
+    return np.exp(-(r / eps)**2)
+
+
+def _linear(r, eps):
+    return r
+
+
+def _cubic(r, eps):
+    return r**3
+
+
+def _quintic(r, eps):
+    return r**5
+
+
+def _thin_plate(r, eps):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(r > 0, r**2 * np.log(r), 0.0)
+
+# Same definitions as scipy.interpolate.Rbf
+FUNCTIONS = {
+    'multiquadric': _multiquadric,
+    'inverse': _inverse,
+    'gaussian': _gaussian,
+    'linear': _linear,
+    'cubic': _cubic,
+    'quintic': _quintic,
+    'thin_plate': _thin_plate,
+}
+
+
+class LocalRbf(object):
+    """
+    Radial basis function interpolation using only the nearest points.
+
+    Called like scipy.interpolate.Rbf.  For each point to evaluate, the
+    *neighbors* nearest data points are found with a KD-tree and a small
+    RBF system is solved for them.  Building costs O(n log n) and each
+    evaluation O(log n + neighbors**3), instead of O(n**3) to build and
+    O(n) to evaluate a full Rbf.  The result still passes through the
+    data points.
+
+    Args:
+      args: Coordinates of the data points, one array for each
+        dimension, followed by the values at the data points.
+      function: One of the radial basis functions of Rbf:
+        'multiquadric', 'inverse', 'gaussian', 'linear', 'cubic',
+        'quintic' or 'thin_plate'.
+      epsilon: Shape parameter. The default is the average distance
+        between points, as in Rbf.
+      neighbors: Number of data points used for each evaluation.
+    """
+    def __init__(self, *args, **kwargs):
+        self.xi = np.array([np.asarray(a, dtype=float).ravel() for a in args[:-1]]).T
+        self.di = np.asarray(args[-1], dtype=float).ravel()
+        self.N = len(self.di)
+        if self.xi.shape[0] != self.N:
+            raise ValueError("All arrays must be equal length.")
+        self.function = kwargs.get('function', 'multiquadric')
+        if self.function not in FUNCTIONS:
+            raise ValueError("Unknown radial basis function '%s'. Use one of %s."
+                             % (self.function, sorted(FUNCTIONS)))
+        self.neighbors = min(int(kwargs.get('neighbors', 50)), self.N)
+        if self.neighbors < 1:
+            raise ValueError("neighbors must be at least 1.")
+        self.epsilon = kwargs.get('epsilon')
+        if self.epsilon is None:
+            edges = np.ptp(self.xi, axis=0)
+            edges = edges[np.nonzero(edges)]
+            self.epsilon = np.power(np.prod(edges) / self.N, 1.0 / edges.size)
+        self._func = FUNCTIONS[self.function]
+        self._tree = cKDTree(self.xi)
+
+    def __call__(self, *args):
+        args = np.broadcast_arrays(*[np.asarray(a, dtype=float) for a in args])
+        shape = args[0].shape
+        x = np.array([a.ravel() for a in args]).T
+        res = np.empty(len(x))
+        for start in range(0, len(x), _BLOCK):
+            res[start:start + _BLOCK] = self._eval(x[start:start + _BLOCK])
+        return res.reshape(shape)
+
+    def _eval(self, x):
+        k = self.neighbors
+        _dist, idx = self._tree.query(x, k)
+        idx = np.reshape(idx, (len(x), k))
+        pts = self.xi[idx]
+
+        # solve the RBF system of each point's neighbors
+        diff = pts[:, :, np.newaxis, :] - pts[:, np.newaxis, :, :]
+        a = self._func(np.sqrt(np.sum(diff**2, -1)), self.epsilon)
+        w = np.linalg.solve(a, self.di[idx][:, :, np.newaxis])[:, :, 0]
+
+        r = np.sqrt(np.sum((pts - x[:, np.newaxis, :])**2, -1))
+        return np.sum(self._func(r, self.epsilon) * w, 1)
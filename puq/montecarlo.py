@@ -9,30 +9,158 @@ from __future__ import absolute_import, division, print_function
 
 import numpy as np
 from puq.util import process_data
+from puq.options import options
+from puq.sketch import QuantileSketch, print_quantiles
+from puq.pdfbuilder import RunningStats
+from puq.hdf import get_output_names, get_response
+from scipy.special import ndtri
 from puq.psweep import PSweep
 from logging import info, debug, exception, warning, critical
-from puq.response import SampledFunc
+from puq.response import Function, SampledFunc
 from puq.jpickle import pickle
 from puq.pdf import UniformPDF, ExperimentalPDF
+from puq.design import sample_design, ppf_columns
+from puq import qmc
 
 
 class MonteCarlo(PSweep):
-    def __init__(self, params, num, response=True, iteration_cb=None):
-        PSweep.__init__(self, iteration_cb)
+    """
+    Class implementing Monte Carlo sampling.
+
+    Args:
+      params: Input list of :class:`Parameter`\s.
+      num: Number of samples to use.
+      response(boolean): Generate a response surface using the sample
+        points.
+      iteration_cb(function): A function to call after completion.
+        Use :class:`Converged` to add samples until the results
+        have converged.
+      sequence: 'random' for pseudo-random samples, or 'sobol' or
+        'halton' for scrambled quasi-random sequences, which usually
+        converge faster.
+      replicates: Number of independently scrambled copies of the
+        sequence.  *num* is split evenly between them and the spread
+        of their means is reported as 'mean_err', the standard error
+        of the mean.
+      seed(int): Seed for the random samples and scrambling. Default
+        is a random seed.
+      control: A cheap response surface for the same outputs, used
+        as a control variate.  Either the name of an HDF5 file from
+        a Smolyak or LHS sweep, or a :class:`ResponseFunc` or
+        :class:`SampledFunc`.  Requires response=False.  The analysis
+        then also reports the corrected mean and deviation,
+        'cv_mean' and 'cv_dev', and 'cv_vrf', the factor by which
+        the variance of the mean is reduced.
+      control_num: Number of samples of the response surface used
+        to compute its mean and variance.
+      antithetic(boolean): Sample in pairs, where the second sample
+        of each pair mirrors the first through each parameter's CDF.
+      strata: A dictionary of parameter names and numbers of strata,
+        for example {'x': 4, 'y': 2}.  The probability range of each
+        of these parameters is split into that many equal parts, and
+        every combination of parts gets the same number of samples.
+
+    The reported 'mean_err' is the standard error of the mean for the
+    sampling scheme: with replicates, from the spread of the replicate
+    means, and with antithetic pairs or strata, from the variance
+    within the strata of the pair means. Antithetic pairs and strata
+    require response=False and sequence='random', and *num* must be a
+    multiple of the number of samples in one pair in every stratum.
+    """
+    # defaults for objects pickled before these options existed
+    sequence = 'random'
+    replicates = 1
+    control = None
+    control_num = 100000
+    antithetic = False
+    strata = None
+
+    def __init__(self, params, num, response=True, iteration_cb=None, sequence='random', replicates=1, seed=None,
+                 control=None, control_num=100000, antithetic=False, strata=None):
+        PSweep.__init__(self, iteration_cb, seed)
         self.params = params
         num = int(num)
         self.num = num
         self.response = response
         self._start_at = 0
 
+        if sequence != 'random' and sequence not in qmc.SEQUENCES:
+            raise ValueError("Unknown sequence '%s'" % sequence)
+        if replicates < 1:
+            raise ValueError("replicates must be at least 1.")
+        if control is not None and response:
+            raise ValueError("A control variate needs the samples from the real PDFs. Use response=False.")
+        if antithetic or strata:
+            if response or sequence != 'random' or replicates > 1:
+                raise ValueError("Antithetic and stratified sampling need response=False, "
+                                 "sequence='random' and no replicates.")
+            names = [p.name for p in params]
+            for name, k in strata.items() if strata else []:
+                if name not in names or int(k) < 1:
+                    raise ValueError("Bad strata for '%s'" % name)
+        self.sequence = sequence
+        self.replicates = int(replicates)
+        self.control = control
+        self.control_num = int(control_num)
+        self.antithetic = antithetic
+        self.strata = dict(strata) if strata else None
+        if num % self._block():
+            raise ValueError("num must be a multiple of %d." % self._block())
+        if isinstance(iteration_cb, Converged):
+            if response:
+                raise ValueError("Converged needs the samples from the real PDFs. Use response=False.")
+            if sequence != 'random' and replicates < 2:
+                raise ValueError("Converged needs replicates of quasi-random sequences to estimate the error.")
+            if iteration_cb.batch % self._block():
+                raise ValueError("The batch size must be a multiple of %d." % self._block())
+            if iteration_cb.max_num % self._block():
+                raise ValueError("max_num must be a multiple of %d." % self._block())
+        for p in self.params:
+            p.values = np.empty(0)
+        self._add(num)
+
+    def _cells(self):
+        "Number of strata for each parameter"
+        strata = self.strata or {}
+        return [int(strata.get(p.name, 1)) for p in self.params]
+
+    def _block(self):
+        "Samples must be added in multiples of this"
+        return self.replicates * (2 if self.antithetic else 1) * int(np.prod(self._cells()))
+
+    def _add(self, num):
+        "Appends num samples to each parameter's values."
         if self.response:
             # To generate a complete response surface, use Uniform distributions
             # with the same range as the original distributions.
-            for p in self.params:
-                p.values = UniformPDF(*p.pdf.range).random(num)
+            pdfs = [UniformPDF(*p.pdf.range) for p in self.params]
         else:
-            for p in self.params:
-                p.values = p.pdf.random(num)
+            pdfs = [p.pdf for p in self.params]
+
+        if self.antithetic or self.strata:
+            # Unit k (a sample, or an antithetic pair) is in the
+            # combination of strata k % ncells.
+            pair = 2 if self.antithetic else 1
+            cells = self._cells()
+            cell = np.unravel_index(np.arange(num // pair) % np.prod(cells), cells)
+            u = np.empty((num // pair, len(pdfs)))
+            for i, k in enumerate(cells):
+                u[:, i] = (cell[i] + self.rng(i).uniform(0, 1, num // pair)) / k
+            if self.antithetic:
+                u = np.hstack((u, 1 - u)).reshape(num, -1)
+            x = ppf_columns(pdfs, u)
+        elif self.sequence == 'random':
+            x = sample_design(pdfs, num, 'random', [self.rng(i) for i in range(len(pdfs))])
+        else:
+            # Sample i belongs to replicate i % replicates. Each
+            # replicate continues its sequence where it stopped.
+            reps = self.replicates
+            start = len(self.params[0].values) // reps
+            u = np.array([qmc.sequence(self.sequence, num // reps, len(pdfs), start, [self.seed, r])
+                          for r in range(reps)])
+            x = ppf_columns(pdfs, u.transpose(1, 0, 2).reshape(num, -1))
+        for i, p in enumerate(self.params):
+            p.values = np.concatenate((p.values, x[:, i]))
 
     # Returns a list of name,value tuples
     # For example, [('t', 1.0), ('freq', 133862.0)]
@@ -55,14 +183,72 @@ class MonteCarlo(PSweep):
             rs = pickle(SampledFunc(*rsd, params=self.params))
             print("Mean   = %s" % mean)
             print("StdDev = %s" % dev)
-            return [('response', rs), ('mean', mean), ('dev', dev)]
+            return [('response', rs), ('mean', mean), ('dev', dev)] + self._mean_err(data, weights)
         else:
-            pdf = ExperimentalPDF(data, fit=0)
+            var = hf.name.split('/')[-1] if hf is not None else ''
+            pdf = ExperimentalPDF(data, fit=0, sketch=True, rng=self.sketch_rng(var))
             mean = np.mean(data)
             dev = np.std(data)
+            quantiles = pdf.sketch.table(options['pdf']['quantiles'], options['pdf']['confidence'])
             print("Mean   = %s" % mean)
             print("StdDev = %s" % dev)
-            return [('pdf', pickle(pdf)), ('samples', data), ('mean', mean), ('dev', dev)]
+            err = self._mean_err(data, np.ones(len(data)))
+            print_quantiles(quantiles)
+            cv = self._control(hf, data) if self.control is not None else []
+            return [('pdf', pickle(pdf)), ('samples', data), ('mean', mean), ('dev', dev),
+                    ('quantiles', quantiles)] + err + cv
+
+    def _control(self, vgrp, data):
+        # Control variate estimates, using a response surface g
+        # with mean and variance from many cheap samples.
+        f = self.control
+        if not isinstance(f, Function):
+            f = get_response(f, vgrp.name.split('/')[-1])
+        params = dict((p.name, p) for p in self.params)
+        names = [v[0] for v in f.vars]
+        for name in names:
+            if name not in params:
+                raise ValueError("Control variate uses parameter '%s', which is not in this sweep." % name)
+        data = np.asarray(data, dtype=float)
+        x = np.column_stack([params[name].values[:len(data)] for name in names])
+        g = np.broadcast_to(f.evala(x), data.shape)
+        pdfs = [params[name].pdf for name in names]
+        rngs = [self.rng(len(self.params) + i) for i in range(len(names))]
+        gc = np.broadcast_to(f.evala(sample_design(pdfs, self.control_num, 'lhs', rngs)), (self.control_num,))
+
+        mean, var = _control_variate(data, g, np.mean(gc))
+        # second moment, with g**2 as its control
+        m2, _var = _control_variate(data**2, g**2, np.mean(gc**2))
+        dev = np.sqrt(max(m2 - mean**2, 0))
+        vrf = np.var(data) / var if var > 0 else np.inf
+        print("Control variate:")
+        print("Mean   = %s" % mean)
+        print("StdDev = %s" % dev)
+        print("Variance reduction = %s" % vrf)
+        return [('cv_mean', mean), ('cv_dev', dev), ('cv_vrf', vrf)]
+
+    def _mean_err(self, data, weights):
+        err = self._std_err(data, weights)
+        if err is None:
+            return []
+        print("MeanErr= %s" % err)
+        return [('mean_err', err)]
+
+    def _std_err(self, data, weights=None):
+        """
+        Standard error of the mean, from the spread of the means
+        of the independent replicates, or of the pairs in each
+        stratum. None for plain random samples.
+        """
+        reps = self.replicates
+        if self.antithetic or self.strata:
+            return _stratified_err(data, 2 if self.antithetic else 1, int(np.prod(self._cells())))
+        if reps > 1:
+            if weights is None:
+                weights = np.ones(len(data))
+            means = [np.average(data[r::reps], weights=weights[r::reps]) for r in range(reps)]
+            return np.std(means, ddof=1) / np.sqrt(reps)
+        return None
 
     def analyze(self, hf):
         debug('')
@@ -73,10 +259,113 @@ class MonteCarlo(PSweep):
             print("Monte Carlo extend requires a valid num argument.")
             raise ValueError()
 
-        for p in self.params:
-            if self.response:
-                p.values = np.concatenate((p.values, UniformPDF(*p.pdf.range).random(num)))
-            else:
-                p.values = np.concatenate((p.values, p.pdf.random(num)))
+        if num % self._block():
+            raise ValueError("num must be a multiple of %d." % self._block())
+
+        self.batch += 1
+        self._add(num)
         self._start_at = self.num
         self.num += num
+
+
+def _stratified_err(data, pair, cells):
+    """
+    Standard error of the mean of data made of units of *pair*
+    samples, where unit k is in stratum k % cells and all strata
+    have the same probability.
+    """
+    n = len(data) // (pair * cells) * pair * cells
+    units = np.reshape(data[:n], (-1, pair)).mean(1).reshape(-1, cells)
+    if len(units) < 2:
+        return np.nan
+    return np.sqrt(np.sum(np.var(units, 0, ddof=1) / len(units))) / cells
+
+
+def _control_variate(y, g, mu):
+    """
+    Estimates the mean of y using g, with known mean mu, as a
+    control variate. Returns the estimate and the variance of the
+    corrected samples.
+    """
+    c = np.cov(y, g)
+    beta = c[0, 1] / c[1, 1] if c[1, 1] > 0 else 0.0
+    return np.mean(y) - beta * (np.mean(g) - mu), np.var(y - beta * g)
+
+
+class Converged(object):
+    """
+    An iteration_cb for :class:`MonteCarlo` that keeps adding
+    batches of samples until the results have converged.
+
+    After each batch, the new results of every output are added to
+    running estimates of the mean, variance and quantiles.  The sweep
+    stops when, for every output, the confidence intervals of the
+    mean and of the quantiles are narrower than the tolerance, or
+    when *max_num* samples have been run.
+
+    The tolerance for an estimate is max(*atol*, *rtol* * abs(estimate)),
+    and is compared to the half-width of its confidence interval.
+    With replicates, antithetic pairs or strata, the interval of the
+    mean comes from the same standard error as 'mean_err'.
+
+    Args:
+      batch: Number of samples to add each time.
+      rtol: Relative tolerance.
+      atol: Absolute tolerance.
+      quantiles: Quantiles that must also converge. Default is none.
+      confidence: Confidence level of the intervals.
+      max_num: Maximum number of samples. With replicates, antithetic
+        pairs or strata, it must be a multiple of the sampling block,
+        like batch.
+
+    :Example:
+
+    >>> mc = MonteCarlo([x, y], 100, response=False,
+    ...                 iteration_cb=Converged(batch=100, rtol=.01))
+    """
+    def __init__(self, batch, rtol=0.01, atol=0.0, quantiles=[], confidence=0.95, max_num=100000):
+        if batch <= 0:
+            raise ValueError("batch must be positive.")
+        self.batch = int(batch)
+        self.rtol = rtol
+        self.atol = atol
+        self.quantiles = list(quantiles)
+        self.confidence = confidence
+        self.max_num = max_num
+        self.stats = {}
+        self.sketches = {}
+
+    def __call__(self, sweep, hf):
+        z = ndtri(0.5 + self.confidence / 2.0)
+        done = True
+        num = 0
+        for var in get_output_names(hf):
+            data = hf['/output/data/%s' % var][()]
+            stats = self.stats.setdefault(var, RunningStats())
+            if var not in self.sketches:
+                self.sketches[var] = QuantileSketch(options['pdf']['sketch'], sweep.psweep.sketch_rng(var))
+            sketch = self.sketches[var]
+            stats.add(data[stats.n:])
+            sketch.add(data[sketch.n:])
+            num = stats.n
+
+            err = sweep.psweep._std_err(data)
+            if err is None:
+                err = stats.dev / np.sqrt(max(stats.n - 1, 1))
+            half = z * err
+            ok = half <= max(self.atol, self.rtol * abs(stats.mean))
+            print("%s: Mean = %s +/- %s (%d samples)" % (var, stats.mean, half, stats.n))
+            if self.quantiles:
+                val = sketch.quantile(self.quantiles)
+                lo, hi = sketch.quantile_bounds(self.quantiles, self.confidence)
+                ok &= np.all((hi - lo) / 2 <= np.maximum(self.atol, self.rtol * np.abs(val)))
+            done &= bool(ok)
+
+        if done:
+            print("Converged after %d samples." % num)
+            return True
+        if num >= self.max_num:
+            print("Not converged after %d samples." % num)
+            return True
+        sweep.psweep.extend(min(self.batch, self.max_num - num))
+        return False
@@ -4,10 +4,14 @@ Options database for the UQ framework.
 This is a global database of parameters that control internal details
 of operations like plotting.
 """
+import os
 
 options = {
     'verbose': 1,
     'keep': 0,
+
+    # HDF5 file of optimized Latin hypercube designs
+    'lhs_cache': os.path.join(os.path.expanduser('~'), '.puq', 'lhs_cache.hdf5'),
     'plot':
         {
             'format': 'i',
@@ -17,11 +21,60 @@ options = {
             # number of sample points in PDF
             'numpart': 100,
 
+            # grid for PDFs. 'uniform' uses 'numpart' evenly spaced
+            # points. 'adaptive' places points where they are needed
+            # to interpolate each PDF to within 'tol' times its mean
+            # density, so no probability is off by more than 'tol'.
+            # Sums and products of adaptive PDFs start from a grid of
+            # 'numpart' points and refine it until the result is
+            # within 'tol'.
+            'grid': 'uniform',
+            'tol': 1e-4,
+
             # range to use for building response
             'range': 0.999,
 
             # range to use for printing
             'srange': 0.995,
+
+            # convolution method used for arithmetic on PDFs.
+            # 'direct', 'fft', or 'auto' to pick the faster one.
+            'conv': 'auto',
+
+            # Gaussian KDE method used by ExperimentalPDF(fit=True).
+            # 'exact', 'binned', or 'auto' to use 'binned' for
+            # more than 'kde_min' data points.
+            'kde': 'auto',
+            'kde_min': 10000,
+
+            # quantiles reported for sampled outputs, the confidence
+            # level of their bounds, and the compression of the
+            # QuantileSketch used to compute them.
+            'quantiles': [0.05, 0.5, 0.95],
+            'confidence': 0.95,
+            'sketch': 1000,
+
+            # how parameter samples are drawn from PDFs for response
+            # surfaces and outputs. 'ds' for descriptive sampling, or
+            # 'sobol' or 'halton' for quasi-random sequences.
+            'sequence': 'ds',
+        },
+    'response':
+        {
+            # interpolation used by SampledFunc. 'rbf' fits radial
+            # basis functions to all points. 'local' fits them to the
+            # 'neighbors' nearest points of each evaluation, which
+            # scales to many more points but is less accurate and not
+            # continuous where the neighbors change. 'auto' uses
+            # 'local' for more than 'local_min' points.
+            'interp': 'rbf',
+            'local_min': 2000,
+            'neighbors': 50,
+
+            # Function.evala and Function.pdf evaluate at most 'chunk'
+            # points at a time, using 'workers' threads.
+            'chunk': 2**16,
+            'workers': 1,
         },
     }
 
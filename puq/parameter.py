@@ -9,6 +9,9 @@ See LICENSE file for terms.
 from __future__ import absolute_import, division, print_function
 
 from puq.pdf import NormalPDF, UniformPDF, ExperimentalPDF, WeibullPDF, RayleighPDF, ExponPDF, PDF
+from puq.options import options
+from puq.design import sample_design, ppf_columns
+from puq import qmc
 from logging import debug
 import sys
 import matplotlib
@@ -21,8 +24,14 @@ import numpy as np
 
 
 # return an array of parameter samples
-def get_psamples(params, psamples=None, num=None):
+# sequence is how samples are drawn from PDFs: 'ds' for descriptive
+# sampling, or 'sobol' or 'halton'. Default is options['pdf']['sequence'].
+def get_psamples(params, psamples=None, num=None, sequence=None):
     xseed = None
+    if sequence is None:
+        sequence = options['pdf']['sequence']
+    if sequence != 'ds' and sequence not in qmc.SEQUENCES:
+        raise ValueError("Unknown sequence '%s'" % sequence)
 
     use_samples = False
     for p in params:
@@ -46,23 +55,25 @@ def get_psamples(params, psamples=None, num=None):
     if xseed is None and not hasattr(p, 'pdf'):
         return None
 
-    for p in params:
+    xseed = np.empty((num_samples, len(params)), order='F')
+    cols = []
+    for i, p in enumerate(params):
         if hasattr(p, 'use_samples') and p.use_samples:
-            if xseed is None:
-                xseed = p.pdf.data.reshape(-1, 1)
-            else:
-                xseed = np.column_stack((xseed, p.pdf.data))
+            xseed[:, i] = p.pdf.data
         elif psamples and p.name in psamples:
             print('Using CSV data for %s' % p.name)
-            if xseed is None:
-                xseed = psamples[p.name].reshape(-1, 1)
-            else:
-                xseed = np.column_stack((xseed, psamples[p.name]))
+            xseed[:, i] = psamples[p.name]
+        else:
+            cols.append(i)
+
+    # The rest are sampled from their PDFs, all at once.
+    # Quasi-random samples come from one joint sequence.
+    if cols:
+        pdfs = [params[i].pdf for i in cols]
+        if sequence == 'ds':
+            xseed[:, cols] = sample_design(pdfs, num_samples, 'ds')
         else:
-            if xseed is None:
-                xseed = p.pdf.ds(num_samples).reshape(-1, 1)
-            else:
-                xseed = np.column_stack((xseed, p.pdf.ds(num_samples)))
+            xseed[:, cols] = ppf_columns(pdfs, qmc.sequence(sequence, num_samples, len(cols)))
     return xseed
 
 
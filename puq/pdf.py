@@ -15,7 +15,9 @@ import math
 from scipy import trapz, interpolate
 import scipy.stats
 from puq.options import options
+from puq.sketch import QuantileSketch
 from scipy.stats import gaussian_kde
+from scipy.special import ndtr, ndtri
 from logging import info, debug, exception, warning, critical
 import sys, matplotlib
 if sys.platform == 'darwin':
@@ -44,8 +46,20 @@ class PDF(object):
     Args:
       xvals (1D array or list): x values
       yvals (1D array or list): values for PDF(x)
+
+    By default, the PDF is resampled to options['pdf']['numpart']
+    evenly spaced points.  If options['pdf']['grid'] is 'adaptive',
+    only the points needed to interpolate the PDF to within
+    options['pdf']['tol'] times its mean over its range are kept,
+    so no probability is off by more than options['pdf']['tol'].
+    Arithmetic on adaptive PDFs works on their points directly, so
+    narrow peaks and sharp edges do not need a fine grid everywhere.
     """
 
+    # Closed form distribution this PDF was built from, as
+    # [name, [parameters]] for _CLOSED_FORM. None if there is none.
+    dist = None
+
     def __init__(self, xvals, yvals):
         # if order is reversed, flip it
         if xvals[0] > xvals[-1]:
@@ -102,6 +116,10 @@ class PDF(object):
         else:
             mmax = xvals[-1]
 
+        if _grid() == 'adaptive':
+            self._adapt(np.asarray(xvals, dtype=float), np.abs(np.asarray(yvals, dtype=float)), mmin, mmax, resample)
+            return
+
         # resample if not even spacing
         if not resample:
             resample = not np.allclose(np.diff(xvals)[0], np.diff(xvals))
@@ -122,6 +140,23 @@ class PDF(object):
         self.mean = trapz(self.x * self.y, self.x)
         self.dev = np.sqrt(np.abs(trapz(self.y * (self.x - self.mean)**2, self.x)))
 
+    def _adapt(self, xvals, yvals, mmin, mmax, trim):
+        """
+        Sets an adaptive grid from the points (xvals, yvals),
+        trimmed to [mmin, mmax] if trim is set.
+        """
+        if trim:
+            inside = (xvals > mmin) & (xvals < mmax)
+            yvals = np.concatenate(([np.interp(mmin, xvals, yvals)], yvals[inside], [np.interp(mmax, xvals, yvals)]))
+            xvals = np.concatenate(([mmin], xvals[inside], [mmax]))
+        idx = _simplify(xvals, yvals, options['pdf']['tol'] * _level(xvals, yvals))
+        self.x = xvals[idx]
+        self.y = yvals[idx] / trapz(yvals[idx], self.x)
+        self.cdfy = np.append([0.0], np.cumsum((np.diff(self.y)/2.0 + self.y[:-1])*np.diff(self.x)))
+        self.cdfy /= self.cdfy[-1]
+        self.mean = trapz(self.x * self.y, self.x)
+        self.dev = np.sqrt(np.abs(trapz(self.y * (self.x - self.mean)**2, self.x)))
+
     @property
     def range(self):
         """
@@ -186,6 +221,9 @@ class PDF(object):
         Returns:
           Array of cdf(x).
         """
+        if self.dist is not None:
+            cdf, _ppf, fa, fb = self._closed_form()
+            return np.clip((cdf(np.asarray(arr, dtype=float)) - fa) / (fb - fa), 0.0, 1.0)
         return np.interp(arr, self.x, self.cdfy, left=0.0, right=1.0)
 
     def ppf(self, arr):
@@ -197,9 +235,25 @@ class PDF(object):
         Returns:
           Array of ppf(x).
         """
+        if self.dist is not None:
+            _cdf, ppf, fa, fb = self._closed_form()
+            p = np.clip(arr, 0.0, 1.0)
+            res = np.clip(ppf(fa + p * (fb - fa)), self.x[0], self.x[-1])
+            return np.where(p == 0, self.x[0], np.where(p == 1, self.x[-1], res))[()]
         return np.interp(arr, self.cdfy, self.x)
 
-    def lhs1(self, num):
+    def _closed_form(self):
+        """
+        Returns the cdf and ppf of the distribution in self.dist, and
+        its cdf at both ends of our range.  The distribution is
+        truncated to the range.
+        """
+        name, args = self.dist
+        cdf, ppf = _CLOSED_FORM[name]
+        return (lambda x: cdf(x, *args), lambda p: ppf(p, *args),
+                cdf(self.x[0], *args), cdf(self.x[-1], *args))
+
+    def lhs1(self, num, rng=None):
         """
         Latin Hypercube Sample in [-1,1] for this distribution.
 
@@ -211,13 +265,14 @@ class PDF(object):
 
         Args:
           num: Number of samples to generate.
+          rng: numpy RandomState to use instead of the global one.
         Returns:
           1D array of length *num*.
         """
         pmin, pmax = self.range
-        return (2. * self.lhs(num) - (pmax + pmin)) / (pmax - pmin)
+        return (2. * self.lhs(num, rng) - (pmax + pmin)) / (pmax - pmin)
 
-    def ds1(self, num):
+    def ds1(self, num, rng=None):
         '''
         Generates a descriptive sample in [-1,1] for this distribution.
 
@@ -228,12 +283,13 @@ class PDF(object):
         This method is used by :mod:`puq.Smolyak`.
 
         :param num: Number of samples to generate.
+        :param rng: numpy RandomState to use instead of the global one.
         :returns: 1D array of length *num*.
         '''
         pmin, pmax = self.range
-        return (2. * self.ds(num) - (pmax + pmin)) / (pmax - pmin)
+        return (2. * self.ds(num, rng) - (pmax + pmin)) / (pmax - pmin)
 
-    def lhs(self, num):
+    def lhs(self, num, rng=None):
         '''
         Latin Hypercube Sample for this distribution.
 
@@ -242,11 +298,13 @@ class PDF(object):
         This method is used by :class:`LHS`.
 
         :param num: Number of samples to generate.
+        :param rng: numpy RandomState to use instead of the global one.
         :returns: 1D array of length *num*.
         '''
-        return np.random.permutation(self.ppf((np.arange(0, num) + np.random.uniform(0, 1, num))/num))
+        rng = rng or np.random
+        return rng.permutation(self.ppf((np.arange(0, num) + rng.uniform(0, 1, num))/num))
 
-    def ds(self, num):
+    def ds(self, num, rng=None):
         '''
         Generates a descriptive sample for this distribution.
 
@@ -256,20 +314,24 @@ class PDF(object):
         This method is used by :class:`LHS`.
 
         :param num: Number of samples to generate.
+        :param rng: numpy RandomState to use instead of the global one.
         :returns: 1D array of length *num*.
         '''
-        return np.random.permutation(self.ppf(np.arange(0.5, num)/num))
+        rng = rng or np.random
+        return rng.permutation(self.ppf(np.arange(0.5, num)/num))
 
-    def random(self, num):
+    def random(self, num, rng=None):
         """
         Generate random numbers fitting this parameter's distribution.
 
         This method is used by :class:`MonteCarlo`.
 
         :param num: Number of samples to generate.
+        :param rng: numpy RandomState to use instead of the global one.
         :returns: 1D array of length *num*.
         """
-        return self.ppf(np.random.uniform(0, 1, num))
+        rng = rng or np.random
+        return self.ppf(rng.uniform(0, 1, num))
 
     def __neg__(self):
         return PDF(-self.x[::-1], self.y[::-1])
@@ -292,7 +354,12 @@ class PDF(object):
         if sys.version[0] == "2" and isinstance(b, long):
             return self._nadd(b)
 
+        if not isinstance(b, PDF):
+            return NotImplemented
+
         a = self
+        if _grid() == 'adaptive':
+            return PDF(*_adaptive_sum(a, b))
         if (a.x[-1] - a.x[0] < b.x[-1] - b.x[0]):
             a, b = b, a
 
@@ -305,7 +372,7 @@ class PDF(object):
         cx = np.linspace(0, ar, nsamp)
         dx = ar/(nsamp-1.0)
         blen = int(math.ceil(br/dx))
-        c = np.convolve(a.pdf(cx + a0), b.pdf(cx[:blen] + b0))
+        c = _convolve(a.pdf(cx + a0), b.pdf(cx[:blen] + b0))
         cx = np.linspace(a0 + b0, a1 + b1, num=len(c), endpoint=False)
         return PDF(cx, c)
 
@@ -332,22 +399,27 @@ class PDF(object):
         if sys.version[0] == "2" and isinstance(b, long):
             return self._nmul(b)
 
+        if not isinstance(b, PDF):
+            return NotImplemented
+
         a = self
         # if second variable crosses 0, swap the order for best results
         if b.x[0] < 0 and b.x[-1] > 0:
             a, b = b, a
         extremes = np.outer([a.x[0], a.x[-1]], [b.x[0], b.x[-1]])
         zmin, zmax = np.min(extremes), np.max(extremes)
+        if _grid() == 'adaptive':
+            return PDF(*_adaptive_product(a, b, zmin, zmax))
         bx = b.x
-        by = b.y.reshape(-1, 1)
+        by = b.y
         if zmin * zmax <= 0:
             # if the range crosses 0, do not evaluate at 0
             by = by[bx != 0.0]
             bx = bx[bx != 0.0]
 
-        cx = np.linspace(zmin, zmax, options['pdf']['numpart'])
-        cy = np.sum(np.abs([a.pdf(cx/x)/x for x in bx]) * by, 0)
-        return PDF(cx, cy)
+        if _conv_method(len(a.x), len(b.x)) == 'fft':
+            return PDF(*_sample(lambda cx: _mellin_kernel(a, b, cx), zmin, zmax))
+        return PDF(*_sample(lambda cx: _product_kernel(a.pdf, bx, by, cx), zmin, zmax))
 
     def _ndiv(self, b):
         if b == 0:
@@ -361,9 +433,7 @@ class PDF(object):
             raise ValueError("Dividing 0 by a PDF does not return a PDF")
         extremes = [b/self.x[0], b/self.x[-1]]
         zmin, zmax = np.min(extremes), np.max(extremes)
-        nsamp = options['pdf']['numpart']
-        cx = np.linspace(zmin, zmax, nsamp)
-        return PDF(cx, self.pdf(b/cx)/cx**2)
+        return PDF(*_sample(lambda cx: self.pdf(b/cx)/cx**2, zmin, zmax))
 
     def __truediv__(self, b):
         return self.__div__(b)
@@ -379,17 +449,19 @@ class PDF(object):
         if sys.version[0] == "2" and isinstance(b, long):
             return self._ndiv(b)
 
+        if not isinstance(b, PDF):
+            return NotImplemented
+
         if b.x[0]*b.x[-1] <= 0:
             raise ValueError("Cannot divide by PDFs that include 0")
         a = self
         extremes = np.outer([a.x[0], a.x[-1]], [1.0/b.x[0], 1.0/b.x[-1]])
         zmin, zmax = np.min(extremes), np.max(extremes)
-        bx = b.x
-        by = b.y.reshape(-1, 1)
-        nsamp = options['pdf']['numpart']
-        cx = np.linspace(zmin, zmax, nsamp)
-        cy = np.sum([a.pdf(x * cx)*x for x in bx] * by, 0)
-        return PDF(cx, cy)
+        if _grid() == 'adaptive':
+            return PDF(*_adaptive_product(a, b, zmin, zmax, div=True))
+        if _conv_method(len(a.x), len(b.x)) == 'fft':
+            return PDF(*_sample(lambda cx: _mellin_kernel(a, b, cx, div=True), zmin, zmax))
+        return PDF(*_sample(lambda cx: _product_kernel(a.pdf, b.x, b.y, cx, div=True), zmin, zmax))
 
     @property
     def mode(self):
@@ -441,6 +513,521 @@ class PDF(object):
         p.text(self.__str__())
 
 
+# Number of evenly spaced points adaptive sampling starts from
+_ADAPTIVE_START = 33
+
+# Maximum number of points in an adaptive grid, or in the grids
+# used for arithmetic on adaptive grids
+_ADAPTIVE_MAX = 2**14
+
+
+def _grid():
+    """
+    Returns options['pdf']['grid'], 'uniform' or 'adaptive'.
+    """
+    grid = options['pdf'].get('grid', 'uniform')
+    if grid not in ['uniform', 'adaptive']:
+        raise ValueError("Unknown grid '%s'" % grid)
+    return grid
+
+
+def _is_even(x):
+    "True if the points x are evenly spaced."
+    if len(x) < 3:
+        return True
+    return np.allclose(np.diff(x), (x[-1] - x[0]) / (len(x) - 1.0))
+
+
+def _level(x, y):
+    """
+    Returns the mean of the density y over the range of x.
+    Interpolation errors below tol times this change no
+    probability by more than tol, even in long tails.
+    """
+    return trapz(np.abs(y), x) / (x[-1] - x[0])
+
+
+def _simplify(x, y, tol):
+    """
+    Returns the indices of a subset of the points (x, y) such that
+    linear interpolation through them is within tol of every y.
+
+    Starting from the endpoints, every interval that misses by
+    more than tol is split at its middle point.
+    """
+    n = len(x)
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    # intervals [lo, hi] still to be checked
+    lo, hi = np.array([0]), np.array([n - 1])
+    while len(lo):
+        # the points inside each interval
+        inner = hi - lo - 1
+        seg = np.repeat(np.arange(len(lo)), inner)
+        pos = np.arange(len(seg)) - np.repeat(np.cumsum(inner) - inner, inner) + lo[seg] + 1
+        i, j = lo[seg], hi[seg]
+        t = (x[pos] - x[i]) / (x[j] - x[i])
+        err = np.abs(y[pos] - (y[i] + t * (y[j] - y[i])))
+        bad = np.unique(seg[err > tol])
+        mid = (lo[bad] + hi[bad]) // 2
+        keep[mid] = True
+        lo, hi = np.concatenate((lo[bad], mid)), np.concatenate((mid, hi[bad]))
+    return np.flatnonzero(keep)
+
+
+def _refine(f, min, max, tol):
+    """
+    Samples f on [min, max] for linear interpolation.
+
+    Intervals are bisected while linear interpolation misses f at
+    their midpoint by more than tol times the mean of f.
+    Intervals are not made smaller than (max - min) / _ADAPTIVE_MAX,
+    so singularities stop the refinement. Returns the arrays x and f(x).
+    """
+    x = np.linspace(min, max, _ADAPTIVE_START)
+    y = f(x)
+    width = 2.0 * (max - min) / _ADAPTIVE_MAX
+    while len(x) < _ADAPTIVE_MAX:
+        xm = (x[:-1] + x[1:]) / 2.0
+        ym = f(xm)
+        err = np.abs(ym - (y[:-1] + y[1:]) / 2.0)
+        bad = np.flatnonzero((err > tol * _level(x, y)) & (np.diff(x) >= width))
+        if len(bad) == 0:
+            break
+        x = np.insert(x, bad + 1, xm[bad])
+        y = np.insert(y, bad + 1, ym[bad])
+    return x, y
+
+
+def _sample(f, min, max):
+    """
+    Samples the (unnormalized) density f on [min, max].
+
+    Uses options['pdf']['numpart'] evenly spaced points or, if
+    options['pdf']['grid'] is 'adaptive', points refined to
+    options['pdf']['tol']. Returns the arrays x and f(x).
+    """
+    if _grid() == 'adaptive':
+        return _refine(f, min, max, options['pdf']['tol'])
+    x = np.linspace(min, max, options['pdf']['numpart'])
+    return x, f(x)
+
+
+def _binner(p):
+    """
+    Returns a function that splits the probability of p between the
+    increasing array of points it is called with.  The probability
+    between two neighboring points goes to both of them in proportion
+    to its mean distance from the other one, so the mean of p is kept.
+    The piecewise linear density of p is integrated exactly, so PDFs
+    with few points keep their shape.
+    """
+    x = np.asarray(p.x, dtype=float)
+    y = np.asarray(p.y, dtype=float)
+    dx = np.diff(x)
+    s = np.diff(y) / dx
+    # integrals of the density and of x times the density
+    # from x[0] to each point
+    f0 = np.append([0.0], np.cumsum((y[:-1] + y[1:]) / 2.0 * dx))
+    m0 = np.append([0.0], np.cumsum(dx * (x[:-1] * y[:-1] + (x[:-1] * s + y[:-1]) * dx / 2.0 + s * dx**2 / 3.0)))
+
+    def bin(nodes):
+        t = np.clip(nodes, x[0], x[-1])
+        i = np.clip(np.searchsorted(x, t, side='right') - 1, 0, len(x) - 2)
+        d = t - x[i]
+        f = f0[i] + d * (y[i] + s[i] * d / 2.0)
+        m = m0[i] + d * (x[i] * y[i] + (x[i] * s[i] + y[i]) * d / 2.0 + s[i] * d**2 / 3.0)
+        mass = np.diff(f)
+        right = (np.diff(m) - nodes[:-1] * mass) / np.diff(nodes)
+        w = np.zeros(len(nodes))
+        w[:-1] += mass - right
+        w[1:] += right
+        return w / f0[-1]
+    return bin
+
+
+def _converge(f):
+    """
+    Calls f(n), which computes a density on a grid of n points and
+    returns the arrays x and y.  Starting from options['pdf']['numpart'],
+    the grid is refined until the error of y is below
+    options['pdf']['tol'] times its mean, or n reaches _ADAPTIVE_MAX.
+    Errors from binning fall with the square of the spacing, so the
+    error is taken to be a third of the change from the last grid.
+    """
+    n = options['pdf']['numpart']
+    x, y = f(n)
+    while 2 * n - 1 <= _ADAPTIVE_MAX:
+        n = 2 * n - 1
+        x2, y2 = f(n)
+        change = np.max(np.abs(np.interp(x, x2, y2) - y))
+        x, y = x2, y2
+        if change <= 3.0 * options['pdf']['tol'] * _level(x, y):
+            break
+    return x, y
+
+
+def _adaptive_sum(a, b):
+    """
+    Computes the density of a + b for adaptive grids.
+
+    The probabilities of a and b, binned with _binner() on grids with
+    spacing h, are convolved.  Unlike sampling the densities, this
+    keeps all the probability of peaks narrower than h, so h only
+    has to resolve the sum, and is set with _converge().  Returns
+    the arrays x and y.
+    """
+    lo, hi = a.x[0] + b.x[0], a.x[-1] + b.x[-1]
+    bins = [(p, _binner(p)) for p in [a, b]]
+
+    def density(n):
+        h = (hi - lo) / (n - 1.0)
+        m = []
+        for p, bin in bins:
+            k = int(math.ceil((p.x[-1] - p.x[0]) / h))
+            m.append(bin(p.x[0] + h * np.arange(k + 1)))
+        c = _convolve(m[0], m[1]) / h
+        return lo + h * np.arange(len(c)), c
+    return _converge(density)
+
+
+def _adaptive_product(a, b, zmin, zmax, div=False):
+    """
+    Computes the density of a * b (or a / b if div is True) on
+    [zmin, zmax] for adaptive grids.
+
+    As in _mellin_kernel(), the density of log|a*b| on each part of
+    constant sign is a convolution, here of the probabilities of
+    log|a| and log|b| binned on grids with spacing du, as in
+    _adaptive_sum().  Between two nodes, the probability is split
+    linearly in x rather than in log|x|.  All the nodes are multiples
+    of du, so the parts with the same sign add up.  Probability closer
+    to 0 than the parts from _log_parts() goes to their first node,
+    and points closer to 0 than (zmax - zmin) / _ADAPTIVE_MAX are
+    dropped.  Returns the arrays x and y.
+    """
+    aparts = _log_parts(a)
+    bparts = _log_parts(b)
+    abin, bbin = _binner(a), _binner(b)
+    span = builtins.max([umax - umin for _s, umin, umax, _d in aparts + bparts])
+    cut = (zmax - zmin) / _ADAPTIVE_MAX
+
+    def masses(bin, parts, du, flip=False):
+        # returns (sign, k0, m) with m[i] the probability of
+        # log|p| binned to (k0 + i) * du
+        out = []
+        for sign, umin, umax, _d in parts:
+            k0, k1 = int(math.floor(umin / du)), int(math.ceil(umax / du))
+            e = np.append([0.0], np.exp(du * np.arange(k0, k1 + 1)))
+            if sign > 0:
+                m = bin(e)
+            else:
+                m = bin(-e[::-1])[::-1]
+            m = m[1:] + np.append(m[0], np.zeros(len(m) - 2))
+            if flip:
+                k0, m = -k1, m[::-1]
+            out.append((sign, k0, m))
+        return out
+
+    def density(n):
+        du = span / (n - 1.0)
+        am, bm = masses(abin, aparts, du), masses(bbin, bparts, du, div)
+        x, y = [], []
+        for sign in [-1, 1]:
+            parts = [(ka + kb, _convolve(ma, mb))
+                     for sa, ka, ma in am for sb, kb, mb in bm if sa * sb == sign]
+            if not parts:
+                continue
+            k0 = builtins.min([k for k, _c in parts])
+            g = np.zeros(builtins.max([k + len(c) for k, c in parts]) - k0)
+            for k, c in parts:
+                g[k - k0:k - k0 + len(c)] += c
+            z = np.exp(du * np.arange(k0, k0 + len(g)))
+            if sign < 0:
+                z, g = -z[::-1], g[::-1]
+            x.append(z)
+            y.append(g / (du * np.abs(z)))
+        x, y = np.concatenate(x), np.concatenate(y)
+        keep = (np.abs(x) >= cut) & (x > zmin) & (x < zmax)
+        x, y = x[keep], y[keep]
+        return np.concatenate(([zmin], x, [zmax])), np.concatenate(([y[0]], y, [y[-1]]))
+    return _converge(density)
+
+
+# Below this many points in the shorter input, np.convolve
+# is faster than an FFT.
+_FFT_MIN = 500
+
+
+def _conv_method(na, nb):
+    """
+    Returns 'direct' or 'fft' for inputs of length na and nb,
+    as selected by options['pdf']['conv'].
+    """
+    method = options['pdf'].get('conv', 'auto')
+    if method == 'auto':
+        if builtins.min(na, nb) > _FFT_MIN:
+            return 'fft'
+        return 'direct'
+    if method not in ['direct', 'fft']:
+        raise ValueError("Unknown convolution method '%s'" % method)
+    return method
+
+
+def _convolve(a, b):
+    """
+    Linear convolution of two sampled PDFs.
+
+    Uses np.convolve or an FFT, depending on options['pdf']['conv'].
+    Both return the full convolution of length len(a) + len(b) - 1,
+    so callers can do the same range bookkeeping for either method.
+    """
+    if _conv_method(len(a), len(b)) == 'direct':
+        return np.convolve(a, b)
+
+    # zero-pad to a power of two so the circular convolution
+    # computed by the FFT does not wrap around
+    n = len(a) + len(b) - 1
+    nfft = 1 << (n - 1).bit_length()
+    c = np.fft.irfft(np.fft.rfft(a, nfft) * np.fft.rfft(b, nfft), nfft)[:n]
+
+    # remove roundoff noise so tails stay exactly zero
+    c[c < np.finfo(float).eps * n * np.max(c)] = 0.0
+    return c
+
+
+# Maximum number of elements in the temporary arrays
+# used by _product_kernel()
+_KERNEL_CHUNK = 2**20
+
+
+def _product_kernel(fpdf, bx, by, cx, div=False):
+    """
+    Computes the (unnormalized) PDF of a product or quotient at cx.
+
+    For a product, returns sum(|fpdf(cx/x)/x| * y) over all points
+    (x, y) of the second PDF.  For a quotient, returns
+    sum(fpdf(cx*x) * x * y). The sum is computed as a matrix
+    product over blocks of x values so the temporary arrays
+    never hold more than _KERNEL_CHUNK elements.
+    """
+    bx = np.asarray(bx, dtype=float)
+    by = np.asarray(by, dtype=float)
+    cy = np.zeros(len(cx))
+    step = builtins.max(1, _KERNEL_CHUNK // len(cx))
+    for i in range(0, len(bx), step):
+        x = bx[i:i+step].reshape(-1, 1)
+        if div:
+            k = fpdf(x * cx) * x
+        else:
+            k = np.abs(fpdf(cx / x) / x)
+        cy += np.dot(by[i:i+step], k)
+    return cy
+
+
+# Parts of a PDF touching 0 are truncated at this fraction of
+# their largest magnitude before being mapped to log space.
+_MELLIN_EPS = 1e-6
+
+# Maximum number of points in the log-space grids
+_MELLIN_MAX = 2**22
+
+
+def _log_parts(p):
+    """
+    Splits the range of a PDF into its positive and negative parts.
+
+    Returns a list of (sign, umin, umax, du) where [umin, umax] is the
+    interval covered by log(abs(x)) on that part and du is the step
+    in log space matching the spacing of p.x at the largest abs(x).
+    """
+    parts = []
+    dx = (p.x[-1] - p.x[0]) / (len(p.x) - 1.0)
+    for sign in [1, -1]:
+        lo, hi = np.sort([sign * p.x[0], sign * p.x[-1]])
+        if hi <= 0:
+            continue
+        if lo <= 0:
+            lo = hi * _MELLIN_EPS
+        parts.append((sign, math.log(lo), math.log(hi), dx / hi))
+    return parts
+
+
+def _mellin_kernel(a, b, cx, div=False):
+    """
+    Computes the PDF of a*b (or a/b if div is True) at cx using
+    convolutions in log space.
+
+    On each part of constant sign, log|a*b| = log|a| + log|b|, so the
+    density of log|a*b| is the convolution of the densities of log|a|
+    and log|b|, which is computed with _convolve().  For division,
+    the density of log|b| is reversed.  The results for all sign
+    combinations are mapped back with pdf(z) = g(log|z|) / |z|.
+    Points too close to 0 to be covered by the log grids are computed
+    with _product_kernel().
+    """
+    aparts = _log_parts(a)
+    bparts = _log_parts(b)
+
+    # all parts share the same step in log space, fine enough
+    # to resolve every part
+    du = builtins.min([pdu for _s, _u0, _u1, pdu in aparts + bparts])
+    npts = sum([umax - umin for _s, umin, umax, _d in aparts + bparts]) / du
+    if npts > _MELLIN_MAX:
+        du *= npts / _MELLIN_MAX
+
+    def sample(p, parts):
+        out = []
+        for sign, umin, umax, _d in parts:
+            u = umin + du * np.arange(int(math.ceil((umax - umin) / du)) + 1)
+            out.append((sign, umin, p.pdf(sign * np.exp(u)) * np.exp(u)))
+        return out
+
+    cy = np.zeros(len(cx))
+    covered = np.zeros(len(cx), dtype=bool)
+    for sa, ua, ga in sample(a, aparts):
+        for sb, ub, gb in sample(b, bparts):
+            if div:
+                ub = -(ub + du * (len(gb) - 1))
+                gb = gb[::-1]
+            h = _convolve(ga, gb) * du
+            hu = ua + ub + du * np.arange(len(h))
+            mask = sa * sb * cx > 0
+            z = np.abs(cx[mask])
+            cy[mask] += np.interp(np.log(z), hu, h, left=0.0, right=0.0) / z
+            covered[mask] |= np.log(z) >= hu[0]
+
+    if not np.all(covered):
+        bx, by = b.x, b.y
+        if not div:
+            by = by[bx != 0.0]
+            bx = bx[bx != 0.0]
+        dx = (b.x[-1] - b.x[0]) / (len(b.x) - 1.0)
+        cy[~covered] = np.abs(_product_kernel(a.pdf, bx, by, cx[~covered], div)) * dx
+    return cy
+
+
+def _kde_factor(n, bw):
+    """
+    Returns the bandwidth factor scipy.stats.gaussian_kde would use
+    for n 1D data points with bandwidth rule bw. The kernel standard
+    deviation is this times the sample standard deviation.
+    """
+    if bw is None or bw == 'scott':
+        return n ** (-1. / 5)
+    if bw == 'silverman':
+        return (n * 3 / 4.) ** (-1. / 5)
+    if np.isscalar(bw) and not isinstance(bw, str):
+        return bw
+    raise ValueError("`bw_method` should be 'scott', 'silverman', a scalar or a callable.")
+
+
+# Grid points per kernel standard deviation for _binned_kde()
+_KDE_GRID = 32
+
+# Kernels are truncated at this many standard deviations
+_KDE_TAIL = 6
+
+# Maximum number of points in the _binned_kde() grid
+_KDE_MAX = 2**22
+
+
+def _binned_kde(data, x, bw=None):
+    """
+    Gaussian KDE of data evaluated at x, computed by linear binning.
+
+    The data are binned onto a regular grid with _KDE_GRID points per
+    bandwidth, weighting the two nearest grid points by distance. The
+    binned counts are convolved with the sampled Gaussian kernel using
+    _convolve() and the result is interpolated at x.  The cost is
+    O(len(data) + grid size) instead of O(len(data) * len(x)) for
+    scipy.stats.gaussian_kde.  Bandwidths are the same as gaussian_kde's.
+    """
+    h = _kde_factor(len(data), bw) * np.std(data, ddof=1)
+    lo = builtins.max(np.min(data), x[0] - _KDE_TAIL * h)
+    hi = builtins.min(np.max(data), x[-1] + _KDE_TAIL * h)
+    if hi < lo:
+        return np.zeros(len(x))
+    lo -= _KDE_TAIL * h
+    hi += _KDE_TAIL * h
+    ngrid = int(builtins.min(_KDE_MAX, math.ceil((hi - lo) / h * _KDE_GRID) + 1))
+    delta = (hi - lo) / (ngrid - 1.0)
+
+    # linear binning. Data outside the grid are too far from x to matter.
+    t = (data - lo) / delta
+    t = t[(t >= 0) & (t < ngrid - 1)]
+    i = t.astype(int)
+    w = t - i
+    counts = np.bincount(i, 1.0 - w, ngrid) + np.bincount(i + 1, w, ngrid)
+
+    # linear binning smooths by a triangle kernel with variance delta**2/6
+    return _kde_counts(counts, lo, delta, h, x, delta**2 / 6.0)
+
+
+def _kde_counts(counts, lo, delta, h, x, var=0.0):
+    """
+    Gaussian KDE with kernel standard deviation h evaluated at x, from
+    data binned onto the grid lo + delta * arange(len(counts)).
+
+    The binning smooths the data by a kernel of variance var, which
+    is taken out of the Gaussian.  Returns the convolution of the
+    counts with the sampled kernel, interpolated at x.
+    """
+    hk = np.sqrt(builtins.max(h**2 - var, h**2 / 4.0))
+    L = int(math.ceil(_KDE_TAIL * h / delta))
+    kx = np.arange(-L, L + 1) * delta
+    kern = np.exp(-0.5 * (kx / hk)**2)
+    kern /= np.sum(kern) * delta * np.sum(counts)
+    dens = _convolve(counts, kern)
+    return np.interp(x, lo + delta * np.arange(-L, len(counts) + L), dens, left=0.0, right=0.0)
+
+
+def _kde_method(n, bw):
+    """
+    Returns 'exact' or 'binned' for n data points, as selected
+    by options['pdf']['kde'].
+    """
+    method = options['pdf'].get('kde', 'auto')
+    if method == 'auto':
+        if n > options['pdf'].get('kde_min', 10000) and not callable(bw):
+            return 'binned'
+        return 'exact'
+    if method not in ['exact', 'binned']:
+        raise ValueError("Unknown KDE method '%s'" % method)
+    return method
+
+
+# Vectorized cdf and ppf of distributions with closed forms.
+_CLOSED_FORM = {
+    'norm': (lambda x, mean, dev: ndtr((x - mean) / dev),
+             lambda p, mean, dev: mean + dev * ndtri(p)),
+    'uniform': (lambda x, min, max: (x - min) / (max - min),
+                lambda p, min, max: min + p * (max - min)),
+    'expon': (lambda x, rate: -np.expm1(-rate * np.maximum(x, 0)),
+              lambda p, rate: -np.log1p(-p) / rate),
+    'weibull': (lambda x, shape, scale: -np.expm1(-(np.maximum(x, 0) / scale)**shape),
+                lambda p, shape, scale: scale * (-np.log1p(-p))**(1.0 / shape)),
+    'rayleigh': (lambda x, scale: -np.expm1(-np.maximum(x, 0)**2 / (2.0 * scale**2)),
+                 lambda p, scale: scale * np.sqrt(-2.0 * np.log1p(-p))),
+}
+
+
+# Log densities of closed form distributions with infinite tails
+_LOG_PDF = {
+    'norm': lambda x, mean, dev: -0.5 * ((x - mean) / dev)**2 - math.log(dev * math.sqrt(2 * math.pi)),
+}
+
+
+def _with_dist(p, name, *args):
+    """
+    Records the closed form distribution p was built from
+    so cdf, ppf and sampling can use it.
+    """
+    if len(p.x) > 1:
+        p.dist = [name, [float(a) for a in args]]
+    return p
+
+
 def _get_range(sfunc, min, max):
     " Truncate PDFs with long tails"
 
@@ -487,10 +1074,8 @@ def ExponPDF(rate):
 
     sfunc = scipy.stats.expon(loc=0, scale=1.0/rate)
 
-    nsamp = options['pdf']['numpart']
     min, max = _get_range(sfunc, None, None)
-    x = np.linspace(min, max, nsamp)
-    return PDF(x, sfunc.pdf(x))
+    return _with_dist(PDF(*_sample(sfunc.pdf, min, max)), 'expon', rate)
 
 
 def RayleighPDF(scale):
@@ -508,10 +1093,8 @@ def RayleighPDF(scale):
 
     sfunc = scipy.stats.rayleigh(loc=0, scale=scale)
 
-    nsamp = options['pdf']['numpart']
     min, max = _get_range(sfunc, None, None)
-    x = np.linspace(min, max, nsamp)
-    return PDF(x, sfunc.pdf(x))
+    return _with_dist(PDF(*_sample(sfunc.pdf, min, max)), 'rayleigh', scale)
 
 
 def WeibullPDF(shape, scale):
@@ -530,13 +1113,11 @@ def WeibullPDF(shape, scale):
 
     sfunc = scipy.stats.exponweib(1, shape, scale=scale)
 
-    nsamp = options['pdf']['numpart']
     mmin = None
     if sfunc.pdf(0) == np.PINF:
         mmin = .01
     min, max = _get_range(sfunc, mmin, None)
-    x = np.linspace(min, max, nsamp)
-    return PDF(x, sfunc.pdf(x))
+    return _with_dist(PDF(*_sample(sfunc.pdf, min, max)), 'weibull', shape, scale)
 
 
 def NormalPDF(mean, dev, min=None, max=None):
@@ -566,9 +1147,7 @@ def NormalPDF(mean, dev, min=None, max=None):
     a = (min - mean) / dev
     b = (max - mean) / dev
     sfunc = scipy.stats.truncnorm(a, b, loc=mean, scale=dev)
-    nsamp = options['pdf']['numpart']
-    x = np.linspace(min, max, nsamp)
-    return PDF(x, sfunc.pdf(x))
+    return _with_dist(PDF(*_sample(sfunc.pdf, min, max)), 'norm', mean, dev)
 
 
 def NetPDF(addr):
@@ -631,7 +1210,7 @@ def UniformPDF(min=None, max=None, mean=None):
     if min > max:
         raise ValueError("min must not be > mean or max!")
 
-    return PDF([min, max], [1, 1])
+    return _with_dist(PDF([min, max], [1, 1]), 'uniform', min, max)
 
 
 def TrianglePDF(min, mode, max):
@@ -659,7 +1238,7 @@ def JeffreysPDF(min, max):
     return PDF([min, max], [1.0 / (min * np.log(max/min)), 1.0 / (max * np.log(max/min))])
 
 
-def ExperimentalPDF(data, min=None, max=None, fit=False, bw=None, nbins=0, prior=None, error=None, force=False):
+def ExperimentalPDF(data, min=None, max=None, fit=False, bw=None, nbins=0, prior=None, error=None, force=False, sketch=False, rng=None):
     """
     Create an experimental PDF.
 
@@ -670,6 +1249,9 @@ def ExperimentalPDF(data, min=None, max=None, fit=False, bw=None, nbins=0, prior
     The PDF can built by binning the data and linearly
     interpolating, using a Gaussian KDE, or using Bayesian Inference.
 
+    For more than options['pdf']['kde_min'] data points, the Gaussian
+    KDE is computed on a binned grid with an FFT. See options['pdf']['kde'].
+
     :param data: Our quantity of interest.
     :type data: Array of scalars
     :param nbins:  Number of bins (used if fit is false).  Default is
@@ -686,6 +1268,12 @@ def ExperimentalPDF(data, min=None, max=None, fit=False, bw=None, nbins=0, prior
     :param error: Error in the data.  For example, the measurement error.
         Required for Bayesian.
     :type error: PDF. Typically a NormalPDF with a mean of 0.
+    :param sketch: Attach a :class:`QuantileSketch` of the data as
+        *sketch*, for quantiles and their confidence bounds. Its
+        compression is options['pdf']['sketch'].
+    :type sketch: boolean
+    :param rng: numpy RandomState for the sketch to use instead of
+        the global one.
     """
     data = np.array(data).astype(np.float64)
     if not force and min is not None and min > np.min(data):
@@ -694,12 +1282,15 @@ def ExperimentalPDF(data, min=None, max=None, fit=False, bw=None, nbins=0, prior
         raise ValueError('max cannot be set to less than maximum value in the data.')
     if nbins and nbins <= 1:
         raise ValueError("ERROR: invalid number of bins: %s" % nbins)
+    if sketch:
+        sketch = QuantileSketch(options['pdf']['sketch'], rng)
+        sketch.add(data)
 
     # constant
     if np.min(data) == np.max(data) and not error:
         p = PDF([np.min(data)], [1])
         p.data = data
-        return p
+        return _sketch(p, sketch)
 
     if len(data) < 1 or (len(data) == 1 and not error):
         raise ValueError("ERROR: need at least two data points to build a PDF, or a prior and 1 data point.")
@@ -708,21 +1299,36 @@ def ExperimentalPDF(data, min=None, max=None, fit=False, bw=None, nbins=0, prior
         # Bayesian parameter estimation
         if not isinstance(error, PDF):
             raise ValueError("ERROR: error is not a PDF")
-        data = data + error
-        p = posterior(data, prior)
+        if prior and not isinstance(prior, PDF):
+            raise ValueError("ERROR: prior is not a PDF")
+        # the likelihood of each value is error shifted by it
+        pdfs = [prior] if prior else []
+        if error.dist is not None and error.dist[0] in _LOG_PDF:
+            # the tails are not truncated, so the posterior can
+            # be anywhere the data are
+            rmin = np.min(data) + error.x[0]
+            rmax = np.max(data) + error.x[-1]
+        else:
+            rmin = np.max(data) + error.x[0]
+            rmax = np.min(data) + error.x[-1]
+        rmin = builtins.max([rmin] + [c.x[0] for c in pdfs])
+        rmax = builtins.min([rmax] + [c.x[-1] for c in pdfs])
+        p = _posterior(lambda x: _log_shifted(error, data, x) + _log_pdfs(pdfs, x), rmin, rmax)
     elif fit is True or (type(fit) is str and fit.lower() == 'gaussian'):
         # Gaussian KDE
         if np.min(data) == np.max(data):
             raise ValueError("Cannot generate PDF fron non-variable data.")
-        gkde = gaussian_kde(data, bw_method=bw)
         dev = np.std(data)
         mean = np.mean(data)
         if min is None:
             min = mean - 5 * dev
         if max is None:
             max = mean + 5 * dev
-        x = np.linspace(float(min), float(max), options['pdf']['numpart'])
-        p = PDF(x, gkde.evaluate(x))
+        if _kde_method(len(data), bw) == 'binned':
+            p = PDF(*_sample(lambda x: _binned_kde(data, x, bw), float(min), float(max)))
+        else:
+            gkde = gaussian_kde(data, bw_method=bw)
+            p = PDF(*_sample(gkde.evaluate, float(min), float(max)))
     else:
         # linear interpolation from histograms
         if nbins == 0:
@@ -731,35 +1337,53 @@ def ExperimentalPDF(data, min=None, max=None, fit=False, bw=None, nbins=0, prior
                 # constant
                 p = PDF([np.min(data)], [1])
                 p.data = data
-                return p
+                return _sketch(p, sketch)
             nbins = int((np.max(data) - np.min(data)) / (2*iqr/len(data)**(1.0/3)) + .5)
 
         y, bins = np.histogram(data, nbins, normed=True)
-        if len(bins) > 2:
-            x = bins[:-1] + np.diff(bins) / 2.0
-            sp = interpolate.splrep(x, y, s=0, k=1)
-            mmin = bins[0]
-            mmax = bins[-1]
-            if min is not None:
-                mmin = min
-            if max is not None:
-                mmax = max
-            x = np.linspace(float(mmin), float(mmax), options['pdf']['numpart'])
-            y = interpolate.splev(x, sp, der=0)
-            if np.isnan(np.sum(y)):
-                # interpolate failed. constant pdf
-                p = PDF([np.min(data)], [1])
-                p.data = [data[0]]
-                return p
-            y[y < 0] = 0    # if the extrapolation goes negative...
-            p = PDF(x, y)
-        else:
-            # not enough data. assume uniform over range
-            p = PDF([np.min(data), np.max(data)], [1, 1])
+        p = _hist_pdf(y, bins, min, max)
+        if p is None:
+            # interpolate failed. constant pdf
+            p = PDF([np.min(data)], [1])
+            p.data = [data[0]]
+            return _sketch(p, sketch)
     p.data = data
+    return _sketch(p, sketch)
+
+
+def _sketch(p, sketch):
+    if sketch:
+        p.sketch = sketch
     return p
 
 
+def _hist_pdf(y, bins, min=None, max=None):
+    """
+    Creates a PDF by linear interpolation between the centers of
+    histogram bins.  y are the densities in each bin and *bins* are
+    the bin edges, as returned by np.histogram(normed=True).
+    Returns None if the interpolation fails.
+    """
+    if len(bins) <= 2:
+        # not enough data. assume uniform over range
+        return PDF([bins[0], bins[-1]], [1, 1])
+
+    x = bins[:-1] + np.diff(bins) / 2.0
+    sp = interpolate.splrep(x, y, s=0, k=1)
+    mmin = bins[0]
+    mmax = bins[-1]
+    if min is not None:
+        mmin = min
+    if max is not None:
+        mmax = max
+    x = np.linspace(float(mmin), float(mmax), options['pdf']['numpart'])
+    y = interpolate.splev(x, sp, der=0)
+    if np.isnan(np.sum(y)):
+        return None
+    y[y < 0] = 0    # if the extrapolation goes negative...
+    return PDF(x, y)
+
+
 def HPDF(data, min=None, max=None):
     """
     Histogram PDF - initialized with points from a histogram.
@@ -807,12 +1431,97 @@ def posterior(data, prior=None):
         data = np.append(data, prior)
     else:
         data = np.array(data)
+    data = list(np.ravel(data))
 
     # The X range needs to be constrained to where all
     # the input PDFS are defined.
 
     rmin = max([c.x[0] for c in data])
     rmax = min([c.x[-1] for c in data])
-    x = np.linspace(rmin, rmax, options['pdf']['numpart'])
-    y = np.prod([c.pdf(x) for c in data], 0)
-    return PDF(x, y)
+    return _posterior(lambda x: _log_pdfs(data, x), rmin, rmax)
+
+
+# Points more than this below the maximum of the log posterior
+# are treated as outside of its mass.
+_POSTERIOR_LOG_RANGE = 40.0
+
+# Maximum number of times _posterior() zooms in on the mass
+_POSTERIOR_ZOOM = 20
+
+
+def _posterior(loglik, rmin, rmax):
+    """
+    Builds the PDF proportional to exp(loglik(x)) on [rmin, rmax].
+
+    With many data the posterior is much narrower than [rmin, rmax].
+    The grid is repeatedly narrowed to the points within
+    _POSTERIOR_LOG_RANGE of the maximum of loglik until they cover
+    at least a quarter of the grid.
+    """
+    if rmin >= rmax:
+        raise ValueError("ERROR: the data and prior PDFs do not overlap.")
+    nsamp = options['pdf']['numpart']
+    lo, hi = rmin, rmax
+    x = np.linspace(lo, hi, nsamp)
+    ll = loglik(x)
+    for _i in range(_POSTERIOR_ZOOM):
+        peak = np.max(ll)
+        if not np.isfinite(peak):
+            raise ValueError("ERROR: the posterior is zero everywhere.")
+        i = np.flatnonzero(ll > peak - _POSTERIOR_LOG_RANGE)
+        if i[-1] - i[0] >= nsamp // 4:
+            break
+        lo, hi = x[builtins.max(i[0] - 1, 0)], x[builtins.min(i[-1] + 1, nsamp - 1)]
+        x = np.linspace(lo, hi, nsamp)
+        ll = loglik(x)
+    peak = np.max(ll)
+    if _grid() == 'adaptive':
+        return PDF(*_sample(lambda x: np.exp(loglik(x) - peak), lo, hi))
+    return PDF(x, np.exp(ll - peak))
+
+
+def _log_pdfs(pdfs, x):
+    """
+    Returns the sum of the logs of the densities of pdfs at x.
+
+    The pdfs are moved to separate intervals so that one call to
+    np.interp evaluates a block of them at once. Blocks are sized
+    so the temporary arrays hold about _KERNEL_CHUNK elements.
+    """
+    x = np.asarray(x, dtype=float)
+    ll = np.zeros(len(x))
+    step = builtins.max(1, _KERNEL_CHUNK // len(x))
+    for i in range(0, len(pdfs), step):
+        block = pdfs[i:i+step]
+        x0 = np.array([p.x[0] for p in block], dtype=float)
+        x1 = np.array([p.x[-1] for p in block], dtype=float)
+        gap = x1 - x0 + np.max(x1 - x0)
+        if gap[0] == 0:
+            gap[:] = 1.0
+        off = np.cumsum(np.append(0.0, gap[:-1])) - x0
+        px = np.concatenate([p.x for p in block]) + np.repeat(off, [len(p.x) for p in block])
+        py = np.concatenate([p.y for p in block])
+        y = np.interp(x + off.reshape(-1, 1), px, py)
+        y[(x < x0.reshape(-1, 1)) | (x > x1.reshape(-1, 1))] = 0.0
+        with np.errstate(divide='ignore'):
+            ll += np.sum(np.log(y), 0)
+    return ll
+
+
+def _log_shifted(p, shifts, x):
+    """
+    Returns the sum of the logs of the density of p
+    shifted by each of shifts, at x.  If p has a closed form
+    in _LOG_PDF, that is used, without truncating its tails.
+    """
+    if p.dist is not None and p.dist[0] in _LOG_PDF:
+        name, args = p.dist
+        logpdf = lambda t: _LOG_PDF[name](t, *args)
+    else:
+        logpdf = lambda t: np.log(p.pdf(t))
+    ll = np.zeros(len(x))
+    step = builtins.max(1, _KERNEL_CHUNK // len(x))
+    for i in range(0, len(shifts), step):
+        with np.errstate(divide='ignore'):
+            ll += np.sum(logpdf(x - shifts[i:i+step].reshape(-1, 1)), 0)
+    return ll
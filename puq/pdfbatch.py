@@ -0,0 +1,632 @@
+"""
+Arrays of PDFs.
+
+A :class:`PDFBatch` holds many PDFs with the same number of points
+as 2-D arrays, one row per PDF, so evaluating, sampling and doing
+arithmetic on all of them takes a few numpy operations instead of
+a Python loop over :class:`PDF` objects.
+
+This file is part of PUQ
+Copyright (c) 2013-2016 PUQ Authors
+See LICENSE file for terms.
+"""
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+from puq.options import options
+from puq.pdf import PDF, _KERNEL_CHUNK, _is_even
+
+
+def _interp_rows(v, x0, dx, fp, left=0.0, right=0.0):
+    """
+    Row-wise linear interpolation on evenly spaced grids.
+
+    Row i of fp holds values at x0[i] + dx[i] * arange(m).  v has
+    one row of points per row of fp and any number of columns.
+    Rows with dx == 0 are single points, where the interpolant is
+    *right* for v >= x0 and *left* otherwise.
+    """
+    n, m = fp.shape
+    v = np.asarray(v, dtype=float)
+    shape = v.shape
+    v = v.reshape(n, -1)
+    x0 = x0.reshape(-1, 1)
+    dx = dx.reshape(-1, 1)
+    point = dx == 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (v - x0) / np.where(point, 1.0, dx)
+    i = np.clip(np.floor(t), 0, m - 2).astype(int)
+    f = np.clip(t - i, 0.0, 1.0)
+    # index the flattened array. It is faster than 2D fancy indexing.
+    i += np.arange(0, n * m, m).reshape(-1, 1)
+    fp = fp.ravel()
+    y0 = fp.take(i)
+    res = y0 + (fp.take(i + 1) - y0) * f
+
+    # allow for roundoff at the endpoints
+    eps = 1e-9
+    res[t < -eps] = left
+    res[t > m - 1 + eps] = right
+    pt = np.broadcast_to(point, v.shape)
+    res[pt] = np.where(v >= x0, right, left)[pt]
+    return res.reshape(shape)
+
+
+def _ppf_rows(x, cdfy, q):
+    """
+    Row-wise inverse of the CDFs in cdfy at q.  Matches np.interp(q, cdfy[i], x[i])
+    for each row i, using a vectorized binary search.
+    """
+    n, m = cdfy.shape
+    rows = np.arange(n).reshape(-1, 1)
+    lo = np.zeros(q.shape, dtype=int)
+    hi = np.empty(q.shape, dtype=int)
+    hi.fill(m - 1)
+    # find the largest j with cdfy[j] <= q
+    while np.any(hi > lo):
+        mid = (lo + hi + 1) // 2
+        cond = cdfy[rows, mid] <= q
+        lo = np.where(cond, mid, lo)
+        hi = np.where(cond, hi, mid - 1)
+    j = np.minimum(lo, m - 2)
+    c0 = cdfy[rows, j]
+    dc = cdfy[rows, j + 1] - c0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        f = np.where(dc > 0, (q - c0) / dc, 0.0)
+    f = np.clip(f, 0.0, 1.0)
+    res = x[rows, j] + f * (x[rows, j + 1] - x[rows, j])
+    last = q >= cdfy[:, -1:]
+    res[last] = np.broadcast_to(x[:, -1:], q.shape)[last]
+    return res
+
+
+def _cdf_rows(x, y):
+    "Trapezoidal cumulative integral of each row."
+    c = np.cumsum((np.diff(y, axis=1) / 2.0 + y[:, :-1]) * np.diff(x, axis=1), axis=1)
+    return np.column_stack([np.zeros(len(y)), c])
+
+
+def _finalize(x0, x1, y):
+    """
+    Builds a PDFBatch from unnormalized values y on evenly spaced
+    grids from x0 to x1.  This is the vectorized equivalent of
+    :meth:`PDF.__init__`. Tails are trimmed to options['pdf']['range']
+    and every row is resampled to options['pdf']['numpart'] points.
+    """
+    y = np.asarray(y, dtype=float)
+    x0 = np.asarray(x0, dtype=float)
+    x1 = np.asarray(x1, dtype=float)
+    n, m = y.shape
+    nsamp = options['pdf']['numpart']
+    _range = options['pdf']['range']
+    dx = (x1 - x0) / (m - 1.0)
+    x = x0.reshape(-1, 1) + dx.reshape(-1, 1) * np.arange(m)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cdfy = _cdf_rows(x, y)
+        cdfy /= cdfy[:, -1:]
+        q = np.empty((n, 4))
+        q[:] = [0, 1, (1.0 - _range)/2.0, (1.0 + _range)/2.0]
+        mmin, mmax, rmin, rmax = _ppf_rows(x, cdfy, q).T
+        dist = mmax - mmin
+        point = (dist == 0) | (x0 == x1)
+
+        # Trim tails that have grown to 10% of the range of the PDF
+        trim = np.isnan(mmin) | (np.abs((mmin - rmin) / dist) > .1)
+        mmin = np.where(trim, rmin, x0)
+        trim = np.isnan(mmax) | (np.abs((mmax - rmax) / dist) > .1)
+        mmax = np.where(trim, rmax, x1)
+    mmin[point] = x0[point]
+    mmax[point] = x0[point]
+
+    nx = mmin.reshape(-1, 1) + np.linspace(0.0, 1.0, nsamp) * (mmax - mmin).reshape(-1, 1)
+    ny = np.abs(_interp_rows(nx, x0, dx, y))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ny /= np.trapz(ny, nx, axis=1).reshape(-1, 1)
+    ny[point] = 0.0
+    return _make(nx, ny, point)
+
+
+def _make(x, y, point=None):
+    "Creates a PDFBatch from normalized rows, without resampling."
+    b = PDFBatch.__new__(PDFBatch)
+    if point is None:
+        point = x[:, 0] == x[:, -1]
+    b.x = x
+    b.y = y
+    b.cdfy = _cdf_rows(x, y)
+    b.cdfy[point] = 1.0
+    with np.errstate(invalid='ignore'):
+        b.mean = np.trapz(x * y, x, axis=1)
+        b.dev = np.sqrt(np.abs(np.trapz(y * (x - b.mean.reshape(-1, 1))**2, x, axis=1)))
+    b.mean[point] = x[point, 0]
+    b.dev[point] = 0.0
+    return b
+
+
+def _rowvals(b, n):
+    "Scalar or one value per row, as an array of length n, or None."
+    if isinstance(b, (PDF, PDFBatch)):
+        return None
+    b = np.asarray(b, dtype=float)
+    if b.ndim == 0:
+        return np.repeat(b, n)
+    if b.shape != (n,):
+        raise ValueError("Expected a scalar or an array of %d values, got shape %s" % (n, b.shape))
+    return b
+
+
+class PDFBatch(object):
+    """
+    An array of PDFs, stored as 2-D arrays with one row per PDF.
+
+    Use this instead of a list of :class:`PDF` objects when there are
+    many PDFs, for example one for every element of a mesh.  Methods
+    work on all PDFs at once and return arrays with one row per PDF.
+    Arithmetic works elementwise with scalars, arrays of one value
+    per PDF, a single :class:`PDF`, or another PDFBatch of the same
+    length.
+
+    Args:
+      xvals (2D array): Evenly spaced x values, one row per PDF.
+        A 1D array is used for all PDFs.
+      yvals (2D array): Values of each PDF at xvals.
+
+    Like :class:`PDF`, the PDFs are normalized, their tails are
+    trimmed and they are resampled to options['pdf']['numpart'] points.
+
+    :Example:
+
+    >>> b = PDFBatch.from_pdfs([NormalPDF(i, 1) for i in range(1000)])
+    >>> c = 2 * b + UniformPDF(0, 1)
+    >>> c.mean
+    """
+    def __init__(self, xvals, yvals):
+        yvals = np.atleast_2d(np.asarray(yvals, dtype=float))
+        xvals = np.asarray(xvals, dtype=float)
+        if xvals.ndim == 1:
+            xvals = np.tile(xvals, (len(yvals), 1))
+        if xvals.shape != yvals.shape:
+            raise ValueError("xvals and yvals must have the same shape")
+
+        # if order is reversed, flip it
+        flip = xvals[:, 0] > xvals[:, -1]
+        xvals[flip] = xvals[flip, ::-1]
+        yvals[flip] = yvals[flip, ::-1]
+
+        x0 = xvals[:, 0]
+        x1 = xvals[:, -1]
+        if xvals.shape[1] > 2:
+            dx = ((x1 - x0) / (xvals.shape[1] - 1.0)).reshape(-1, 1)
+            if not np.allclose(np.diff(xvals, axis=1), dx):
+                raise ValueError("x values in each row must be evenly spaced")
+        b = _finalize(x0, x1, yvals)
+        self.__dict__.update(b.__dict__)
+
+    @classmethod
+    def from_pdfs(cls, pdfs):
+        """
+        Creates a PDFBatch from a list of PDFs.
+
+        PDFs with a different number of points or uneven spacing
+        are linearly interpolated to options['pdf']['numpart'] points.
+        """
+        m = options['pdf']['numpart']
+        x = np.empty((len(pdfs), m))
+        y = np.empty((len(pdfs), m))
+        for i, p in enumerate(pdfs):
+            if len(p.x) == 1:
+                x[i] = p.x[0]
+                y[i] = 0.0
+            elif len(p.x) == m and _is_even(p.x):
+                x[i] = p.x
+                y[i] = p.y
+            else:
+                x[i] = np.linspace(p.x[0], p.x[-1], m)
+                y[i] = p.pdf(x[i])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            y /= np.trapz(y, x, axis=1).reshape(-1, 1)
+        point = x[:, 0] == x[:, -1]
+        y[point] = 0.0
+        return _make(x, y, point)
+
+    def to_pdfs(self):
+        """
+        Returns a list of :class:`PDF` objects.
+        """
+        return [self[i] for i in range(len(self))]
+
+    def _pdf(self, i):
+        # build the PDF directly. Our rows are already
+        # normalized and trimmed.
+        p = PDF.__new__(PDF)
+        if self.dev[i] == 0:
+            p.x = [self.x[i, 0]]
+            p.y = [1]
+            p.cdfy = [1]
+        else:
+            p.x = self.x[i].copy()
+            p.y = self.y[i].copy()
+            p.cdfy = self.cdfy[i].copy()
+        p.mean = self.mean[i]
+        p.dev = self.dev[i]
+        return p
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, i):
+        if isinstance(i, (int, np.integer)):
+            return self._pdf(i)
+        b = PDFBatch.__new__(PDFBatch)
+        for name in ['x', 'y', 'cdfy', 'mean', 'dev']:
+            setattr(b, name, getattr(self, name)[i])
+        return b
+
+    def __str__(self):
+        return "PDFBatch of %d PDFs with %d points" % self.x.shape
+
+    @property
+    def range(self):
+        """
+        The ranges of the PDFs.
+
+        Returns:
+          A tuple of arrays containing the mins and maxes.
+        """
+        return (self.x[:, 0], self.x[:, -1])
+
+    @property
+    def mode(self):
+        """
+        The x value at which each PDF is at its maximum.
+        """
+        return self.x[np.arange(len(self)), np.argmax(self.y, axis=1)]
+
+    def _dx(self):
+        return (self.x[:, -1] - self.x[:, 0]) / (self.x.shape[1] - 1.0)
+
+    def _points(self, arr):
+        """
+        Returns arr as a 2D array with one row per PDF. A scalar or 1D
+        array is used for every PDF.
+        """
+        arr = np.asarray(arr, dtype=float)
+        if arr.ndim < 2:
+            return np.tile(arr.reshape(1, -1), (len(self), 1)), arr.ndim == 0
+        if len(arr) != len(self):
+            raise ValueError("Expected %d rows, got %d" % (len(self), len(arr)))
+        return arr, False
+
+    def pdf(self, arr):
+        """
+        Computes the PDFs for some values.
+
+        Args:
+          arr: A scalar or 1D array of x values, used for every PDF, or
+            a 2D array with one row of x values for each PDF.
+        Returns:
+          2D array of pdf(x) with one row per PDF.  If arr is a scalar,
+          1D array of length len(self).
+        """
+        v, scalar = self._points(arr)
+        res = _interp_rows(v, self.x[:, 0], self._dx(), self.y)
+        point = self.dev == 0
+        res[point] = (v[point] == self.x[point, :1])
+        if scalar:
+            return res[:, 0]
+        return res
+
+    def cdf(self, arr):
+        """
+        Computes the Cumulative Density Functions for some values.
+
+        Args:
+          arr: A scalar or 1D array of x values, used for every PDF, or
+            a 2D array with one row of x values for each PDF.
+        Returns:
+          2D array of cdf(x) with one row per PDF.  If arr is a scalar,
+          1D array of length len(self).
+        """
+        v, scalar = self._points(arr)
+        res = _interp_rows(v, self.x[:, 0], self._dx(), self.cdfy, 0.0, 1.0)
+        if scalar:
+            return res[:, 0]
+        return res
+
+    def ppf(self, arr):
+        """
+        Percent Point Functions (inverse CDF)
+
+        Args:
+          arr: A scalar or 1D array of probabilities, used for every
+            PDF, or a 2D array with one row for each PDF.
+        Returns:
+          2D array of ppf(x) with one row per PDF.  If arr is a scalar,
+          1D array of length len(self).
+        """
+        v, scalar = self._points(arr)
+        res = _ppf_rows(self.x, self.cdfy, v)
+        if scalar:
+            return res[:, 0]
+        return res
+
+    def _shuffle(self, arr, rng):
+        # shuffle each row independently
+        rows = np.arange(len(arr)).reshape(-1, 1)
+        return arr[rows, np.argsort(rng.rand(*arr.shape), axis=1)]
+
+    def lhs(self, num, rng=None):
+        '''
+        Latin Hypercube Samples for all the PDFs.
+
+        :param num: Number of samples to generate for each PDF.
+        :param rng: numpy RandomState to use instead of the global one.
+        :returns: 2D array of shape (len(self), *num*). Each row is
+          in random order.
+        '''
+        rng = rng or np.random
+        u = (np.arange(0, num) + rng.uniform(0, 1, (len(self), num))) / num
+        return self._shuffle(self.ppf(u), rng)
+
+    def ds(self, num, rng=None):
+        '''
+        Descriptive samples for all the PDFs.
+
+        :param num: Number of samples to generate for each PDF.
+        :param rng: numpy RandomState to use instead of the global one.
+        :returns: 2D array of shape (len(self), *num*). Each row is
+          in random order.
+        '''
+        rng = rng or np.random
+        return self._shuffle(self.ppf(np.arange(0.5, num) / num), rng)
+
+    def random(self, num, rng=None):
+        """
+        Random numbers from each of the PDFs.
+
+        :param num: Number of samples to generate for each PDF.
+        :param rng: numpy RandomState to use instead of the global one.
+        :returns: 2D array of shape (len(self), *num*).
+        """
+        rng = rng or np.random
+        return self.ppf(rng.uniform(0, 1, (len(self), num)))
+
+    def _affine(self, scale, shift):
+        "Returns scale * self + shift, with scale and shift per row."
+        if np.any(scale == 0):
+            raise ValueError("Multiplying by 0 does not produce a PDF.")
+        scale = scale.reshape(-1, 1)
+        x = self.x * scale + shift.reshape(-1, 1)
+        y = self.y / np.abs(scale)
+        cdfy = self.cdfy.copy()
+
+        # negative scale reverses the row
+        flip = scale[:, 0] < 0
+        x[flip] = x[flip, ::-1]
+        y[flip] = y[flip, ::-1]
+        cdfy[flip] = 1.0 - cdfy[flip, ::-1]
+        point = self.dev == 0
+        cdfy[point] = 1.0
+
+        b = PDFBatch.__new__(PDFBatch)
+        b.x, b.y, b.cdfy = x, y, cdfy
+        b.mean = self.mean * scale[:, 0] + shift
+        b.dev = self.dev * np.abs(scale[:, 0])
+        return b
+
+    def _pair(self, b):
+        "Returns self and b as PDFBatches of the same length."
+        a = self
+        if isinstance(b, PDF):
+            b = PDFBatch.from_pdfs([b])
+        if len(b) == 1 and len(a) > 1:
+            b = b[np.zeros(len(a), dtype=int)]
+        if len(a) == 1 and len(b) > 1:
+            a = a[np.zeros(len(b), dtype=int)]
+        if len(a) != len(b):
+            raise ValueError("Cannot combine PDFBatches of length %d and %d" % (len(a), len(b)))
+        return a, b
+
+    @staticmethod
+    def _replace_points(res, a, b, op):
+        """
+        The kernels need at least two points, so results for single
+        point PDFs are computed with scalar arithmetic instead.
+        """
+        pa = a.dev == 0
+        pb = b.dev == 0
+        for mask, p, v, first in [(pb, a, b, False), (pa & ~pb, b, a, True)]:
+            if not np.any(mask):
+                continue
+            p = p[mask]
+            v = v.x[mask, 0]
+            if op == '+':
+                r = p._affine(np.ones(len(p)), v)
+            elif op == '*':
+                r = p._affine(v, np.zeros(len(p)))
+            elif first:
+                r = p._rdiv(v)
+            else:
+                r = p._affine(1.0 / v, np.zeros(len(p)))
+            for name in ['x', 'y', 'cdfy', 'mean', 'dev']:
+                getattr(res, name)[mask] = getattr(r, name)
+        return res
+
+    def __neg__(self):
+        n = len(self)
+        return self._affine(-np.ones(n), np.zeros(n))
+
+    def __add__(self, b):
+        "Add PDFs elementwise, returning a new PDFBatch."
+        v = _rowvals(b, len(self))
+        if v is not None:
+            return self._affine(np.ones(len(self)), v)
+        a, b = self._pair(b)
+
+        # the wider PDF goes first, like PDF.__add__
+        swap = a.x[:, -1] - a.x[:, 0] < b.x[:, -1] - b.x[:, 0]
+        a, b = _select(swap, b, a), _select(swap, a, b)
+        ax, ay = a.x, a.y
+        bx, by = b.x, b.y
+        a0, a1 = ax[:, 0], ax[:, -1]
+        b0, b1 = bx[:, 0], bx[:, -1]
+        ar = a1 - a0
+        br = b1 - b0
+        m = ax.shape[1]
+        mb = bx.shape[1]
+
+        nsamp = options['pdf']['numpart']
+        dx = ar / (nsamp - 1.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            blen = np.ceil(br / dx)
+        blen = np.where(np.isfinite(blen), blen, 1).astype(int)
+        blen = np.clip(blen, 1, nsamp)
+        nb = int(blen.max())
+        cx = np.arange(nsamp) * dx.reshape(-1, 1)
+        fa = _interp_rows(cx + a0.reshape(-1, 1), a0, ar / (m - 1.0), ay)
+        fb = _interp_rows(cx[:, :nb] + b0.reshape(-1, 1), b0, br / (mb - 1.0), by)
+        fb[np.arange(nb) >= blen.reshape(-1, 1)] = 0.0
+
+        # batched FFT convolution. See _convolve() in pdf.py.
+        n = nsamp + nb - 1
+        nfft = 1 << (n - 1).bit_length()
+        c = np.fft.irfft(np.fft.rfft(fa, nfft, axis=1) * np.fft.rfft(fb, nfft, axis=1), nfft, axis=1)[:, :n]
+        c[c < np.finfo(float).eps * n * np.max(c, axis=1).reshape(-1, 1)] = 0.0
+
+        # row i has nsamp + blen[i] - 1 valid points
+        clen = nsamp + blen - 1
+        step = (ar + br) / clen
+        c0 = a0 + b0
+        c1 = c0 + step * (clen - 1)
+        cx = c0.reshape(-1, 1) + np.linspace(0.0, 1.0, n) * (c1 - c0).reshape(-1, 1)
+        cy = _interp_rows(cx, c0, step, c)
+        res = _finalize(c0, c1, cy)
+        return self._replace_points(res, a, b, '+')
+
+    def __radd__(self, b):
+        return self.__add__(b)
+
+    def __sub__(self, b):
+        'Subtract PDFs elementwise, returning a new PDFBatch'
+        return self.__add__(-b)
+
+    def __rsub__(self, b):
+        return (-self).__add__(b)
+
+    def _kernel(self, a, b, cx, div):
+        """
+        Row-wise version of _product_kernel() in pdf.py.
+        For each row, sums |fa(cx/x)/x| * y (or fa(cx*x) * x * y)
+        over the points (x, y) of b.
+        """
+        n, nc = cx.shape
+        m = b.x.shape[1]
+        a0 = a.x[:, 0]
+        adx = a._dx()
+        bx = b.x
+        by = b.y
+        if not div:
+            # do not evaluate at 0
+            by = np.where(bx == 0, 0.0, by)
+            bx = np.where(bx == 0, 1.0, bx)
+        cy = np.empty((n, nc))
+        step = max(1, _KERNEL_CHUNK // (nc * m))
+        for i in range(0, n, step):
+            x = bx[i:i+step].reshape(-1, 1, m)
+            c = cx[i:i+step].reshape(-1, nc, 1)
+            if div:
+                v = x * c
+            else:
+                v = c / x
+            k = _interp_rows(v, a0[i:i+step], adx[i:i+step], a.y[i:i+step])
+            if div:
+                k = k * x
+            else:
+                k = np.abs(k / x)
+            cy[i:i+step] = np.einsum('rij,rj->ri', k, by[i:i+step])
+        return cy
+
+    def __mul__(self, b):
+        "Multiply PDFs elementwise, returning a new PDFBatch"
+        v = _rowvals(b, len(self))
+        if v is not None:
+            return self._affine(v, np.zeros(len(self)))
+        a, b = self._pair(b)
+
+        # if second variable crosses 0, swap the order for best results
+        swap = (b.x[:, 0] < 0) & (b.x[:, -1] > 0)
+        a, b = _select(swap, b, a), _select(swap, a, b)
+        extremes = np.column_stack([a.x[:, 0] * b.x[:, 0], a.x[:, 0] * b.x[:, -1],
+                                    a.x[:, -1] * b.x[:, 0], a.x[:, -1] * b.x[:, -1]])
+        zmin, zmax = extremes.min(axis=1), extremes.max(axis=1)
+        cx = zmin.reshape(-1, 1) + np.linspace(0.0, 1.0, options['pdf']['numpart']) * (zmax - zmin).reshape(-1, 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cy = self._kernel(a, b, cx, False)
+            res = _finalize(zmin, zmax, cy)
+        return self._replace_points(res, a, b, '*')
+
+    def __rmul__(self, b):
+        return self.__mul__(b)
+
+    def _rdiv(self, v):
+        "Returns v / self for one value per row."
+        if np.any(self.x[:, 0] * self.x[:, -1] <= 0):
+            raise ValueError("Cannot divide by PDFs that include 0")
+        if np.any(v == 0):
+            raise ValueError("Dividing 0 by a PDF does not return a PDF")
+        e0 = v / self.x[:, 0]
+        e1 = v / self.x[:, -1]
+        zmin, zmax = np.minimum(e0, e1), np.maximum(e0, e1)
+        cx = zmin.reshape(-1, 1) + np.linspace(0.0, 1.0, options['pdf']['numpart']) * (zmax - zmin).reshape(-1, 1)
+        res = _finalize(zmin, zmax, self.pdf(v.reshape(-1, 1) / cx) / cx**2)
+        point = self.dev == 0
+        if np.any(point):
+            r = _make(np.tile(v[point] / self.x[point, :1], (1, cx.shape[1])), np.zeros((point.sum(), cx.shape[1])))
+            for name in ['x', 'y', 'cdfy', 'mean', 'dev']:
+                getattr(res, name)[point] = getattr(r, name)
+        return res
+
+    def __div__(self, b):
+        "Divide PDFs elementwise, returning a new PDFBatch"
+        v = _rowvals(b, len(self))
+        if v is not None:
+            if np.any(v == 0):
+                raise ValueError("Cannot divide a PDF by 0.")
+            return self._affine(1.0 / v, np.zeros(len(self)))
+        a, b = self._pair(b)
+        if np.any(b.x[:, 0] * b.x[:, -1] <= 0):
+            raise ValueError("Cannot divide by PDFs that include 0")
+        extremes = np.column_stack([a.x[:, 0] / b.x[:, 0], a.x[:, 0] / b.x[:, -1],
+                                    a.x[:, -1] / b.x[:, 0], a.x[:, -1] / b.x[:, -1]])
+        zmin, zmax = extremes.min(axis=1), extremes.max(axis=1)
+        cx = zmin.reshape(-1, 1) + np.linspace(0.0, 1.0, options['pdf']['numpart']) * (zmax - zmin).reshape(-1, 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cy = self._kernel(a, b, cx, True)
+            res = _finalize(zmin, zmax, cy)
+        return self._replace_points(res, a, b, '/')
+
+    def __rdiv__(self, b):
+        v = _rowvals(b, len(self))
+        if v is None:
+            b, a = self._pair(b)
+            return a.__div__(b)
+        return self._rdiv(v)
+
+    def __truediv__(self, b):
+        return self.__div__(b)
+
+    def __rtruediv__(self, b):
+        return self.__rdiv__(b)
+
+
+def _select(mask, a, b):
+    "Rows of a where mask is True, otherwise rows of b."
+    res = PDFBatch.__new__(PDFBatch)
+    m = mask.reshape(-1, 1)
+    res.x = np.where(m, a.x, b.x)
+    res.y = np.where(m, a.y, b.y)
+    res.cdfy = np.where(m, a.cdfy, b.cdfy)
+    res.mean = np.where(mask, a.mean, b.mean)
+    res.dev = np.where(mask, a.dev, b.dev)
+    return res
@@ -0,0 +1,315 @@
+"""
+Incremental construction of experimental PDFs.
+
+A :class:`PDFBuilder` accumulates samples in chunks and builds the same
+kinds of PDFs as :func:`ExperimentalPDF` without keeping all the data
+in memory.  Builders filled in different processes can be merged.
+
+This file is part of PUQ
+Copyright (c) 2013-2016 PUQ Authors
+See LICENSE file for terms.
+"""
+from __future__ import absolute_import, division, print_function
+
+import math
+import numpy as np
+from puq.options import options
+from puq.pdf import PDF, _hist_pdf, _kde_factor, _kde_counts
+
+# Maximum number of bins in the internal histogram.
+# Memory used by a builder is bounded by this.
+_MAX_BINS = 2**16
+
+
+class RunningStats(object):
+    """
+    Count, mean, variance, min and max of a stream of data.
+
+    Chunks are combined with the parallel algorithm of Chan et al.,
+    so results do not depend on how the data is split.
+    """
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, data):
+        "Add an array of data."
+        data = np.asarray(data, dtype=float).ravel()
+        if len(data) == 0:
+            return
+        other = RunningStats()
+        other.n = len(data)
+        other.mean = np.mean(data)
+        other.m2 = np.sum((data - other.mean)**2)
+        other.min = np.min(data)
+        other.max = np.max(data)
+        self.merge(other)
+
+    def merge(self, other):
+        "Combine with the statistics of another RunningStats."
+        n = self.n + other.n
+        if n == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta**2 * self.n * other.n / n
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def var(self):
+        "Population variance (like np.var)"
+        if self.n == 0:
+            return np.nan
+        return self.m2 / self.n
+
+    @property
+    def dev(self):
+        "Population standard deviation (like np.std)"
+        return np.sqrt(self.var)
+
+
+class PDFBuilder(object):
+    """
+    Builds an experimental PDF from data arriving in chunks.
+
+    Data are counted in a histogram of at most 2**16 bins whose widths
+    are powers of two.  When the data no longer fit, neighboring bins
+    are combined. Bins are aligned at multiples of their width, so
+    builders can always be merged exactly.  :meth:`finalize` then
+    rebins the counts for a histogram fit or smooths them for a
+    Gaussian KDE, as :func:`ExperimentalPDF` does with all the data.
+
+    Args:
+      fit: Use Gaussian KDE (default=False)
+      bw: Bandwidth for Gaussian KDE. 'scott', 'silverman' or a float.
+      nbins: Number of bins (used if fit is false).  Default is
+        2*IQR/n^(1/3) where IQR is the interquartile range
+        of the data.
+      min: Minimum value for the PDF range.
+      max: Maximum value for the PDF range.
+      reservoir: Number of samples to keep.  If nonzero, the PDF
+        returned by :meth:`finalize` has a uniform random subsample
+        of this size (or all the data, if there is less) as *data*.
+
+    :Example:
+
+    >>> b = PDFBuilder(fit=True, reservoir=10000)
+    >>> for chunk in chunks:
+    ...     b.add(chunk)
+    >>> pdf = b.finalize()
+    """
+    def __init__(self, fit=False, bw=None, nbins=0, min=None, max=None, reservoir=0):
+        if nbins and nbins <= 1:
+            raise ValueError("ERROR: invalid number of bins: %s" % nbins)
+        self.fit = fit
+        self.bw = bw
+        self.nbins = nbins
+        self.min = min
+        self.max = max
+        self.reservoir = reservoir
+        self.stats = RunningStats()
+        self.data = np.empty(0)
+
+        # bin i covers [(i0 + i) * width, (i0 + i + 1) * width)
+        self._width = None
+        self._i0 = 0
+        self._counts = np.zeros(0)
+
+    def _coarsen(self, k):
+        "Combine groups of 2**k bins."
+        if k <= 0:
+            return
+        idx = (self._i0 + np.arange(len(self._counts))) >> k
+        i0 = int(idx[0])
+        self._counts = np.bincount(idx - i0, self._counts)
+        self._i0 = i0
+        self._width *= 2.0**k
+
+    def _fit(self, lo, hi):
+        "Extends the histogram to cover [lo, hi], combining bins if needed."
+        if self._width is None:
+            # start with the range using a quarter of the bins, so
+            # later data have room before bins need to be combined.
+            dist = hi - lo
+            if dist == 0:
+                dist = max(abs(lo), 1e-300) * 2.0**-40
+            self._width = 2.0**math.ceil(math.log(4.0 * dist / _MAX_BINS, 2))
+            self._i0 = int(math.floor(lo / self._width))
+            self._counts = np.zeros(1)
+        i0 = min(self._i0, int(math.floor(lo / self._width)))
+        i1 = max(self._i0 + len(self._counts), int(math.floor(hi / self._width)) + 1)
+        if i1 - i0 > _MAX_BINS:
+            k = int(math.ceil(math.log((i1 - i0) / _MAX_BINS, 2)))
+            # combining bins may add one at either end
+            while (i1 >> k) - (i0 >> k) + 1 > _MAX_BINS:
+                k += 1
+            self._coarsen(k)
+            i0 = min(self._i0, int(math.floor(lo / self._width)))
+            i1 = max(self._i0 + len(self._counts), int(math.floor(hi / self._width)) + 1)
+        counts = np.zeros(i1 - i0)
+        start = self._i0 - i0
+        counts[start:start + len(self._counts)] = self._counts
+        self._counts = counts
+        self._i0 = i0
+
+    def _sample(self, data, rng):
+        "Reservoir sampling (Algorithm R)"
+        k = self.reservoir
+        seen = self.stats.n - len(data)
+        if seen < k:
+            num = min(k - seen, len(data))
+            self.data = np.append(self.data, data[:num])
+            data = data[num:]
+            seen += num
+        if len(data) == 0:
+            return
+        # item j replaces a random slot with probability k/(seen+j+1)
+        idx = np.floor(rng.uniform(0, 1, len(data)) * (seen + 1 + np.arange(len(data)))).astype(np.int64)
+        keep = idx < k
+        self.data[idx[keep]] = data[keep]
+
+    def add(self, data, rng=None):
+        """
+        Adds a chunk of data.
+
+        :param data: Array of scalars.
+        :param rng: numpy RandomState for the reservoir, instead of
+          the global one.
+        """
+        data = np.asarray(data, dtype=np.float64).ravel()
+        if len(data) == 0:
+            return
+        if not np.all(np.isfinite(data)):
+            raise ValueError("Data must be finite.")
+        self.stats.add(data)
+        self._fit(np.min(data), np.max(data))
+        idx = np.floor(data / self._width).astype(np.int64) - self._i0
+        self._counts += np.bincount(idx, minlength=len(self._counts))
+        if self.reservoir:
+            self._sample(data, rng or np.random)
+
+    def merge(self, other, rng=None):
+        """
+        Adds all the data from another PDFBuilder.
+
+        :param other: A PDFBuilder.
+        :param rng: numpy RandomState for the reservoir, instead of
+          the global one.
+        """
+        if other.stats.n == 0:
+            return
+        n = self.stats.n
+        self.stats.merge(other.stats)
+        width = other._width
+        if self._width is None:
+            self._width, self._i0, self._counts = width, other._i0, other._counts.copy()
+        else:
+            w = other._width
+            if w > self._width:
+                self._coarsen(int(round(math.log(w / self._width, 2))))
+            self._fit(other._i0 * w, (other._i0 + len(other._counts) - 0.5) * w)
+
+            # rebin the other counts to our (possibly wider) bins
+            k = int(round(math.log(self._width / w, 2)))
+            idx = (other._i0 + np.arange(len(other._counts))) >> k
+            counts = np.bincount(idx - idx[0], other._counts)
+            start = int(idx[0]) - self._i0
+            self._counts[start:start + len(counts)] += counts
+
+        if self.reservoir:
+            # take each sample from one of the reservoirs in
+            # proportion to the data each one has seen
+            k = self.reservoir
+            rng = rng or np.random
+            if len(self.data) + len(other.data) <= k:
+                self.data = np.append(self.data, other.data)
+            else:
+                na = rng.hypergeometric(n, other.stats.n, k)
+                na = min(na, len(self.data))
+                na = max(na, k - len(other.data))
+                self.data = np.append(rng.permutation(self.data)[:na],
+                                      rng.permutation(other.data)[:k - na])
+
+    def _edges(self):
+        """
+        Returns the histogram edges and cumulative counts. The first
+        and last edges are moved in to the minimum and maximum of the data.
+        """
+        e = (self._i0 + np.arange(len(self._counts) + 1)) * self._width
+        e[0] = self.stats.min
+        e[-1] = self.stats.max
+        c = np.append(0.0, np.cumsum(self._counts))
+        return e, c
+
+    def quantile(self, q):
+        """
+        Approximate quantiles of the data. Data are assumed to be
+        evenly spread within each histogram bin.
+
+        :param q: Quantile or array of quantiles in [0,1]
+        """
+        e, c = self._edges()
+        return np.interp(np.asarray(q) * self.stats.n, c, e)
+
+    def finalize(self):
+        """
+        Builds a PDF from all the data added so far.
+
+        :returns: A PDF object.
+        """
+        st = self.stats
+        if st.n == 0:
+            raise ValueError("ERROR: need at least two data points to build a PDF.")
+        if self.min is not None and self.min > st.min:
+            raise ValueError('min cannot be set to more than minimum value in the data.')
+        if self.max is not None and self.max < st.max:
+            raise ValueError('max cannot be set to less than maximum value in the data.')
+
+        if st.min == st.max:
+            return self._done(PDF([st.min], [1]))
+        if st.n == 1:
+            raise ValueError("ERROR: need at least two data points to build a PDF, or a prior and 1 data point.")
+
+        fit = self.fit
+        if fit is True or (type(fit) is str and fit.lower() == 'gaussian'):
+            # Gaussian KDE
+            mmin, mmax = self.min, self.max
+            if mmin is None:
+                mmin = st.mean - 5 * st.dev
+            if mmax is None:
+                mmax = st.mean + 5 * st.dev
+            x = np.linspace(float(mmin), float(mmax), options['pdf']['numpart'])
+            h = _kde_factor(st.n, self.bw) * np.sqrt(st.m2 / (st.n - 1))
+            w = self._width
+            # each bin is counted at its center and smooths by
+            # a uniform kernel of variance w**2/12
+            y = _kde_counts(self._counts, (self._i0 + 0.5) * w, w, h, x, w**2 / 12.0)
+            return self._done(PDF(x, y))
+
+        # linear interpolation from histograms
+        nbins = self.nbins
+        if nbins == 0:
+            q25, q75 = self.quantile([.25, .75])
+            iqr = q75 - q25
+            if iqr == 0.0:
+                return self._done(PDF([st.min], [1]))
+            nbins = int((st.max - st.min) / (2*iqr/st.n**(1.0/3)) + .5)
+            nbins = max(nbins, 1)
+        bins = np.linspace(st.min, st.max, nbins + 1)
+        e, c = self._edges()
+        y = np.diff(np.interp(bins, e, c)) / (st.n * np.diff(bins))
+        p = _hist_pdf(y, bins, self.min, self.max)
+        if p is None:
+            # interpolate failed. constant pdf
+            p = PDF([st.min], [1])
+        return self._done(p)
+
+    def _done(self, p):
+        if self.reservoir:
+            p.data = self.data.copy()
+        return p
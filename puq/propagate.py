@@ -0,0 +1,115 @@
+"""
+Monte Carlo propagation of PDFs through arbitrary functions.
+
+This file is part of PUQ
+Copyright (c) 2013-2016 PUQ Authors
+See LICENSE file for terms.
+"""
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+from logging import debug
+from puq.pdf import PDF
+from puq.pdfbuilder import PDFBuilder
+
+# Quantiles compared between rounds to test for convergence
+_QUANTILES = np.linspace(0.01, 0.99, 99)
+
+_DEFAULTS = {
+    'tol': 2e-3,
+    'batch': 2**16,
+    'min_samples': 2**14,
+    'max_samples': 2**23,
+    'method': 'lhs',
+    'fit': False,
+    'bw': None,
+    'nbins': 0,
+    'reservoir': 0,
+}
+
+
+def propagate(func, *pdfs, **kwargs):
+    """
+    Computes the PDF of func(*pdfs) by Monte Carlo sampling.
+
+    Samples are drawn for all inputs in batches of at most *batch*
+    values, and func is called once per batch with an array for
+    each input.  The output values go into a :class:`PDFBuilder`, so
+    memory does not grow with the number of samples.  The number
+    of samples doubles until the 1% to 99% quantiles of the output
+    change by less than *tol* times their range, or *max_samples* is
+    reached.
+
+    Args:
+      func: Function of len(pdfs) arrays returning an array of the
+        same length. Numpy ufuncs and expressions work.
+      pdfs: :class:`PDF` objects or numbers.
+      tol: Convergence tolerance (default 2e-3).
+      batch: Maximum number of samples per call of func (default 65536).
+      min_samples: Initial number of samples (default 16384).
+      max_samples: Maximum number of samples (default 8388608).
+      method: 'lhs' for a Latin hypercube in each batch, or 'random'.
+      fit, bw, nbins, reservoir: Passed to :class:`PDFBuilder`.
+    Returns:
+      A PDF built like :func:`ExperimentalPDF`. Its *samples* is the
+      number of samples used.
+
+    :Example:
+
+    >>> a, b, c = NormalPDF(5, 1), UniformPDF(1, 2), ExponPDF(1)
+    >>> p = propagate(lambda a, b, c: np.sqrt(a**2 + b*c), a, b, c)
+    """
+    for key in kwargs:
+        if key not in _DEFAULTS:
+            raise TypeError("propagate() got an unexpected keyword argument '%s'" % key)
+    opts = dict(_DEFAULTS)
+    opts.update(kwargs)
+    if opts['method'] not in ['lhs', 'random']:
+        raise ValueError("Unknown sampling method '%s'" % opts['method'])
+    if opts['batch'] < 2:
+        raise ValueError("batch must be at least 2")
+    for p in pdfs:
+        if not isinstance(p, PDF) and not np.isscalar(p):
+            raise ValueError("Arguments must be PDFs or numbers.")
+
+    builder = PDFBuilder(fit=opts['fit'], bw=opts['bw'], nbins=opts['nbins'], reservoir=opts['reservoir'])
+    num = opts['min_samples']
+    last = None
+    while True:
+        _add_samples(builder, func, pdfs, num - builder.stats.n, opts)
+        q = builder.quantile(_QUANTILES)
+        if last is not None:
+            span = q[-1] - q[0]
+            change = np.max(np.abs(q - last))
+            debug("propagate: %d samples, change %s" % (num, change))
+            if change <= opts['tol'] * span:
+                break
+        if num >= opts['max_samples']:
+            break
+        last = q
+        num = min(2 * num, opts['max_samples'])
+
+    p = builder.finalize()
+    p.samples = builder.stats.n
+    return p
+
+
+def _add_samples(builder, func, pdfs, num, opts):
+    "Evaluates func on num samples, batch by batch."
+    while num > 0:
+        n = min(num, opts['batch'])
+        args = []
+        for p in pdfs:
+            if not isinstance(p, PDF):
+                args.append(p)
+            elif opts['method'] == 'lhs':
+                args.append(p.lhs(n))
+            else:
+                args.append(p.random(n))
+        res = np.asarray(func(*args), dtype=float)
+        if res.shape != (n,):
+            res = np.broadcast_to(res, (n,))
+        if not np.all(np.isfinite(res)):
+            raise ValueError("func returned values that are not finite.")
+        builder.add(res)
+        num -= n
@@ -7,13 +7,43 @@ from __future__ import absolute_import, division, print_function
 
 from logging import debug
 from .hdf import get_output_names
+from .util import rng
 import h5py
+import numpy as np
 
 
 class PSweep(object):
-    def __init__(self, iteration_cb=None):
+    # defaults for sweeps pickled before they had seeds
+    seed = None
+    batch = 0
+
+    def __init__(self, iteration_cb=None, seed=None):
         self.run_num = 0
         self.iteration_cb = iteration_cb
+        # The sweep seed is saved with the sweep, so extending
+        # or resuming it draws the same samples every time.
+        if seed is None:
+            seed = np.random.randint(2**31)
+        self.seed = int(seed)
+        self.batch = 0
+
+    def rng(self, *key):
+        """
+        Returns the random stream for *key* in the current batch
+        of samples.  Each parameter should use its own key, and
+        extend() should start a new batch.
+        """
+        return rng(self.seed, self.batch, *key)
+
+    def sketch_rng(self, name):
+        """
+        Returns the random stream for the quantile sketch of output
+        *name*.  Its key is a 0, the length of the name and its bytes, at
+        least two ints, so it never collides with the single-int keys
+        used for sampling.
+        """
+        key = bytearray(name.encode('utf-8'))
+        return self.rng(0, len(key), *key)
 
     def reinit(self):
         # for compatibility
@@ -48,7 +48,8 @@ Options:
 
   analyze [options] [id]       Does post-processing.
 
-  extend [id]                  Extend a sweep by adding additional jobs.
+  extend [--num num] [id]      Extend a sweep by adding additional jobs. Monte Carlo
+                               and LHS sweeps add num samples.
 
   plot [options] [id]          Plots output pdf(s) or response surface. Type
                                'puq plot -h' for options.
@@ -60,7 +61,8 @@ Options:
                                output lines not containing data and repacks the HDF5 file,
                                reducing its size.
 
-  dump                         Dumps output data in CSV format.
+  dump [-q quantiles]          Dumps output data in CSV format. With -q, also dumps
+                               quantiles of the outputs with confidence bounds.
 """
 
 
@@ -246,8 +248,17 @@ def analyze(*args):
 
 def dump(*args):
     debug(args)
-    h5, fname = open_hdf5_file(args)
-    puq.dump(h5, fname)
+    usage = "Usage: puq dump [options] hdf5_filename."
+    parser = OptionParser(usage)
+    parser.add_option("-q", type='string',
+                      help="Also dump these quantiles of each output, with confidence bounds. \
+Separate them by commas. For example, '0.05,0.5,0.95'.")
+    (opt, ar) = parser.parse_args(args=list(args))
+    quantiles = None
+    if opt.q:
+        quantiles = [float(q) for q in opt.q.split(',')]
+    h5, fname = open_hdf5_file(tuple(ar))
+    puq.dump(h5, fname, quantiles)
     h5.close()
     return True
 
@@ -344,6 +355,12 @@ def extend(*args):
             print(usage)
             return
         sweep.psweep.extend(opt.num)
+    elif cname == 'LHS':
+        if opt.num < 0:
+            print("LHS extend requires a positive num argument.")
+            print(usage)
+            return
+        sweep.psweep.extend(opt.num or None)
     else:
         sweep.psweep.extend()
     return sweep.run()
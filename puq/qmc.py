@@ -0,0 +1,164 @@
+"""
+Quasi-random (low discrepancy) sequences.
+
+Sobol and Halton sequences fill the unit hypercube more evenly than
+random points, so averages over them usually converge faster than
+Monte Carlo.  Both can be scrambled with a seed.  Different seeds give
+independent randomizations of the same sequence, which can be used to
+estimate the error.  A sequence can be continued by asking for points
+starting where the last call stopped, with the same seed.
+
+This file is part of PUQ
+Copyright (c) 2013-2016 PUQ Authors
+See LICENSE file for terms.
+"""
+from __future__ import absolute_import, division, print_function
+
+import math
+import numpy as np
+
+# Number of bits in Sobol points. Sequences have at most 2**_BITS points.
+_BITS = 30
+
+# Primitive polynomials and initial direction numbers for Sobol
+# dimensions 2 and up, from Joe and Kuo (2008), new-joe-kuo-6.21201.
+# The polynomial includes its leading and trailing 1 bits.
+_SOBOL = [
+    (3, [1]), (7, [1, 3]), (11, [1, 3, 1]), (13, [1, 1, 1]),
+    (19, [1, 1, 3, 3]), (25, [1, 3, 5, 13]), (37, [1, 1, 5, 5, 17]),
+    (41, [1, 1, 5, 5, 5]), (47, [1, 1, 7, 11, 19]), (55, [1, 1, 5, 1, 1]),
+    (59, [1, 1, 1, 3, 11]), (61, [1, 3, 5, 5, 31]), (67, [1, 3, 3, 9, 7, 49]),
+    (91, [1, 1, 1, 15, 21, 21]), (97, [1, 3, 1, 13, 27, 49]),
+    (103, [1, 1, 1, 15, 7, 5]), (109, [1, 3, 1, 15, 13, 25]),
+    (115, [1, 1, 5, 5, 19, 61]), (131, [1, 3, 7, 11, 23, 15, 103]),
+    (137, [1, 3, 7, 13, 13, 15, 69]), (143, [1, 1, 3, 13, 7, 35, 63]),
+    (145, [1, 3, 5, 9, 1, 25, 53]), (157, [1, 3, 1, 13, 9, 35, 107]),
+    (167, [1, 3, 1, 5, 27, 61, 31]), (171, [1, 1, 5, 11, 19, 41, 61]),
+    (185, [1, 3, 5, 3, 3, 13, 69]), (191, [1, 1, 7, 13, 1, 19, 1]),
+    (193, [1, 3, 7, 5, 13, 19, 59]), (203, [1, 1, 3, 9, 25, 29, 41]),
+    (211, [1, 3, 5, 13, 23, 1, 55]), (213, [1, 3, 7, 3, 13, 59, 17]),
+    (229, [1, 3, 1, 3, 5, 53, 69]), (239, [1, 1, 5, 5, 23, 33, 13]),
+    (241, [1, 1, 7, 7, 1, 61, 123]), (247, [1, 1, 7, 9, 13, 61, 49]),
+    (253, [1, 3, 3, 5, 3, 55, 33]), (285, [1, 3, 1, 15, 31, 13, 49, 245]),
+    (299, [1, 3, 5, 15, 31, 59, 63, 97]),
+    (301, [1, 3, 1, 11, 11, 11, 77, 249]),
+]
+
+SEQUENCES = ['sobol', 'halton']
+
+
+def sequence(name, num, dim, start=0, seed=None, scramble=True):
+    """
+    Returns points *start* to *start* + *num* of a quasi-random sequence.
+
+    Args:
+      name: 'sobol' or 'halton'
+      num: Number of points.
+      dim: Number of dimensions.
+      start: Index of the first point.
+      seed: Seed for the scrambling, an int or a list of ints.
+        The same seed always gives the same sequence.  If None, the global numpy random
+        state is used.
+      scramble: Randomize the sequence.
+    Returns:
+      Array of shape (num, dim) with values in [0, 1).
+    """
+    if name == 'sobol':
+        return sobol(num, dim, start, seed, scramble)
+    if name == 'halton':
+        return halton(num, dim, start, seed, scramble)
+    raise ValueError("Unknown sequence '%s'. Use one of %s." % (name, SEQUENCES))
+
+
+def _rng(seed):
+    if seed is None:
+        return np.random
+    return np.random.RandomState(seed)
+
+
+def _directions(dim):
+    "Sobol direction integers, shape (dim, _BITS)"
+    if dim > len(_SOBOL) + 1:
+        raise ValueError("Sobol sequences are limited to %d dimensions. Try 'halton'." % (len(_SOBOL) + 1))
+    v = np.zeros((dim, _BITS), dtype=np.int64)
+    v[0] = 1 << np.arange(_BITS - 1, -1, -1)
+    for d in range(1, dim):
+        poly, m = _SOBOL[d - 1]
+        s = len(m)
+        for k in range(s):
+            v[d, k] = m[k] << (_BITS - 1 - k)
+        for k in range(s, _BITS):
+            x = v[d, k - s] ^ (v[d, k - s] >> s)
+            for j in range(1, s):
+                if (poly >> (s - j)) & 1:
+                    x ^= v[d, k - j]
+            v[d, k] = x
+    return v
+
+
+def sobol(num, dim, start=0, seed=None, scramble=True):
+    """
+    Points of a Sobol sequence.  Scrambling is a random linear
+    matrix scramble followed by a random digital shift, as in
+    Matousek (1998).  See :func:`sequence` for the arguments.
+
+    Balance properties hold for the first 2**m points,
+    so powers of two are the best choices for *num*.
+    """
+    if start < 0 or start + num > 2**_BITS:
+        raise ValueError("Sobol sequences have at most 2**%d points." % _BITS)
+    v = _directions(dim)
+    shift = np.zeros(dim, dtype=np.int64)
+    if scramble:
+        rng = _rng(seed)
+        bit = 1 << np.arange(_BITS - 1, -1, -1)
+        for d in range(dim):
+            # columns of a random lower triangular matrix
+            # with ones on the diagonal
+            low = np.tril(rng.randint(0, 2, (_BITS, _BITS)), -1) + np.eye(_BITS, dtype=int)
+            cols = np.dot(bit, low)
+            v[d] = [np.bitwise_xor.reduce(cols[(x & bit) != 0]) if x else 0 for x in v[d]]
+        shift = rng.randint(0, 2**_BITS, dim).astype(np.int64)
+
+    i = np.arange(start, start + num, dtype=np.int64)
+    gray = i ^ (i >> 1)
+    x = np.zeros((num, dim), dtype=np.int64) ^ shift
+    for k in range(_BITS):
+        on = ((gray >> k) & 1).astype(bool)
+        x[on] ^= v[:, k]
+    return x / float(2**_BITS)
+
+
+def _primes(n):
+    "The first n primes"
+    primes = []
+    k = 2
+    while len(primes) < n:
+        if all(k % p for p in primes if p * p <= k):
+            primes.append(k)
+        k += 1
+    return primes
+
+
+def halton(num, dim, start=0, seed=None, scramble=True):
+    """
+    Points of a Halton sequence, using the first *dim* primes
+    as bases.  Scrambling applies a random permutation to
+    each digit.  See :func:`sequence` for the arguments.
+    """
+    rng = _rng(seed)
+    i = np.arange(start, start + num, dtype=np.int64)
+    x = np.zeros((num, dim))
+    for d, b in enumerate(_primes(dim)):
+        # enough digits for double precision
+        ndigits = int(math.ceil(53 * math.log(2) / math.log(b)))
+        q = i.copy()
+        scale = 1.0
+        for _k in range(ndigits):
+            scale /= b
+            digit = q % b
+            if scramble:
+                digit = rng.permutation(b)[digit]
+            x[:, d] += digit * scale
+            q //= b
+    return x
@@ -8,10 +8,17 @@ from __future__ import absolute_import, division, print_function
 import sys
 import numpy as np
 import sympy
+from multiprocessing.pool import ThreadPool
 from scipy.interpolate import Rbf
+from puq import qmc
 from puq.meshgridn import meshgridn
+from puq.localrbf import LocalRbf
+from puq.options import options
 from puq.pdf import ExperimentalPDF
+from puq.pdfbuilder import PDFBuilder
 from puq.parameter import get_psamples
+from puq.design import sample_design, ppf_columns
+from puq.smolyak_funcs import legendre_basis
 from sympy.utilities.lambdify import lambdify
 
 import matplotlib
@@ -29,8 +36,41 @@ class Function(object):
     Superclass for ResponseFunc and SampledFunc
     """
 
-    def evala(self, p):
-        return self.eval(*p.T)
+    def evala(self, p, chunk=None, workers=None):
+        """
+        Evaluates the function at each row of p.  Large arrays
+        are evaluated *chunk* rows at a time on *workers* threads.
+        Defaults are options['response']['chunk'] and ['workers'].
+        """
+        if chunk is None:
+            chunk = options['response']['chunk']
+        p = np.asarray(p)
+        if p.ndim < 2 or len(p) <= chunk:
+            return self.eval(*p.T)
+        blocks = [p[i:i + chunk] for i in range(0, len(p), chunk)]
+        pool = self._pool(workers)
+        try:
+            res = self._evalb(blocks, pool)
+        finally:
+            if pool is not None:
+                pool.close()
+        return np.concatenate(res)
+
+    def _pool(self, workers):
+        if workers is None:
+            workers = options['response']['workers']
+        if workers > 1:
+            return ThreadPool(workers)
+        return None
+
+    def _evalb(self, blocks, pool):
+        "Evaluates a list of blocks of points, in parallel if there is a pool."
+        def f(b):
+            # constant responses return a constant
+            return np.broadcast_to(self.eval(*b.T), (len(b),))
+        if pool is None:
+            return [f(b) for b in blocks]
+        return pool.map(f, blocks)
 
     # find min and max output of a response
     def minmax(self):
@@ -93,8 +133,26 @@ class Function(object):
             raise ValueError('New PDF has a range outside the original PDF')
 
     def pdf(self, fit=True, params=[], force=False, min=None, max=None,
-            return_samples=False, psamples=None):
+            return_samples=False, psamples=None, num=None, chunk=None, workers=None):
+        """
+        Returns the PDF of the response, from samples of the parameters.
 
+        More than *chunk* samples are drawn and evaluated a chunk at a
+        time, *workers* chunks at once, and streamed into a
+        :class:`PDFBuilder`, so memory does not grow with *num*.
+
+        Args:
+          fit: Use Gaussian KDE (default=True)
+          params: Parameters to replace the response's own.
+          force: Allow new parameters outside the response's range,
+            and min or max inside the range of the results.
+          min, max: Range for the PDF.
+          return_samples: Also return the response samples.
+          psamples: Array of parameter samples to use.
+          num: Number of samples. Default is 10000.
+          chunk: Default is options['response']['chunk'].
+          workers: Default is options['response']['workers'].
+        """
         if not self.params and not params:
             raise ValueError("Cannot generate PDF for response function without params.")
 
@@ -111,13 +169,24 @@ class Function(object):
                         self.params[i] = newp
             self.vars = self.params2vars(self.params)
 
+        if chunk is None:
+            chunk = options['response']['chunk']
+        if psamples is None and num is not None and num > chunk and \
+                not any(getattr(p, 'use_samples', False) for p in self.params):
+            try:
+                return self._pdf_chunks(num, chunk, workers, fit, force, min, max, return_samples)
+            finally:
+                if params:
+                    self.params = saved_params
+                    self.vars = saved_vars
+
         # get parameter pdf samples
         if psamples is None:
-            xseed = get_psamples(self.params)
+            xseed = get_psamples(self.params, num=num)
         else:
             xseed = psamples
 
-        results = self.evala(xseed)
+        results = self.evala(xseed, chunk, workers)
 
         # If the response surface is constant, 'results' is a constant.
         # We will need to return an appropriate array filled with it.
@@ -141,6 +210,56 @@ class Function(object):
         else:
             return ExperimentalPDF(results, fit=fit, min=min, max=max, force=force)
 
+    def _pdf_chunks(self, num, chunk, workers, fit, force, min, max, return_samples):
+        if workers is None:
+            workers = options['response']['workers']
+        builder = PDFBuilder(fit=fit, min=min, max=max, reservoir=chunk)
+        samples = []
+        pool = self._pool(workers)
+        try:
+            blocks = []
+            for x in self._psample_chunks(num, chunk):
+                blocks.append(x)
+                if len(blocks) < workers:
+                    continue
+                for res in self._evalb(blocks, pool):
+                    builder.add(res)
+                    if return_samples:
+                        samples.append(res)
+                blocks = []
+            for res in self._evalb(blocks, pool):
+                builder.add(res)
+                if return_samples:
+                    samples.append(res)
+        finally:
+            if pool is not None:
+                pool.close()
+
+        if force:
+            if min is not None:
+                builder.min = np.minimum(min, builder.stats.min)
+            if max is not None:
+                builder.max = np.maximum(max, builder.stats.max)
+        pdf = builder.finalize()
+        if return_samples:
+            return pdf, np.concatenate(samples)
+        return pdf
+
+    def _psample_chunks(self, num, chunk):
+        "Parameter samples for pdf(), chunk rows at a time."
+        pdfs = [p.pdf for p in self.params]
+        sequence = options['pdf']['sequence']
+        seed = np.random.randint(2**31)
+        for start in range(0, num, chunk):
+            n = min(chunk, num - start)
+            if sequence == 'ds':
+                # descriptive samples of every chunk would have the
+                # same values, so each chunk is a Latin hypercube.
+                yield sample_design(pdfs, n, 'lhs')
+            else:
+                # one sequence, continued from chunk to chunk
+                yield ppf_columns(pdfs, qmc.sequence(sequence, n, len(pdfs), start, seed))
+
     def params2vars(self, params):
         if not params:
             raise ValueError("Need vars or params.")
@@ -328,11 +447,12 @@ class ResponseFunc(Function):
         .. note::
             May reduce accuracy of response surface.  Use with care.
         """
-        if not isinstance(self._eqn, sympy.Add):
-            return self._eqn
-        print([t.as_coeff_Mul() for t in self._eqn.args])
-        print([(t.as_coeff_Mul()[0].evalf(digits), t.as_coeff_Mul()[1]) for t in self._eqn.args])
-        return sympy.Add(*[sympy.Mul(t.as_coeff_Mul()[0].evalf(digits), t.as_coeff_Mul()[1]) for t in self._eqn.args])
+        eqn = self.eqn
+        if not isinstance(eqn, sympy.Add):
+            return eqn
+        print([t.as_coeff_Mul() for t in eqn.args])
+        print([(t.as_coeff_Mul()[0].evalf(digits), t.as_coeff_Mul()[1]) for t in eqn.args])
+        return sympy.Add(*[sympy.Mul(t.as_coeff_Mul()[0].evalf(digits), t.as_coeff_Mul()[1]) for t in eqn.args])
 
     def rmse(self):
         """
@@ -370,7 +490,106 @@ class ResponseFunc(Function):
         return sf
 
 
+class PCEFunc(ResponseFunc):
+    """
+    A polynomial chaos expansion in Legendre polynomials, like the
+    response surfaces of :class:`Smolyak` sweeps.  It is evaluated
+    numerically, so it is fast to build and store for many terms.
+    :attr:`eqn` builds the equivalent sympy expression on demand.
+
+    Args:
+      index(array): Degrees of the polynomials of each term. One row
+        per term and one column per variable or parameter.
+      coef(array): Coefficient of each term.
+      params(list): Input parameters.
+      vars(list): An list of variables and their ranges.
+        Example [(var, (min, max)), ...]
+      data(array): Actual data points, as for :class:`ResponseFunc`.
+      center(array): Variable values mapped to 0.  Variables are
+        scaled to (x - center) / scale. Default is the middle of
+        each range.
+      scale(array): Default is half of each range.
+    """
+    def __init__(self, index, coef, **kwargs):
+        vars = kwargs.get('vars')
+        if vars:
+            self.params = None
+        else:
+            vars = self.params2vars(kwargs.get('params'))
+        self.vars = vars
+        self.vnames = [str(x) for x, _y in vars]
+        self.data = kwargs.get('data')
+        self.index = np.array(index, dtype=int, ndmin=2)
+        self.coef = np.array(coef, dtype=float).ravel()
+        if self.index.shape != (len(self.coef), len(vars)):
+            raise ValueError("index must have one row for each coefficient and one column for each variable.")
+        lo = np.array([y[0] for _x, y in vars], dtype=float)
+        hi = np.array([y[1] for _x, y in vars], dtype=float)
+        center = kwargs.get('center')
+        scale = kwargs.get('scale')
+        self.center = (hi + lo) / 2.0 if center is None else np.array(center, dtype=float)
+        self.scale = (hi - lo) / 2.0 if scale is None else np.array(scale, dtype=float)
+
+    def _reinit_(self):
+        pass
+
+    @property
+    def eqn(self):
+        "The expansion as a sympy expression."
+        var = sympy.symbols(self.vnames)
+        if len(self.vnames) == 1:
+            var = [var]
+        polys = []
+        for d, v in enumerate(var):
+            x = (v - self.center[d]) / self.scale[d]
+            polys.append([sympy.expand(sympy.legendre(n, x)) for n in range(np.max(self.index[:, d]) + 1)])
+        eqn = 0
+        for c, row in zip(self.coef, self.index):
+            eqn += c * sympy.Mul(*[polys[d][n] for d, n in enumerate(row)])
+        return sympy.expand(eqn)
+
+    def eval(self, *pts, **kwargs):
+        if kwargs:
+            pts = [kwargs[x[0]] for x in self.vars]
+        pts = np.broadcast_arrays(*[np.asarray(p, dtype=float) for p in pts])
+        shape = pts[0].shape
+        u = [(p.ravel() - c) / s for p, c, s in zip(pts, self.center, self.scale)]
+        u = np.column_stack(u)
+        res = np.empty(len(u))
+
+        # rows at a time, so the basis has at most 2**20 entries
+        block = max(1, 2**20 // len(self.coef))
+        for start in range(0, len(u), block):
+            res[start:start + block] = np.dot(legendre_basis(u[start:start + block], self.index), self.coef)
+        return res.reshape(shape)
+
+    def to_response(self):
+        """
+        Returns a new ResponseFunc() with the equation of the expansion.
+        """
+        if self.params is None:
+            return ResponseFunc(self.eqn, vars=self.vars, data=self.data)
+        return ResponseFunc(self.eqn, params=self.params, data=self.data)
+
+
 class SampledFunc(Function):
+    """
+    Args:
+      pts(arrays): Coordinates of the data points, one array for
+        each variable or parameter, followed by the results.
+      params(list): Input parameters.
+      vars(list): An list of variables and their ranges.
+        Example [(var, (min, max)), ...]
+      rbf(string): Radial basis function. Default is 'multiquadric'.
+      eps(float): Shape parameter of the radial basis function.
+      interp(string): 'rbf', 'local' or 'auto'. See
+        options['response']. 'local' uses :class:`LocalRbf`.
+      neighbors(int): Number of points used by 'local'.
+    """
+    # defaults for objects pickled before these were options
+    interp = 'rbf'
+    neighbors = 50
+
     def __init__(self, *pts, **kwargs):
         if pts is None or len(pts) == 0:
             raise ValueError("Need points.")
@@ -383,6 +602,13 @@ class SampledFunc(Function):
         self.vars = vars
         self.rbfunc = kwargs.get('rbf', 'multiquadric')
         self.eps = kwargs.get('eps')
+        interp = kwargs.get('interp') or options['response']['interp']
+        if interp == 'auto':
+            interp = 'local' if len(pts[-1]) > options['response']['local_min'] else 'rbf'
+        if interp not in ['rbf', 'local']:
+            raise ValueError("Unknown interpolation '%s'. Use 'rbf', 'local' or 'auto'." % interp)
+        self.interp = interp
+        self.neighbors = kwargs.get('neighbors') or options['response']['neighbors']
         self._reinit_()
         self.eps = self._interp_func.epsilon
 
@@ -406,7 +632,10 @@ class SampledFunc(Function):
         if type(self.pts) is np.ndarray:
             self.pts = [x for x in self.pts.T]
 
-        if self.eps is None:
+        if self.interp == 'local':
+            self._interp_func = LocalRbf(*self.pts, function=self.rbfunc, epsilon=self.eps,
+                                         neighbors=self.neighbors)
+        elif self.eps is None:
             self._interp_func = Rbf(*self.pts, function=self.rbfunc)
         else:
             self._interp_func = Rbf(*self.pts, function=self.rbfunc, epsilon=self.eps)
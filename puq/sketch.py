@@ -0,0 +1,181 @@
+"""
+Quantile sketch for streams of samples.
+
+This file is part of PUQ
+Copyright (c) 2013-2016 PUQ Authors
+See LICENSE file for terms.
+"""
+from __future__ import absolute_import, division, print_function
+
+import math
+import numpy as np
+from scipy.special import ndtri
+
+
+class QuantileSketch(object):
+    """
+    Approximate quantiles of a stream of data in bounded memory.
+
+    This is a KLL sketch (Karnin, Lang and Liberty, 2016). Items are
+    kept in levels, where an item in level h stands for 2**h samples.
+    When a level is full it is sorted and every other item (starting
+    at random) moves up a level.  Each such compaction changes the
+    rank of any value by at most 2**h, with zero mean, so the sketch
+    tracks the variance of its rank error.  About 3*k items are kept
+    and sketches built from different data can be merged.
+
+    Args:
+      k: Compression. Larger values are more accurate and use more
+        memory. The rank error is roughly n/k.
+      rng: numpy RandomState to use instead of the global one.
+
+    :Example:
+
+    >>> s = QuantileSketch()
+    >>> for chunk in chunks:
+    ...     s.add(chunk)
+    >>> s.quantile([.05, .5, .95])
+    """
+    # default for sketches pickled before compactions took an rng
+    rng = None
+
+    def __init__(self, k=1000, rng=None):
+        if k < 2:
+            raise ValueError("k must be at least 2")
+        self.k = int(k)
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.levels = [np.empty(0)]
+        # variance of the rank error added by compactions
+        self.var = 0.0
+        self.rng = rng
+
+    def _capacity(self, h):
+        return max(2, int(math.ceil(self.k * (2. / 3) ** (len(self.levels) - 1 - h))))
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            if len(self.levels[h]) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                buf = np.sort(self.levels[h])
+                even = len(buf) - len(buf) % 2
+                up = buf[(self.rng or np.random).randint(2):even:2]
+                self.levels[h + 1] = np.append(self.levels[h + 1], up)
+                self.levels[h] = buf[even:]
+                self.var += 4.0 ** h
+            h += 1
+
+    def add(self, data):
+        """
+        Adds an array of data.
+        """
+        data = np.asarray(data, dtype=float).ravel()
+        if len(data) == 0:
+            return
+        self.n += len(data)
+        self.min = min(self.min, np.min(data))
+        self.max = max(self.max, np.max(data))
+        self.levels[0] = np.append(self.levels[0], data)
+        self._compress()
+
+    def merge(self, other):
+        """
+        Adds the data from another QuantileSketch.
+        """
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.append(self.levels[h], items)
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.var += other.var
+        self._compress()
+
+    def _sorted(self):
+        "Returns the items, sorted, and their cumulative weights."
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(x), 2.0**h) for h, x in enumerate(self.levels)])
+        order = np.argsort(items, kind='mergesort')
+        return items[order], np.cumsum(weights[order])
+
+    @property
+    def rank_error(self):
+        """
+        Standard deviation of the rank error of quantile(),
+        as a fraction of the number of samples.
+        """
+        if self.n == 0:
+            return 0.0
+        return math.sqrt(self.var) / self.n
+
+    def quantile(self, q):
+        """
+        Approximate quantiles.
+
+        :param q: Quantile or array of quantiles in [0,1].
+        :returns: The smallest values with at least a fraction *q*
+          of the data less than or equal to them.
+        """
+        if self.n == 0:
+            raise ValueError("Sketch is empty.")
+        items, cw = self._sorted()
+        q = np.asarray(q, dtype=float)
+        i = np.clip(np.searchsorted(cw, q * cw[-1]), 0, len(items) - 1)
+        res = items[i]
+        res = np.where(q <= 0, self.min, res)
+        res = np.where(q >= 1, self.max, res)
+        if res.ndim == 0:
+            return float(res)
+        return res
+
+    def cdf(self, x):
+        """
+        Approximate fraction of the data less than or equal to x.
+        """
+        items, cw = self._sorted()
+        i = np.searchsorted(items, x, side='right')
+        return np.append(0.0, cw)[i] / cw[-1]
+
+    def quantile_bounds(self, q, confidence=0.95):
+        """
+        Confidence bounds on the quantiles of the distribution
+        the data were sampled from.
+
+        The rank of the sample quantile has a standard deviation of
+        sqrt(n*q*(1-q)).  That is combined with the rank error of
+        the sketch, and the quantiles at the resulting ranks are returned.
+
+        :param q: Quantile or array of quantiles in [0,1].
+        :param confidence: Confidence level.
+        :returns: A tuple of arrays of lower and upper bounds.
+        """
+        q = np.asarray(q, dtype=float)
+        z = ndtri(0.5 + confidence / 2.0)
+        s = np.sqrt(self.n * q * (1 - q) + self.var) / self.n
+        return (self.quantile(np.clip(q - z * s, 0, 1)),
+                self.quantile(np.clip(q + z * s, 0, 1)))
+
+    def table(self, q, confidence=0.95):
+        """
+        Returns a 2D array with columns for the quantile, its
+        value, and lower and upper confidence bounds.
+        """
+        q = np.atleast_1d(np.asarray(q, dtype=float))
+        lo, hi = self.quantile_bounds(q, confidence)
+        return np.column_stack((q, self.quantile(q), lo, hi))
+
+    def __str__(self):
+        return "QuantileSketch k=%d n=%d items=%d" % (self.k, self.n, sum([len(x) for x in self.levels]))
+
+
+def print_quantiles(table):
+    """
+    Prints the quantiles and confidence bounds
+    returned by :meth:`QuantileSketch.table`.
+    """
+    for q, val, lo, hi in table:
+        print("Q(%g) = %s  [%s, %s]" % (q, val, lo, hi))
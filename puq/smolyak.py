@@ -8,14 +8,14 @@ See LICENSE file for terms.
 from __future__ import absolute_import, division, print_function
 
 import numpy as np
-from puq.smolyak_funcs import legendre_nd, jacobi_e2_nd, nelms, chaos_sequence
+from puq.smolyak_funcs import legendre_basis, jacobi_e2_nd, chaos_sequence
 from puq.util import process_data, vprint
 from puq.psweep import PSweep
 from puq.jpickle import pickle
 from puq.sparse_grid import sgrid
 from collections import defaultdict
 from logging import debug
-from .response import ResponseFunc
+from .response import PCEFunc
 
 
 class Smolyak(PSweep):
@@ -74,7 +74,10 @@ class Smolyak(PSweep):
         process_data(hf, 'smolyak', self._do_rs)
 
     def polyrs(self, uhat):
-        "Compute the polynomial for the response surface."
+        """
+        Compute the polynomial for the response surface, as a string.
+        The response itself is a :class:`PCEFunc`, which is faster.
+        """
         import sympy
 
         dim = len(self.params)
@@ -100,25 +103,19 @@ class Smolyak(PSweep):
         return sympy.sstr(eqn.expand().evalf())
 
     def _uhat(self, results):
-        nc = len(self.grid[:, 0])
         ndim = len(self.params)
         level = self.level
         x = self.grid
         weight = x[:, ndim]
         weight = weight / np.sum(weight)
         x = x[:, 0:ndim]
-        nterm = nelms(self.level, ndim)
-        jf = np.zeros((nc, nterm))
-        h2 = jacobi_e2_nd(ndim, self.level, 0, 0)
-        for i in range(0, nc):
-            jf[i, :] = legendre_nd(x[i, :], ndim, level)
-
-        # calculate uhat
-        uhat = np.zeros((nterm))
-        for i in range(0, nterm):
-            uhat[i] = np.sum(results.T * jf[:, i] * weight) / h2[i]
+        chaos = chaos_sequence(ndim, level)
+        nterm = len(chaos)
+        h2 = jacobi_e2_nd(ndim, level, 0, 0).ravel()
 
-        poly = self.polyrs(uhat)
+        # project the results onto the basis at all grid points at once
+        jf = legendre_basis(x, chaos)
+        uhat = np.dot(weight * np.asarray(results, dtype=float).ravel(), jf) / h2
 
         # collect parameters and results in one array
         pgrid = self.grid.copy()
@@ -127,8 +124,10 @@ class Smolyak(PSweep):
             pgrid[:, i] *= (pmax - pmin) / 2.0
             pgrid[:, i] += (pmax + pmin) / 2.0
         actual_data = np.column_stack((pgrid[:, :-1], results))
-        rs = ResponseFunc(poly, params=self.params, data=actual_data)
-        vprint(1, "\tSurface   = %s" % rs.eqn)
+        srange = np.array([p.pdf.srange for p in self.params])
+        rs = PCEFunc(chaos, uhat, params=self.params, data=actual_data,
+                     center=srange.mean(1), scale=(srange[:, 1] - srange[:, 0]) / 2.0)
+        vprint(1, "\tSurface   = polynomial chaos expansion with %d terms" % nterm)
         srmse, srmsep = rs.rmse()
         vprint(1, "\tRMSE      = %.2e (%.2e %%)" % (srmse, srmsep))
         return rs
@@ -1,76 +1,136 @@
 from numpy import *
-from scipy.special import jacobi, gamma, legendre
+from scipy.special import jacobi, gamma
 from math import factorial
+from collections import OrderedDict
+from threading import Lock
 
 """@package smolyak_funcs
 Functions for Smolyak UQ method
 """
 
-def memoize(f, cache={}):
-    def g(*args, **kwargs):
-        key = ( f, tuple(args), frozenset(kwargs.items()) )
-        if key not in cache:
-            cache[key] = f(*args, **kwargs)
-        return cache[key]
-    return g
+def lru_cache(maxsize=32):
+    """
+    Decorator keeping the results of the last *maxsize* different
+    calls. Cached arrays are shared, so they are made read-only.
+    """
+    def decorator(f):
+        cache = OrderedDict()
+        lock = Lock()
+
+        def g(*args):
+            with lock:
+                if args in cache:
+                    val = cache.pop(args)
+                    cache[args] = val
+                    return val
+            val = f(*args)
+            if isinstance(val, ndarray):
+                val.flags.writeable = False
+            with lock:
+                cache[args] = val
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return val
+        g.cache = cache
+        return g
+    return decorator
 
 def nelms(n, m):
     return int(factorial(n + m) / factorial(m) / factorial(n))
 
-def index_step1(m):
-    rows, cols = m.shape
-    out = None
-    for row in m:
-        for i in range(0, cols):
-            z = row.copy()
-            z[i] += 1
-            if out is None:
-                out = array([z])
-            else:
-                copy = True
-                for r in out:
-                    if all(r == z):
-                        copy = False
-                        break
-                if copy:
-                    out = vstack((out, z))
-    return out
-
-def index_step(p, n):
-    p1 = index_step1(p)
-    pn = vstack((p, p1))
-    for i in range(1, n):
-        ptmp = p1
-        p1 = index_step1(ptmp)
-        pn = vstack((pn, p1))
-    return pn
-
-@memoize
+def multi_index(ndim, p, q=1.0, weights=None):
+    """
+    Multi-indices of polynomial chaos terms: the degrees alpha of each
+    term in each dimension, with sum(weights * alpha**q) <= p**q.
+
+    The default is the total degree set, sum(alpha) <= p.  q < 1
+    gives a hyperbolic cross, and weights an anisotropic set with
+    lower degrees in dimensions with larger weights.
+
+    Rows are in order of total degree, then in reverse lexicographic
+    order. This is the order of chaos_sequence.
+
+    Input:     ndim = number of dimensions
+               p = maximum degree
+               q = exponent, 0 < q <= 1
+               weights = ndim positive weights (default all 1)
+    Output:    integer array with one row per term and ndim columns
+    """
+    if ndim < 1:
+        raise ValueError("ndim must be at least 1")
+    if not 0 < q <= 1:
+        raise ValueError("q must be in (0, 1]")
+    w = ones(ndim) if weights is None else asarray(weights, dtype=float)
+    if w.shape != (ndim,) or any(w <= 0):
+        raise ValueError("weights must be %d positive numbers" % ndim)
+    limit = p ** q * (1 + 1e-12)
+
+    # add one dimension at a time, keeping the rows within the limit
+    index = zeros((1, 0), dtype=int)
+    cost = zeros(1)
+    for d in range(0, ndim):
+        rows = []
+        costs = []
+        a = 0
+        while True:
+            c = cost + w[d] * a ** q
+            keep = c <= limit
+            if not keep.any():
+                break
+            rows.append(column_stack((index[keep], full(count_nonzero(keep), a, dtype=int))))
+            costs.append(c[keep])
+            a += 1
+        index = vstack(rows)
+        cost = concatenate(costs)
+
+    # sort by total degree, then the first column descending, ...
+    order = lexsort(tuple(-index[:, ::-1].T) + (index.sum(1),))
+    return index[order]
+
+@lru_cache(maxsize=32)
 def chaos_sequence(ndim, p):
     assert ndim > 0
-    return index_step(zeros((1, ndim), int), p);
+    return multi_index(ndim, p)
+
+def legendre_table(x, n):
+    """
+    Legendre polynomials of degree 0 to n at each point of x, by
+    the three term recurrence. Returns an array of shape (len(x), n+1).
+    """
+    x = asarray(x, dtype=float)
+    p = empty((len(x), n + 1))
+    p[:, 0] = 1.0
+    if n > 0:
+        p[:, 1] = x
+    for k in range(1, n):
+        p[:, k + 1] = ((2 * k + 1) * x * p[:, k] - k * p[:, k - 1]) / (k + 1)
+    return p
+
+def legendre_basis(x, pmatrix):
+    """
+    Products of Legendre polynomials for each term of a chaos
+    sequence, at each point.
 
-@memoize
-def _legendre(n):
-    return legendre(n)
+    Input:     x = points, shape (npts, ndim)
+               pmatrix = degrees of each term, shape (nterm, ndim)
+    Output:    array of shape (npts, nterm)
+    """
+    x = atleast_2d(asarray(x, dtype=float))
+    pmatrix = asarray(pmatrix)
+    # built one row per term, so the gathers copy contiguous rows
+    poly = ones((pmatrix.shape[0], x.shape[0]))
+    for n in range(0, pmatrix.shape[1]):
+        # only terms with a nonzero degree in this dimension
+        rows = flatnonzero(pmatrix[:, n])
+        if len(rows):
+            ptmp = legendre_table(x[:, n], pmatrix[rows, n].max()).T
+            poly[rows] *= ptmp[pmatrix[rows, n]]
+    return poly.T
 
 def legendre_nd(x, ndim, norder):
     ntmp = len(x)
     assert(ntmp == ndim)
-
-    pmatrix = chaos_sequence(ndim, norder)
-    ptmp = zeros((norder + 1, ndim))
-
-    for n in range(0, norder + 1):
-        ptmp[n, :] = _legendre(n)(x)
-
-    nterm, ntmp = pmatrix.shape
-    poly = ones((nterm))
-
-    for m in range(1, nterm):
-        for n in range(0, ndim):
-            poly[m] *=  ptmp[pmatrix[m, n], n]
-    return poly
+    return legendre_basis(reshape(x, (1, ndim)), chaos_sequence(ndim, norder))[0]
 
 
 def jacobi_e2_1d(order, alpha, beta):
@@ -125,9 +185,5 @@ def jacobi_e2_nd(ndim, p, alpha, beta):
     else:
         e1 = jacobi_e2_1d(p, alpha, beta)
         poly = chaos_sequence(ndim, p)
-        P = poly.shape[0]
-        e = ones((P, 1))
-        for m in range(0, P):
-            for n in range(0, ndim):
-                e[m] = e[m] * e1[poly[m, n]]
+        e = prod(e1[poly, 0], axis=1).reshape(-1, 1)
     return e
@@ -82,6 +82,8 @@ class Sweep(object):
             h5.attrs['username'] = getpass.getuser()
             h5.attrs['UQtype'] = self.psweep.__class__.__name__.lower()
             h5.attrs['description'] = self.description
+        if getattr(self.psweep, 'seed', None) is not None:
+            h5.attrs['seed'] = self.psweep.seed
 
         # overwrite previous
         if 'input' in h5:
@@ -21,6 +21,20 @@ def dump_hdf5(name, v, desc=''):
     print('HDF5:%s:5FDH' % line)
 
 
+def rng(seed, *key):
+    """
+    Returns a numpy RandomState for the stream *key* of *seed*.
+
+    Streams with different keys (tuples of non-negative ints) are
+    independent, so they can be drawn in any order or in different
+    processes.  If seed is None, the global numpy random state is
+    returned.
+    """
+    if seed is None:
+        return np.random
+    return np.random.RandomState([seed] + list(key))
+
+
 def vprint(level, str):
     if options['verbose'] >= level:
         print(str)
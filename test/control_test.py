@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""
+unit tests for control variate Monte Carlo
+"""
+
+from puq import *
+import numpy as np
+import h5py
+import os
+import tempfile
+
+
+class Group(object):
+    name = '/montecarlo/z'
+
+
+def test_control_variate():
+    a = NormalParameter('a', 'a', mean=0, dev=1)
+    b = UniformParameter('b', 'b', min=0, max=1)
+    f = ResponseFunc('a + b**2', params=[a, b])
+    mc = MonteCarlo([a, b], 200, response=False, control=f, seed=3)
+    data = a.values + b.values**2 + 0.1 * np.sin(5 * a.values)
+    res = dict(mc._do_pdf(Group(), data))
+    assert res['cv_vrf'] > 10
+    # exact mean is 1/3, deviation sqrt(1 + 4/45 + .005)
+    assert abs(res['cv_mean'] - 1. / 3) < 0.02
+    assert abs(res['cv_dev'] - np.sqrt(1 + 4. / 45 + .005)) < 0.05
+
+    # response surface from an HDF5 file
+    fname = tempfile.mktemp(suffix='.hdf5')
+    try:
+        with h5py.File(fname, 'w') as h:
+            h.attrs['UQtype'] = 'smolyak'
+            h['smolyak/z/response'] = pickle(f)
+        mc.control = fname
+        res2 = dict(mc._do_pdf(Group(), data))
+        assert res2['cv_mean'] == res['cv_mean']
+    finally:
+        os.remove(fname)
+
+    try:
+        MonteCarlo([a, b], 10, control=f)
+        assert False
+    except ValueError:
+        pass
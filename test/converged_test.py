@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+unit tests for sequential Monte Carlo with Converged
+"""
+
+from puq import *
+import numpy as np
+import h5py
+import os
+import tempfile
+
+
+class FakeSweep(object):
+    def __init__(self, psweep):
+        self.psweep = psweep
+
+
+def run(mc, func):
+    # what PSweep.run does, without running jobs
+    fname = tempfile.mktemp(suffix='.hdf5')
+    try:
+        while True:
+            with h5py.File(fname, 'a') as hf:
+                if 'output/data/z' in hf:
+                    del hf['output/data/z']
+                hf['output/data/z'] = func(*[p.values for p in mc.params])
+                if mc.iteration_cb(FakeSweep(mc), hf):
+                    return
+    finally:
+        os.remove(fname)
+
+
+def test_converged():
+    a = NormalParameter('a', 'a', mean=10, dev=1)
+    cb = Converged(batch=50, rtol=0.005)
+    mc = MonteCarlo([a], 50, response=False, iteration_cb=cb, seed=1)
+    run(mc, lambda a: a)
+    # about (1.96 / 10 / .005)**2 = 1537 samples
+    assert 1000 < mc.num < 2500
+    s = cb.stats['z']
+    assert s.n == mc.num
+    assert np.allclose(s.mean, np.mean(a.values))
+    assert np.allclose(s.dev, np.std(a.values))
+    assert abs(s.mean - 10) < 0.1
+
+    # quantiles converge more slowly, and max_num stops it
+    b = NormalParameter('b', 'b', mean=10, dev=1)
+    cb = Converged(batch=100, rtol=0.005, quantiles=[.05, .95], max_num=1000)
+    mc = MonteCarlo([b], 100, response=False, iteration_cb=cb, seed=1)
+    run(mc, lambda b: b)
+    assert mc.num == 1000
+
+    # state survives pickling with the sweep
+    cb2 = unpickle(pickle(cb))
+    assert cb2.stats['z'].n == 1000
+
+
+def test_converged_errors():
+    a = NormalParameter('a', 'a', mean=10, dev=1)
+    for kw in [{}, {'response': False, 'replicates': 3}]:
+        try:
+            MonteCarlo([a], 30, iteration_cb=Converged(batch=10), **kw)
+            assert False
+        except ValueError:
+            pass
+    for kw in [{'sequence': 'sobol'}, {'replicates': 3, 'max_num': 100}]:
+        cb = Converged(batch=30, max_num=kw.pop('max_num', 10000))
+        try:
+            MonteCarlo([a], 30, response=False, iteration_cb=cb, **kw)
+            assert False
+        except ValueError:
+            pass
+
+
+def test_converged_antithetic():
+    # the pairs of a linear response average to the exact mean,
+    # so the scheme-aware error stops after the first batch
+    a = NormalParameter('a', 'a', mean=10, dev=1)
+    cb = Converged(batch=50, rtol=0.005)
+    mc = MonteCarlo([a], 50, response=False, iteration_cb=cb, antithetic=True, seed=1)
+    run(mc, lambda a: a)
+    assert mc.num == 50
+
+    # replicates of a scrambled sequence
+    b = NormalParameter('b', 'b', mean=10, dev=1)
+    cb = Converged(batch=64, rtol=0.005, max_num=6400)
+    mc = MonteCarlo([b], 64, response=False, iteration_cb=cb, sequence='sobol', replicates=4, seed=1)
+    run(mc, lambda b: b)
+    assert mc.num < 1000
+
+
+def test_converged_seeded_quantiles():
+    # the sketch compactions use a stream of the sweep seed,
+    # so a seeded sweep gives the same quantiles every time
+    quantiles = []
+    for i in range(2):
+        a = NormalParameter('a', 'a', mean=10, dev=1)
+        cb = Converged(batch=1000, rtol=1e-6, quantiles=[.05, .5, .95], max_num=5000)
+        mc = MonteCarlo([a], 1000, response=False, iteration_cb=cb, seed=1)
+        np.random.rand()
+        run(mc, lambda a: a)
+        assert cb.sketches['z'].var > 0
+        quantiles.append(cb.sketches['z'].quantile([.05, .5, .95]))
+    assert np.all(quantiles[0] == quantiles[1])
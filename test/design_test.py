@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+unit tests for sample_design()
+"""
+
+from puq import *
+from puq.parameter import get_psamples
+import numpy as np
+import os
+import h5py
+import tempfile
+
+
+def test_design_columns():
+    pdfs = [NormalPDF(1, 2), UniformPDF(0, 3), ExponPDF(2),
+            ExperimentalPDF(np.linspace(0, 1, 50)), NormalPDF(-1, .5)]
+    for method in ['lhs', 'ds', 'random']:
+        x = sample_design(pdfs, 500, method, [np.random.RandomState(i) for i in range(5)])
+        assert x.shape == (500, 5)
+        for i, p in enumerate(pdfs):
+            ref = getattr(p, method)(500, np.random.RandomState(i))
+            assert np.allclose(x[:, i], ref, rtol=0, atol=1e-12)
+
+    # latin hypercube: one sample in each stratum of each column
+    x = sample_design(pdfs[:2], 100)
+    assert np.all(np.sort(np.floor(pdfs[1].cdf(x[:, 1]) * 100)) == np.arange(100))
+
+    out = np.empty((10, 5))
+    assert sample_design(pdfs, 10, out=out) is out
+    try:
+        sample_design(pdfs, 10, method='sobol')
+        assert False
+    except ValueError:
+        pass
+
+
+def test_design_psamples():
+    a = UniformParameter('a', 'a', min=0, max=1)
+    b = NormalParameter('b', 'b', mean=5, dev=1)
+    x = get_psamples([a, b], num=1000)
+    assert x.shape == (1000, 2)
+    assert np.allclose(np.sort(x[:, 0]), np.arange(0.5, 1000) / 1000)
+    assert np.allclose(np.mean(x[:, 1]), 5)
+
+
+def test_maximin_lhs():
+    x = maximin_lhs(30, 3, seed=None)
+    for k in range(3):
+        assert np.all(np.sort(x[:, k]) == np.arange(30))
+
+    def mindist(x):
+        return min(np.sum((x[i] - x[j])**2) for i in range(len(x)) for j in range(i))
+    rand = [mindist(np.array([np.random.permutation(30) for k in range(3)]).T) for i in range(10)]
+    assert mindist(x) > max(rand)
+
+
+def test_maximin_cache():
+    fname = tempfile.mktemp(suffix='.hdf5')
+    saved = options['lhs_cache']
+    options['lhs_cache'] = fname
+    try:
+        x = maximin_lhs(10, 2, seed=1)
+        with h5py.File(fname, 'r') as h:
+            assert np.all(h['10/2/1/100'][()] == x)
+        with h5py.File(fname, 'a') as h:
+            h['10/2/1/100'][0, 0] = -1
+        assert maximin_lhs(10, 2, seed=1)[0, 0] == -1
+
+        a = UniformParameter('a', 'a', min=0, max=1)
+        b = UniformParameter('b', 'b', min=0, max=1)
+        # sweeps share one cached design, whatever their seed
+        LHS([a, b], 20, ds=True, seed=3, optimize=True)
+        LHS([a, b], 20, ds=True, optimize=True)
+        with h5py.File(fname, 'r') as h:
+            assert list(h['20/2']) == ['0']
+        x = maximin_lhs(20, 2, seed=0)
+        y = np.column_stack((a.values, b.values)) * 20 - .5
+        # the same points, up to permuting and reflecting columns
+        def dist(x):
+            return np.sort(np.sum((x[:, np.newaxis] - x)**2, -1).ravel())
+        assert np.allclose(dist(x), dist(y))
+    finally:
+        options['lhs_cache'] = saved
+        os.remove(fname)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+unit tests for ImportanceSampling
+"""
+
+from puq import *
+import numpy as np
+
+
+def test_tail():
+    a = NormalParameter('a', 'a', mean=0, dev=1)
+    b = NormalParameter('b', 'b', mean=0, dev=1)
+    f = ResponseFunc('a + b', params=[a, b])
+    isw = ImportanceSampling([a, b], 2000, 4.0, response=f, seed=1)
+    # the design point is near (2, 2)
+    assert abs(isw.design_point['a'] - 2) < .5
+    assert abs(isw.design_point['b'] - 2) < .5
+    # most samples reach the tail
+    data = a.values + b.values
+    assert np.mean(data > 4) > .3
+
+    res = dict(isw._do_pdf(None, data))
+    # plain Monte Carlo needs many more samples
+    rng = np.random.RandomState(0)
+    ref = np.mean(a.pdf.random(10**6, rng) + b.pdf.random(10**6, rng) > 4)
+    assert res['prob_lo'] < ref < res['prob_hi']
+    assert abs(res['prob'] - ref) < .15 * ref
+    assert 100 < res['ess'] < 2000
+
+    isw.extend(500)
+    assert len(a.values) == 2500 and isw._start_at == 2000
+
+
+def test_pickle():
+    a = NormalParameter('a', 'a', mean=0, dev=1)
+    b = NormalParameter('b', 'b', mean=0, dev=1)
+    isw = ImportanceSampling([a, b], 100, 4.0, design_point={'a': 2, 'b': 2}, seed=3)
+    w = isw.weights(5)
+    assert np.all(w > 0)
+    assert np.allclose(unpickle(pickle(isw)).weights(5), w)
+
+
+def test_below():
+    a = UniformParameter('a', 'a', min=0, max=1)
+    isw = ImportanceSampling([a], 1000, 0.001, design_point={'a': 0.0005}, above=False, seed=2)
+    res = dict(isw._do_pdf(None, a.values))
+    assert res['prob_lo'] < 0.001 < res['prob_hi']
+
+    try:
+        ImportanceSampling([a], 10, 1.0)
+        assert False
+    except ValueError:
+        pass
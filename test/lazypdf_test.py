@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+unit tests for lazy PDF expressions.
+"""
+from puq import *
+import puq.pdf
+import numpy as np
+
+
+def _close(p1, p2):
+    dev = max(p1.dev, p2.dev)
+    assert np.abs(p1.mean - p2.mean) < .01 * dev
+    assert np.abs(p1.dev - p2.dev) < .01 * dev
+
+
+def test_lazy_expr():
+    a = NormalPDF(10, 1)
+    b = UniformPDF(1, 2)
+    c = TrianglePDF(-2, 1, 5)
+    d = NormalPDF(20, 2)
+    la, lb, lc, ld = lazy(a, b, c, d)
+
+    _close(((la * lb + lc) / ld).evaluate(), (a * b + c) / d)
+    _close((2 * (la + 1) - 3).evaluate(), 2 * (a + 1) - 3)
+    _close((5 / la).evaluate(), 5 / a)
+    _close((a - lc * 2).evaluate(), a - c * 2)
+    _close((-lc / ld).evaluate(), -c / d)
+
+
+def test_lazy_affine():
+    a = NormalPDF(10, 1)
+    p = (3 * (lazy(a) + 1) - 2).evaluate()
+    assert np.allclose(p.mean, 3 * 11 - 2, atol=1e-3)
+    assert np.allclose(p.dev, 3, atol=1e-3)
+
+
+def test_lazy_shared():
+    # a shared subexpression is only computed once
+    count = [0]
+    mul = puq.pdf.PDF.__mul__
+
+    def counted_mul(self, b):
+        if isinstance(b, puq.pdf.PDF):
+            count[0] += 1
+        return mul(self, b)
+
+    puq.pdf.PDF.__mul__ = counted_mul
+    try:
+        a, b = lazy(NormalPDF(10, 1), UniformPDF(1, 2))
+        e = a * b
+        (e + e * 2).evaluate()
+        assert count[0] == 1
+    finally:
+        puq.pdf.PDF.__mul__ = mul
+
+
+if __name__ == "__main__":
+    test_lazy_expr()
+    test_lazy_affine()
+    test_lazy_shared()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+"""
+unit tests for extending LHS sweeps
+"""
+
+from puq import *
+import numpy as np
+
+
+def strata(p, num):
+    return np.floor(UniformPDF(*p.pdf.range).cdf(p.values) * num).astype(int)
+
+
+def test_extend_ds():
+    a = UniformParameter('a', 'a', min=0, max=1)
+    b = NormalParameter('b', 'b', mean=0, dev=1)
+    lhs = LHS([a, b], 10, ds=True, response=False, seed=1)
+    lhs.extend()
+    assert lhs.num == 30 and lhs._start_at == 10
+    assert np.allclose(np.sort(a.values), np.arange(0.5, 30) / 30)
+    assert np.allclose(np.sort(b.values), np.sort(b.pdf.ds(30)))
+
+
+def test_extend_lhs():
+    a = UniformParameter('a', 'a', min=0, max=1)
+    b = NormalParameter('b', 'b', mean=0, dev=1)
+    lhs = LHS([a, b], 20, seed=2)
+    old = a.values.copy()
+
+    # a multiple keeps the union a Latin hypercube
+    lhs.extend(20)
+    assert np.all(a.values[:20] == old)
+    for p in [a, b]:
+        assert np.all(np.sort(strata(p, 40)) == np.arange(40))
+        # the new points are a Latin hypercube on their own
+        assert np.all(np.sort(np.floor(UniformPDF(*p.pdf.range).cdf(p.values[20:]) * 20)) == np.arange(20))
+
+    # 30% more. New points only go in empty strata.
+    lhs.extend(12)
+    assert lhs.num == 52 and len(b.values) == 52
+    for p in [a, b]:
+        s = strata(p, 52)
+        assert len(set(s[40:])) == 12
+        assert not set(s[40:]) & set(s[:40])
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+unit tests for polynomial chaos responses
+"""
+
+from puq import *
+import numpy as np
+import sympy
+
+
+def smolyak_rs(f, level=3):
+    a = UniformParameter('a', 'a', min=0, max=2)
+    b = NormalParameter('b', 'b', mean=1, dev=.5)
+    c = UniformParameter('c', 'c', min=-1, max=1)
+    # A tensor Gauss-Legendre grid integrates the products of
+    # polynomials exactly, like the sparse grid.
+    uq = Smolyak.__new__(Smolyak)
+    uq.params, uq.level = [a, b, c], level
+    z, w = np.polynomial.legendre.leggauss(level + 1)
+    g = np.array(np.meshgrid(z, z, z)).reshape(3, -1).T
+    uq.grid = np.column_stack((g, np.prod(np.array(np.meshgrid(w, w, w)).reshape(3, -1), 0)))
+    x = np.array([(g[:, i] * (p.pdf.srange[1] - p.pdf.srange[0]) + sum(p.pdf.srange)) / 2
+                  for i, p in enumerate(uq.params)])
+    return uq, uq._uhat(f(*x))
+
+
+def test_pce_smolyak():
+    uq, rs = smolyak_rs(lambda a, b, c: a * b + c**3 + 2)
+    assert isinstance(rs, PCEFunc) and isinstance(rs, ResponseFunc)
+    assert np.allclose(rs.rmse()[0], 0, atol=1e-10)
+
+    # same as the sympy polynomial
+    eqn = ResponseFunc(uq.polyrs(rs.coef), params=uq.params)
+    x = np.random.rand(100, 3)
+    assert np.allclose(rs.evala(x), eqn.evala(x))
+    assert np.allclose(rs.eval(.5, 1, .2), .5 + .2**3 + 2)
+    assert np.allclose(rs.eval(a=.5, b=1, c=.2), .5 + .2**3 + 2)
+
+    # the equation is built on demand
+    a, b, c = sympy.symbols('a b c')
+    assert np.allclose(float(rs.eqn.subs({a: .5, b: 1, c: .2})), .5 + .2**3 + 2)
+    assert np.allclose(rs.to_response().evala(x), rs.evala(x))
+
+    rs2 = unpickle(pickle(rs))
+    assert np.allclose(rs2.evala(x), rs.evala(x))
+    assert np.allclose(rs.pdf(fit=False).mean, rs2.pdf(fit=False).mean, atol=.05)
+
+
+def test_pce_trunc():
+    f = PCEFunc([[0, 0], [1, 0], [1, 1]], [1, 2, 1e-9], vars=[('x', (-1, 1)), ('y', (-1, 1))])
+    x, y = sympy.symbols('x y')
+    t = f.trunc(3)
+    assert np.allclose(float(t.subs({x: .5, y: .5})), f.eval(.5, .5))
+    s = f.simplify(1e-6)
+    assert sympy.simplify(s - (1 + 2 * x)) == 0
+
+
+def test_pce_errors():
+    try:
+        PCEFunc([[0, 1]], [1, 2], vars=[('x', (0, 1)), ('y', (0, 1))])
+        assert False
+    except ValueError:
+        pass
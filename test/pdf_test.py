@@ -441,6 +441,150 @@ def test_divide():
     print("Total Time = %s" % ttime)
     print("%.2f ms per division\n" % ((ttime * 1000.0) / tops))
 
+def test_add_fft():
+    # FFT and direct convolution must give the same sums
+    saved = options['pdf']['numpart'], options['pdf']['conv']
+    try:
+        for numpart in [100, 1000, 5000]:
+            options['pdf']['numpart'] = numpart
+            a = NormalPDF(10, 1)
+            b = TrianglePDF(-2, 1, 5)
+            options['pdf']['conv'] = 'direct'
+            c1 = a + b
+            d1 = a - b
+            options['pdf']['conv'] = 'fft'
+            c2 = a + b
+            d2 = a - b
+            assert np.allclose(c1.x, c2.x)
+            assert np.allclose(c1.y, c2.y, atol=1e-10)
+            assert np.allclose(d1.x, d2.x)
+            assert np.allclose(d1.y, d2.y, atol=1e-10)
+            assert np.allclose(c1.mean, c2.mean)
+            assert np.allclose(c1.dev, c2.dev)
+    finally:
+        options['pdf']['numpart'], options['pdf']['conv'] = saved
+
+def test_mul_fft():
+    # log-space products and quotients must agree with the direct kernel
+    saved = options['pdf']['numpart'], options['pdf']['conv']
+    try:
+        options['pdf']['numpart'] = 1000
+        a = TrianglePDF(-10, -6, 10)
+        b = NormalPDF(4, 3)
+        c = NormalPDF(10, 2)
+        options['pdf']['conv'] = 'direct'
+        m1 = a * b
+        d1 = a / c
+        options['pdf']['conv'] = 'fft'
+        m2 = a * b
+        d2 = a / c
+        assert abs(m1.mean - m2.mean) < .01 * m1.dev
+        assert abs(m1.dev - m2.dev) < .01 * m1.dev
+        assert abs(d1.mean - d2.mean) < .01 * d1.dev
+        assert abs(d1.dev - d2.dev) < .01 * d1.dev
+    finally:
+        options['pdf']['numpart'], options['pdf']['conv'] = saved
+
+def test_kde_binned():
+    # binned KDE must match scipy's gaussian_kde
+    saved = options['pdf']['kde']
+    try:
+        data = np.concatenate([np.random.normal(0, 1, 5000), np.random.exponential(2, 5000)])
+        for bw in [None, 'silverman', 0.2]:
+            options['pdf']['kde'] = 'exact'
+            p1 = ExperimentalPDF(data, fit=True, bw=bw)
+            options['pdf']['kde'] = 'binned'
+            p2 = ExperimentalPDF(data, fit=True, bw=bw)
+            y2 = p2.pdf(p1.x)
+            assert np.max(np.abs(p1.y - y2)) < 1e-3 * np.max(p1.y)
+            # compare on the same grid. The PDFs may trim their tails differently.
+            mean2 = np.trapz(p1.x * y2, p1.x) / np.trapz(y2, p1.x)
+            assert np.allclose(p1.mean, mean2, atol=1e-3 * p1.dev)
+    finally:
+        options['pdf']['kde'] = saved
+
+def test_closed_form():
+    from puq.jpickle import pickle, unpickle
+    q = np.linspace(0, 1, 101)
+    for p, sfunc in [(NormalPDF(10, 2, min=7), scipy.stats.norm(10, 2)),
+                     (UniformPDF(3, 5), scipy.stats.uniform(3, 2)),
+                     (ExponPDF(2), scipy.stats.expon(scale=.5)),
+                     (WeibullPDF(.5, 1), scipy.stats.weibull_min(.5, scale=1)),
+                     (RayleighPDF(3), scipy.stats.rayleigh(scale=3))]:
+        # truncated to the range of the PDF
+        fa, fb = sfunc.cdf(p.x[0]), sfunc.cdf(p.x[-1])
+        exact = sfunc.ppf(fa + q * (fb - fa))
+        assert np.allclose(p.ppf(q), exact, rtol=1e-9)
+        assert np.allclose(p.cdf(exact), q, atol=1e-12)
+        assert p.ppf(0) == p.x[0] and p.ppf(1) == p.x[-1]
+        assert np.all((p.ds(100) >= p.x[0]) & (p.ds(100) <= p.x[-1]))
+        p2 = unpickle(pickle(p))
+        assert p2.dist == p.dist
+        assert np.allclose(p2.ppf(q), p.ppf(q))
+    assert (NormalPDF(0, 1) + 1).dist is None
+
+def test_adaptive_grid():
+    from puq.jpickle import pickle, unpickle
+    exprs = [lambda n, u: n + n, lambda n, u: n - 2 * u, lambda n, u: n * u,
+             lambda n, u: n / u, lambda n, u: 1 / u]
+    saved = options['pdf']['grid'], options['pdf']['numpart']
+    try:
+        # reference results on fine and default uniform grids
+        options['pdf']['numpart'] = 2000
+        ref = [f(NormalPDF(0, 1), UniformPDF(1, 2)) for f in exprs]
+        options['pdf']['numpart'] = 100
+        coarse = [f(NormalPDF(0, 1), UniformPDF(1, 2)) for f in exprs]
+
+        options['pdf']['grid'] = 'adaptive'
+        # piecewise linear PDFs keep just their corners
+        assert np.allclose(TrianglePDF(0, 1, 3).x, [0, 1, 3])
+
+        n = NormalPDF(0, 1)
+        x = np.linspace(n.x[0], n.x[-1], 10001)
+        exact = scipy.stats.norm.pdf(x) / (scipy.stats.norm.cdf(n.x[-1]) - scipy.stats.norm.cdf(n.x[0]))
+        assert np.max(np.abs(n.pdf(x) - exact)) < 2 * options['pdf']['tol'] * np.max(exact)
+        # points are closer together near the peak than in the tails
+        dx = np.diff(n.x)
+        assert dx[len(dx) // 2] < dx[0] / 2
+
+        # at least as accurate as the default uniform grid
+        for f, r, c in zip(exprs, ref, coarse):
+            a = f(n, UniformPDF(1, 2))
+            assert len(a.x) < 1000
+            assert abs(a.mean - r.mean) <= abs(c.mean - r.mean) + 1e-3 * r.dev
+            assert abs(a.dev - r.dev) <= abs(c.dev - r.dev) + 1e-3 * r.dev
+
+        # a narrow peak keeps its probability without a fine grid
+        s = UniformPDF(0, 1) + NormalPDF(0, .001)
+        assert len(s.x) < 1000
+        assert abs(s.mean - .5) < 1e-4
+        x = np.linspace(.01, .99, 99)
+        assert np.allclose(s.pdf(x), 1, atol=1e-3)
+        s = WeibullPDF(.7, 1) * NormalPDF(10, 1)
+        assert abs(s.mean - WeibullPDF(.7, 1).mean * 10) < 1e-3 * s.dev
+
+        p = unpickle(pickle(n + n))
+        assert np.all(p.x == (n + n).x)
+    finally:
+        options['pdf']['grid'], options['pdf']['numpart'] = saved
+
+
+def test_posterior_many():
+    # the product of these densities underflows to 0
+    d = np.random.uniform(4.9, 5.1, 2000)
+    n = NormalPDF(0, 1)
+    p = posterior([n + v for v in d])
+    assert np.allclose(p.mean, np.mean(d), atol=1e-3)
+    assert np.allclose(p.dev, 1 / np.sqrt(len(d)), rtol=.02)
+
+    # data spread wider than the truncated error PDF
+    d = np.random.normal(5, 1, 10000)
+    p = ExperimentalPDF(d, error=NormalPDF(0, 1))
+    assert np.allclose(p.mean, np.mean(d), atol=1e-4)
+    assert np.allclose(p.dev, 1 / np.sqrt(len(d)), rtol=.02)
+    assert len(p.data) == len(d)
+
+
 if __name__ == "__main__":
     plot_errors = True
     test_scalar_add()
@@ -451,3 +595,6 @@ if __name__ == "__main__":
     test_subtract()
     test_multiply()
     test_divide()
+    test_closed_form()
+    test_adaptive_grid()
+    test_posterior_many()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+unit tests for PDFBatch
+"""
+from puq import *
+import numpy as np
+
+
+def _pdfs():
+    return [NormalPDF(i, 1 + i / 10.) for i in range(10)] + \
+        [UniformPDF(1, 3), TrianglePDF(2, 3, 7), ExponPDF(2)]
+
+
+def _close(b, pdfs):
+    for i, p in enumerate(pdfs):
+        dev = max(p.dev, 1e-3)
+        assert np.abs(b.mean[i] - p.mean) < .01 * dev
+        assert np.abs(b.dev[i] - p.dev) < .01 * dev
+
+
+def test_batch_funcs():
+    pdfs = _pdfs()
+    b = PDFBatch.from_pdfs(pdfs)
+    assert len(b) == len(pdfs)
+    x = np.linspace(-5, 20, 50)
+    q = np.linspace(0, 1, 11)
+    pdf, cdf, ppf = b.pdf(x), b.cdf(x), b.ppf(q)
+    for i, p in enumerate(pdfs):
+        assert np.allclose(pdf[i], p.pdf(x))
+        # the batch interpolates on the grid, even for parametric PDFs
+        assert np.allclose(cdf[i], np.interp(x, p.x, p.cdfy, left=0, right=1))
+        assert np.allclose(ppf[i], np.interp(q, p.cdfy, p.x))
+        assert np.allclose(b.mean[i], p.mean)
+        assert np.allclose(b.dev[i], p.dev)
+        assert b.mode[i] == p.mode
+    assert b.pdf(3.0).shape == (len(pdfs),)
+
+    # 2D arrays have one row per PDF
+    x2 = np.random.uniform(0, 5, (len(pdfs), 3))
+    assert np.allclose(b.cdf(x2)[4], np.interp(x2[4], pdfs[4].x, pdfs[4].cdfy))
+
+    # round trip
+    p = b.to_pdfs()[3]
+    assert np.allclose(p.y, pdfs[3].y)
+    assert np.allclose(p.mean, pdfs[3].mean)
+
+
+def test_batch_init():
+    x = np.linspace(0, 1, 50)
+    b = PDFBatch(x, np.ones((3, 50)))
+    assert np.allclose(b.mean, 0.5)
+    assert np.allclose(b.dev, 1 / np.sqrt(12), atol=1e-3)
+
+
+def test_batch_samples():
+    b = PDFBatch.from_pdfs(_pdfs())
+    for s in [b.lhs(20), b.ds(20), b.random(20)]:
+        assert s.shape == (len(b), 20)
+    s = b.ds(20)
+    assert np.allclose(np.sort(s[2]), np.sort(b[2].ds(20)))
+    for f in [b.lhs, b.ds, b.random]:
+        assert np.all(f(20, np.random.RandomState(3)) == f(20, np.random.RandomState(3)))
+
+
+def test_batch_arith():
+    pdfs = _pdfs()
+    b = PDFBatch.from_pdfs(pdfs)
+    c = NormalPDF(3, 2)
+    u = UniformPDF(1, 2)
+    _close(b + c, [p + c for p in pdfs])
+    _close(b - c, [p - c for p in pdfs])
+    _close(b * c, [p * c for p in pdfs])
+    _close(b / u, [p / u for p in pdfs])
+    _close(b * b, [p * p for p in pdfs])
+    _close(2 / (b + 10), [2 / (p + 10) for p in pdfs])
+    _close(-3 * b + 1, [-3 * p + 1 for p in pdfs])
+    v = np.arange(len(pdfs)) + 1.0
+    _close(b * v, [p * a for p, a in zip(pdfs, v)])
+
+
+if __name__ == "__main__":
+    test_batch_funcs()
+    test_batch_init()
+    test_batch_samples()
+    test_batch_arith()
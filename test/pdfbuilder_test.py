@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+unit tests for PDFBuilder
+"""
+from puq import *
+import numpy as np
+
+
+def _data():
+    np.random.seed(1)
+    return np.concatenate([np.random.normal(0, 1, 50000), np.random.exponential(2, 50000)])
+
+
+def test_builder_chunks():
+    data = _data()
+    for fit in [False, True]:
+        p1 = ExperimentalPDF(data, fit=fit)
+        b = PDFBuilder(fit=fit)
+        for chunk in np.array_split(data, 17):
+            b.add(chunk)
+        p2 = b.finalize()
+        assert np.abs(p1.mean - p2.mean) < .01 * p1.dev
+        assert np.abs(p1.dev - p2.dev) < .01 * p1.dev
+        assert np.max(np.abs(p1.y - p2.pdf(p1.x))) < .01 * np.max(p1.y)
+        assert not hasattr(p2, 'data')
+
+
+def test_builder_merge():
+    data = _data()
+    b = PDFBuilder(fit=True)
+    b.add(data)
+    p1 = b.finalize()
+
+    # builders with different ranges and bin widths
+    b1 = PDFBuilder(fit=True)
+    b1.add(data[:100])
+    b2 = PDFBuilder(fit=True)
+    b2.add(data[100:])
+    b1.merge(b2)
+    p2 = b1.finalize()
+    assert b1.stats.n == len(data)
+    assert np.allclose(b1.stats.mean, np.mean(data))
+    assert np.allclose(b1.stats.dev, np.std(data))
+    assert np.allclose(p1.x, p2.x)
+    assert np.allclose(p1.y, p2.y)
+
+
+def test_builder_reservoir():
+    data = np.arange(100000.0)
+    b = PDFBuilder(reservoir=1000)
+    b2 = PDFBuilder(reservoir=1000)
+    for chunk in np.array_split(data, 10):
+        b.add(chunk)
+        b2.add(chunk + len(data))
+    b.merge(b2)
+    p = b.finalize()
+    assert len(p.data) == 1000
+    assert len(np.unique(p.data)) == 1000
+    assert 400 < np.sum(p.data < len(data)) < 600
+
+    # small data is kept
+    b = PDFBuilder(reservoir=1000)
+    b.add([1, 2, 3])
+    assert np.all(b.finalize().data == [1, 2, 3])
+
+    # the same rng gives the same reservoir
+    res = []
+    for i in range(2):
+        rng = np.random.RandomState(5)
+        b = PDFBuilder(reservoir=100)
+        b2 = PDFBuilder(reservoir=100)
+        for chunk in np.array_split(data, 10):
+            b.add(chunk, rng)
+            b2.add(chunk + len(data), rng)
+        b.merge(b2, rng)
+        res.append(b.finalize().data)
+    assert np.all(res[0] == res[1])
+
+
+def test_builder_constant():
+    b = PDFBuilder()
+    b.add([3, 3, 3])
+    p = b.finalize()
+    assert p.mean == 3 and p.dev == 0
+
+
+if __name__ == "__main__":
+    test_builder_chunks()
+    test_builder_merge()
+    test_builder_reservoir()
+    test_builder_constant()
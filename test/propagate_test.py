@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+unit tests for propagate()
+"""
+
+from puq import *
+import numpy as np
+
+
+def test_propagate_expr():
+    a, b, c = NormalPDF(5, 1), UniformPDF(1, 2), ExponPDF(1)
+    p = propagate(lambda a, b, c: np.sqrt(a**2 + b * c), a, b, c)
+    r = np.sqrt(a.random(10**6)**2 + b.random(10**6) * c.random(10**6))
+    assert np.allclose(p.mean, np.mean(r), rtol=2e-3)
+    assert np.allclose(p.dev, np.std(r), rtol=1e-2)
+    assert p.samples >= 2**14
+
+
+def test_propagate_batches():
+    a = NormalPDF(0, 1)
+    p = propagate(lambda a, b: a + b, a, a, batch=1000, method='random')
+    assert np.allclose(p.mean, 0, atol=.02)
+    assert np.allclose(p.dev, (a + a).dev, rtol=.02)
+
+    # numbers are passed through
+    p = propagate(np.multiply, a, 3.0, reservoir=100)
+    assert np.allclose(p.dev, 3, rtol=.02)
+    assert len(p.data) == 100
+
+
+def test_propagate_errors():
+    a = NormalPDF(0, 1)
+    for kw in [{'method': 'sobol'}, {'batch': 1}]:
+        try:
+            propagate(np.exp, a, **kw)
+            assert False
+        except ValueError:
+            pass
+    try:
+        propagate(np.log, a)
+        assert False
+    except ValueError:
+        pass
+
+
+if __name__ == "__main__":
+    test_propagate_expr()
+    test_propagate_batches()
+    test_propagate_errors()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+unit tests for quasi-random sequences
+"""
+
+from puq import *
+from puq import qmc
+from puq.parameter import get_psamples
+import numpy as np
+
+
+def test_sobol():
+    # unscrambled points of 2**m are stratified in each dimension
+    x = qmc.sobol(16, 3, scramble=False)
+    assert np.allclose(x[:4, 1], [0, .5, .25, .75])
+    for d in range(3):
+        assert np.all(np.sort(np.floor(x[:, d] * 16)) == np.arange(16))
+
+    # scrambling keeps the stratification and depends on the seed
+    x = qmc.sobol(1024, 40, seed=3)
+    assert np.all(np.sort(np.floor(x[:, 39] * 1024)) == np.arange(1024))
+    assert np.allclose(x, qmc.sobol(1024, 40, seed=3))
+    assert not np.allclose(x, qmc.sobol(1024, 40, seed=4))
+
+    # continuing a sequence
+    y = np.vstack((qmc.sobol(100, 40, seed=3), qmc.sobol(924, 40, start=100, seed=3)))
+    assert np.all(x == y)
+
+
+def test_halton():
+    x = qmc.halton(9, 2, scramble=False)
+    assert np.allclose(x[:4, 0], [0, .5, .25, .75])
+    assert np.allclose(x[:4, 1], [0, 1. / 3, 2. / 3, 1. / 9])
+
+    x = qmc.halton(1000, 5, seed=1)
+    assert np.all((x >= 0) & (x < 1))
+    assert np.allclose(x.mean(0), .5, atol=5e-3)
+    y = np.vstack((qmc.halton(10, 5, seed=1), qmc.halton(990, 5, start=10, seed=1)))
+    assert np.allclose(x, y)
+
+
+def test_sequence_errors():
+    for args in [('sobl', 10, 2), ('sobol', 10, 41), ('sobol', 10, 2, 2**30)]:
+        try:
+            qmc.sequence(*args)
+            assert False
+        except ValueError:
+            pass
+
+
+def test_montecarlo_sobol():
+    a = UniformParameter('a', 'a', min=0, max=2)
+    b = NormalParameter('b', 'b', mean=1, dev=1)
+    mc = MonteCarlo([a, b], 256, response=False, sequence='sobol', replicates=4)
+    assert np.allclose(np.mean(a.values), 1, atol=1e-2)
+    assert np.allclose(np.mean(b.values), 1, atol=1e-2)
+
+    # extend continues the sequences of each replicate
+    first = a.values.copy()
+    mc.extend(256)
+    assert np.all(a.values[:256] == first)
+    u = qmc.sobol(128, 2, seed=[mc.seed, 1])
+    assert np.allclose(a.values[1::4], 2 * u[:, 0])
+
+    res = dict(mc._do_pdf(None, a.values + b.values))
+    assert 0 < res['mean_err'] < .01
+    assert np.allclose(res['mean'], 2, atol=.01)
+
+    try:
+        mc.extend(10)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_psamples_sequence():
+    a = UniformParameter('a', 'a', min=0, max=1)
+    b = UniformParameter('b', 'b', min=0, max=1)
+    x = get_psamples([a, b], num=256, sequence='halton')
+    assert x.shape == (256, 2)
+    assert np.allclose(x.mean(0), .5, atol=1e-2)
+    # columns come from one joint sequence, not independent sequences
+    assert abs(np.corrcoef(x.T)[0, 1]) < .05
@@ -284,6 +284,55 @@ def test_sf_eval1_P():
     assert np.allclose(sf.eval(np.array([3]), np.array([0,5,10])), [2.88,7.45,2.88], rtol=.1)
     assert np.allclose(sf.eval(np.array([7]), np.array([0,5,10])), [7.18,11.95,7.18], rtol=.1)
 
+
+def test_sf_local():
+    np.random.seed(1)
+    x, y = np.random.uniform(0, 10, (2, 3000))
+    z = np.sin(x) + y
+    sf = SampledFunc(x, y, z, vars=(('x', (0, 10)), ('y', (0, 10))), interp='local', neighbors=30)
+    assert sf.interp == 'local'
+    # passes through the points and interpolates between them
+    assert np.allclose(sf.eval(x[:100], y[:100]), z[:100], atol=1e-6)
+    xt, yt = np.random.uniform(1, 9, (2, 500))
+    assert np.allclose(sf.eval(xt, yt), np.sin(xt) + yt, atol=.05)
+    assert np.allclose(sf.evala(np.column_stack((xt, yt))), sf.eval(xt, yt))
+
+    # same as a full Rbf when all the points are neighbors
+    sf2 = SampledFunc(x[:40], y[:40], z[:40], vars=sf.vars, interp='local', neighbors=40)
+    sf3 = SampledFunc(x[:40], y[:40], z[:40], vars=sf.vars, interp='rbf')
+    assert np.allclose(sf2.eval(xt, yt), sf3.eval(xt, yt))
+
+    # the full Rbf is the default. 'auto' picks the interpolation
+    # from the number of points.
+    assert SampledFunc(x[:40], y[:40], z[:40], vars=sf.vars).interp == 'rbf'
+    assert SampledFunc(x, y, z, vars=sf.vars, interp='auto').interp == 'local'
+    assert SampledFunc(x[:40], y[:40], z[:40], vars=sf.vars, interp='auto').interp == 'rbf'
+
+    sf4 = unpickle(pickle(sf))
+    assert sf4.interp == 'local' and sf4.neighbors == 30
+    assert np.allclose(sf4.eval(xt, yt), sf.eval(xt, yt))
+
+
+def test_rf_pdf_chunks():
+    a = UniformParameter('a', 'a', min=0, max=1)
+    b = UniformParameter('b', 'b', min=0, max=1)
+    rf = ResponseFunc('a+b', params=[a, b])
+    x = np.random.rand(1000, 2)
+    assert np.allclose(rf.evala(x, chunk=64, workers=3), x.sum(1))
+
+    # samples are drawn and evaluated a chunk at a time
+    pdf, samples = rf.pdf(fit=False, num=5000, chunk=1000, workers=2, return_samples=True)
+    assert len(samples) == 5000 and len(pdf.data) == 1000
+    assert np.allclose(pdf.mean, 1, atol=.02)
+    assert np.allclose(pdf.dev, np.sqrt(1. / 6), atol=.02)
+    assert np.allclose(np.mean(samples), 1, atol=.01)
+
+    # constant responses
+    rf = ResponseFunc('2', params=[a, b])
+    pdf = rf.pdf(num=3000, chunk=1000)
+    assert pdf.mean == 2
+
+
 if __name__ == "__main__":
     test_sf_eval1()
-    test_sf_eval1_P()
\ No newline at end of file
+    test_sf_eval1_P()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+unit tests for reproducible sweep samples
+"""
+
+from puq import *
+import numpy as np
+
+
+def params():
+    return [UniformParameter('a', 'a', min=0, max=1), NormalParameter('b', 'b', mean=0, dev=1)]
+
+
+def test_seed_lhs():
+    p1, p2 = params(), params()
+    LHS(p1, 20, seed=5)
+    LHS(p2, 20, seed=5)
+    for a, b in zip(p1, p2):
+        assert np.all(a.values == b.values)
+
+    # each parameter has its own stream
+    p3 = params()
+    LHS(p3, 20, response=False, seed=6)
+    assert not np.all(np.argsort(p3[0].values) == np.argsort(p3[1].values))
+
+    # extend() is deterministic
+    p1, p2 = params(), params()
+    s1 = LHS(p1, 10, ds=True, seed=5)
+    s2 = LHS(p2, 10, ds=True, seed=5)
+    s1.extend()
+    s2.extend()
+    assert np.all(p1[1].values == p2[1].values)
+    assert not np.all(p1[1].values[:10] == p1[1].values[10:20])
+
+
+def test_seed_montecarlo():
+    p1 = params()
+    mc = MonteCarlo(p1, 10, seed=7)
+    mc2 = unpickle(pickle(mc))
+    assert mc2.seed == 7
+    mc.extend(10)
+    mc2.extend(10)
+    for a, b in zip(p1, mc2.params):
+        assert np.all(a.values == b.values)
+
+    # the global random state is not used
+    p2 = params()
+    np.random.rand()
+    MonteCarlo(p2, 10, seed=7)
+    assert np.all(p2[0].values == p1[0].values[:10])
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+unit tests for QuantileSketch
+"""
+from puq import *
+import numpy as np
+
+q = np.array([.01, .05, .25, .5, .75, .95, .99])
+
+
+def test_sketch_exact():
+    # small data is kept exactly
+    s = QuantileSketch()
+    s.add(np.arange(100.0))
+    assert s.var == 0
+    assert np.all(s.quantile([0, .5, 1]) == [0, 49, 99])
+    assert np.all(s.cdf([-1, 49, 200]) == [0, .5, 1])
+
+
+def test_sketch_rank():
+    np.random.seed(1)
+    data = np.random.exponential(2, 10**6)
+    s = QuantileSketch(200)
+    for chunk in np.array_split(data, 50):
+        s.add(chunk)
+    assert s.n == len(data)
+    assert sum([len(x) for x in s.levels]) < 1000
+
+    # ranks of the estimates are within 4 standard deviations
+    est = s.quantile(q)
+    rank = np.searchsorted(np.sort(data), est, side='right') / len(data)
+    assert np.all(np.abs(rank - q) < 4 * s.rank_error)
+
+
+def test_sketch_merge():
+    np.random.seed(2)
+    data = np.random.normal(5, 2, 200000)
+    s1 = QuantileSketch()
+    s2 = QuantileSketch()
+    s1.add(data[:1000])
+    s2.add(data[1000:])
+    s1.merge(s2)
+    assert s1.n == len(data)
+    assert s1.min == np.min(data) and s1.max == np.max(data)
+    rank = np.searchsorted(np.sort(data), s1.quantile(q), side='right') / len(data)
+    assert np.all(np.abs(rank - q) < 4 * s1.rank_error + 1e-5)
+
+
+def test_sketch_bounds():
+    # bounds should contain the true quantiles
+    np.random.seed(3)
+    s = QuantileSketch()
+    s.add(np.random.normal(0, 1, 100000))
+    lo, hi = s.quantile_bounds([.05, .5, .95])
+    true = [-1.6448536, 0, 1.6448536]
+    assert np.all(lo < true) and np.all(hi > true)
+    t = s.table([.05, .5, .95])
+    assert t.shape == (3, 4)
+    assert np.all(t[:, 2] <= t[:, 1]) and np.all(t[:, 1] <= t[:, 3])
+
+
+def test_experimental_sketch():
+    data = np.random.normal(10, 1, 1000)
+    p = ExperimentalPDF(data, sketch=True)
+    assert np.allclose(p.sketch.quantile(.5), np.median(data), atol=.01)
+
+
+def test_sketch_rng():
+    # compactions with the same rng give the same quantiles
+    data = np.random.exponential(2, 100000)
+    s1 = QuantileSketch(100, np.random.RandomState(1))
+    s2 = QuantileSketch(100, np.random.RandomState(1))
+    np.random.rand()
+    s1.add(data)
+    s2.add(data)
+    assert s1.var > 0
+    assert np.all(s1.quantile(q) == s2.quantile(q))
+    p1 = ExperimentalPDF(data, sketch=True, rng=np.random.RandomState(2))
+    p2 = ExperimentalPDF(data, sketch=True, rng=np.random.RandomState(2))
+    assert np.all(p1.sketch.quantile(q) == p2.sketch.quantile(q))
+
+
+if __name__ == "__main__":
+    test_sketch_exact()
+    test_sketch_rank()
+    test_sketch_merge()
+    test_sketch_bounds()
+    test_experimental_sketch()
+    test_sketch_rng()
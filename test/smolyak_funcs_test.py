@@ -1,5 +1,6 @@
-from puq.smolyak_funcs import legendre_nd, jacobi_e2_nd, nelms, chaos_sequence, jacobi_e2_1d
-from numpy import array, allclose
+from puq.smolyak_funcs import legendre_nd, jacobi_e2_nd, nelms, chaos_sequence, jacobi_e2_1d, legendre_basis
+from numpy import array, allclose, random, prod
+from scipy.special import legendre
 
 values = [(jacobi_e2_1d, (3, 1.5, 0), array([[1.0], [0.55555556], [0.38461538], [0.29411765]])),
           (jacobi_e2_1d, (1, 1, 0), array([[1.0], [0.5]])),
@@ -63,3 +64,39 @@ def do_tst(f, args, res):
     #print tmp
     assert allclose(tmp, res)
 
+def test_legendre_basis():
+    x = random.uniform(-1, 1, (20, 3))
+    pmatrix = chaos_sequence(3, 4)
+    basis = legendre_basis(x, pmatrix)
+    for i in range(len(x)):
+        assert allclose(basis[i], legendre_nd(x[i], 3, 4))
+    for j, row in enumerate(pmatrix):
+        assert allclose(basis[:, j], prod([legendre(n)(x[:, k]) for k, n in enumerate(row)], 0))
+
+
+def test_multi_index():
+    from puq.smolyak_funcs import multi_index
+    from numpy import sqrt, all
+    assert multi_index(12, 3).shape == (nelms(3, 12), 12)
+    # hyperbolic cross is a subset of the total degree set
+    h = multi_index(6, 4, q=.5)
+    assert all(sqrt(h).sum(1) <= 2 + 1e-9)
+    assert len(h) < nelms(4, 6)
+    # anisotropic
+    a = multi_index(2, 4, weights=[1, 2])
+    assert a.tolist() == [[0, 0], [1, 0], [0, 1], [2, 0], [1, 1], [0, 2], [3, 0], [2, 1], [4, 0]]
+    for args in [(0, 2), (2, 2, 0), (2, 2, 1, [1])]:
+        try:
+            multi_index(*args)
+            assert False
+        except ValueError:
+            pass
+
+
+def test_chaos_sequence_cache():
+    for n in range(40):
+        chaos_sequence(2, n)
+    assert len(chaos_sequence.cache) == 32
+    c = chaos_sequence(3, 2)
+    assert c is chaos_sequence(3, 2)
+    assert not c.flags.writeable
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+unit tests for antithetic and stratified Monte Carlo
+"""
+
+from puq import *
+import numpy as np
+
+
+def mc_err(**kw):
+    a = UniformParameter('a', 'a', min=0, max=1)
+    b = NormalParameter('b', 'b', mean=0, dev=.1)
+    mc = MonteCarlo([a, b], 400, response=False, seed=4, **kw)
+    data = np.exp(a.values) + b.values
+    res = dict(mc._do_pdf(None, data))
+    return mc, res
+
+
+def test_antithetic():
+    mc, res = mc_err(antithetic=True)
+    a, b = mc.params
+    assert np.allclose(a.values[0::2] + a.values[1::2], 1)
+    assert np.allclose(b.values[0::2] + b.values[1::2], 0)
+    # about 60x smaller variance than plain sampling
+    iid = np.std(np.exp(a.values)) / np.sqrt(400)
+    assert res['mean_err'] < iid / 4
+    assert abs(res['mean'] - (np.e - 1)) < 4 * res['mean_err']
+    assert abs(res['dev'] - np.sqrt((np.e**2 - 1) / 2 - (np.e - 1)**2 + .01)) < .02
+
+
+def test_stratified():
+    mc, res = mc_err(strata={'a': 10, 'b': 2})
+    a, b = mc.params
+    # each combination of strata has the same number of samples
+    cells = np.floor(a.values * 10) * 2 + (b.values > 0)
+    assert np.all(np.bincount(cells.astype(int)) == 20)
+    iid = np.std(np.exp(a.values)) / np.sqrt(400)
+    assert res['mean_err'] < iid / 4
+    assert abs(res['mean'] - (np.e - 1)) < 4 * res['mean_err']
+
+    mc.extend(40)
+    cells = np.floor(a.values * 10) * 2 + (b.values > 0)
+    assert np.all(np.bincount(cells.astype(int)) == 22)
+    for num in [30, 50]:
+        try:
+            mc.extend(num)
+            assert False
+        except ValueError:
+            pass
+
+    # both at once
+    mc, res2 = mc_err(antithetic=True, strata={'a': 4})
+    assert res2['mean_err'] < iid / 4
+
+
+def test_scheme_errors():
+    a = UniformParameter('a', 'a', min=0, max=1)
+    for kw in [{'antithetic': True}, {'antithetic': True, 'response': False, 'sequence': 'sobol'},
+               {'strata': {'x': 2}, 'response': False}, {'strata': {'a': 3}, 'response': False}]:
+        try:
+            MonteCarlo([a], 10, **kw)
+            assert False
+        except ValueError:
+            pass